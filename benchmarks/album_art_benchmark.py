@@ -0,0 +1,138 @@
+"""
+Album art micro-benchmark for the YouTube Content Downloader.
+
+Times turning one thumbnail into album art, and measures the peak memory it takes, for typical
+thumbnail sources:
+  - legacy:  the previous code path (full decode, center crop, LANCZOS resize to 1000x1000 even
+             when that means scaling up, JPEG encode)
+  - current: ytp_engine.make_album_art (reduced-scale JPEG decoding, no upscaling)
+Each measurement runs in a fresh Python process, so the peak resident set size of one case is not
+hidden by an earlier, larger one. Images are synthetic (noise, so they do not compress to nothing).
+Peak memory is the growth of the peak RSS while processing; it needs the resource module (not on Windows).
+
+Usage:
+    python benchmarks/album_art_benchmark.py [--iterations 20] [--json]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, width, height, PIL format)
+SOURCES = (
+    ("sddefault 640x480 JPEG", 640, 480, "JPEG"),
+    ("maxresdefault 1280x720 JPEG", 1280, 720, "JPEG"),
+    ("hi-res 2560x1440 JPEG", 2560, 1440, "JPEG"),
+    ("square 3000x3000 JPEG", 3000, 3000, "JPEG"),
+    ("1920x1080 PNG", 1920, 1080, "PNG"),
+)
+
+CHILD = '''
+import json, sys, time
+sys.path.insert(0, {repo_dir!r})
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+def legacy(image_data, size=1000, quality=90):
+    from io import BytesIO
+    from PIL import Image
+    img = Image.open(BytesIO(image_data))
+    width, height = img.size
+    side = min(width, height)
+    img = img.crop(((width - side) / 2, (height - side) / 2, (width + side) / 2, (height + side) / 2))
+    img = img.resize((size, size), Image.Resampling.LANCZOS)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    out = BytesIO()
+    img.save(out, format='JPEG', quality=quality)
+    return out.getvalue()
+
+from ytp_engine import make_album_art
+import PIL.Image, PIL.JpegImagePlugin, PIL.PngImagePlugin # Imported up front, not counted in the first run
+process = legacy if {method!r} == "legacy" else make_album_art
+with open({path!r}, "rb") as f:
+    image_data = f.read()
+
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024 # Bytes on macOS, KiB elsewhere
+
+baseline = peak_rss_bytes()
+times = []
+for _ in range({iterations}):
+    start = time.perf_counter()
+    art = process(image_data)
+    times.append(time.perf_counter() - start)
+peak = peak_rss_bytes()
+print(json.dumps({{"times": times, "peak_bytes": None if peak is None else peak - baseline, "output_bytes": len(art)}}))
+'''
+
+
+MAKE_SOURCE_CHILD = '''
+from PIL import Image, ImageFilter
+channels = [Image.effect_noise(({width}, {height}), 48).filter(ImageFilter.GaussianBlur(1.5)) for _ in range(3)]
+Image.merge("RGB", channels).save({path!r}, format={image_format!r}, **({{"quality": 95}} if {image_format!r} == "JPEG" else {{}}))
+'''
+
+
+def make_source_image(path, width, height, image_format):
+    """
+    Writes a noisy synthetic thumbnail, so decoding and encoding do real work. Runs in a child process:
+    on Linux a process inherits its parent's peak RSS across exec, so this one must stay small.
+    """
+    code = MAKE_SOURCE_CHILD.format(path=path, width=width, height=height, image_format=image_format)
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def measure(path, method, iterations):
+    code = CHILD.format(repo_dir=REPO_DIR, path=path, method=method, iterations=iterations)
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(f"benchmark child failed:\n{result.stderr.strip()}")
+    output = json.loads(result.stdout.strip().splitlines()[-1])
+    times = sorted(output["times"])
+    return {
+        "median_ms": times[len(times) // 2] * 1000,
+        "min_ms": times[0] * 1000,
+        "peak_mib": None if output["peak_bytes"] is None else output["peak_bytes"] / (1024 * 1024),
+        "output_kib": output["output_bytes"] / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and peak memory of album art processing, legacy vs current.")
+    parser.add_argument("--iterations", type=int, default=20, help="images processed per case (default: 20); the median is reported")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name, width, height, image_format in SOURCES:
+            path = os.path.join(temp_dir, f"{width}x{height}.{image_format.lower()}")
+            make_source_image(path, width, height, image_format)
+            results[name] = {method: measure(path, method, args.iterations) for method in ("legacy", "current")}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"Album art benchmark ({args.iterations} images per case, median time per image, peak RSS growth)")
+    print(f"  {'source':<30} {'legacy':>20} {'current':>20} {'speedup':>8}")
+    for name, result in results.items():
+        def cell(r):
+            memory = "n/a" if r["peak_mib"] is None else f"{r['peak_mib']:.1f} MiB"
+            return f"{r['median_ms']:6.1f} ms {memory:>10}"
+        speedup = result["legacy"]["median_ms"] / result["current"]["median_ms"]
+        print(f"  {name:<30} {cell(result['legacy']):>20} {cell(result['current']):>20} {speedup:7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,455 @@
+"""
+Offline queue throughput benchmark for the YouTube Content Downloader.
+
+Runs the real queue engine (the command line front-end, ytp_cli.HeadlessDownloader) end to end against a
+local HTTP stand-in for YouTube, the thumbnail servers and the lyrics sites, so results are reproducible
+and nothing goes over the internet:
+  - videos and playlists are listed and "extracted" by a youtube-dlp extractor that reads the stand-in's
+    JSON API (playlists page by page, 100 entries a page like YouTube), and downloaded over HTTP by youtube-dlp
+  - media are synthetic files made with FFmpeg before the run: an Opus/WebM and an AAC/M4A audio stream and an
+    H.264 video-only stream, served for every video (so MP3 transcoding and MP4 merging do real work)
+  - thumbnails are one noisy 1280x720 JPEG; Google results, Genius and AZLyrics pages are canned HTML,
+    reached by rewriting the engine's HTTPS requests to the stand-in
+Every scenario (single videos, a 100- and a 1,000-entry playlist, each in audio (MP3) and video (MP4)
+mode) runs in a fresh Python process with a fresh config directory (cold caches, empty archive).
+Reported per scenario: items/s (finished downloads), MiB/s (media downloaded), CPU seconds per item (the
+engine process plus its FFmpeg processes) and the engine process's peak RSS, with the p50 of every stage
+from the run's timing report. CPU of child processes and peak RSS need the resource module (not on Windows).
+
+Exit code 1 if a scenario fails or, with --baseline (an earlier --json output), if items/s drops or CPU seconds
+per item grow by more than --max-regression; 2 if FFmpeg is not found.
+
+Usage:
+    python benchmarks/queue_benchmark.py [--scenarios single playlist-100 playlist-1000] [--modes audio video]
+        [--media-seconds 10] [--latency-ms 0] [--ffmpeg PATH] [--baseline previous.json] [--max-regression 0.15] [--json]
+"""
+import argparse
+import http.server
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import zlib
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+# Scenario name -> (queue items, entries per item; 0: the items are single videos)
+SCENARIOS = {
+    "single": (10, 0),
+    "playlist-100": (1, 100),
+    "playlist-1000": (1, 1000),
+}
+# Mode -> output format of the queue engine
+MODES = {"audio": "Audio (MP3)", "video": "Video (MP4)"}
+
+PLAYLIST_PAGE_SIZE = 100 # Entries per page of the stand-in's playlist API, as on YouTube
+ARTISTS = 37 # Distinct channels the synthetic videos are spread over
+LYRICS_PAGE_FILLER_BYTES = 64 * 1024 # Markup around the lyrics; real lyrics pages are mostly scripts and ads
+MEDIA_FILES = ("audio.webm", "audio.m4a", "video.mp4")
+
+MAKE_MEDIA = {
+    "audio.webm": ["-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000:duration={seconds}", "-c:a", "libopus", "-b:a", "128k"],
+    "audio.m4a": ["-f", "lavfi", "-i", "sine=frequency=440:sample_rate=44100:duration={seconds}", "-c:a", "aac", "-b:a", "128k"],
+    "video.mp4": ["-f", "lavfi", "-i", "testsrc2=size=640x360:rate=30:duration={seconds}", "-c:v", "libx264",
+                  "-preset", "veryfast", "-pix_fmt", "yuv420p", "-an"],
+}
+
+MAKE_THUMBNAIL_CHILD = '''
+from PIL import Image, ImageFilter
+channels = [Image.effect_noise((1280, 720), 48).filter(ImageFilter.GaussianBlur(1.5)) for _ in range(3)]
+Image.merge("RGB", channels).save({path!r}, format="JPEG", quality=90)
+'''
+
+CHILD = '''
+import json, sys
+sys.path.insert(0, {benchmarks_dir!r})
+import queue_benchmark
+print(json.dumps(queue_benchmark.run_scenario(json.loads({spec!r}))))
+'''
+
+
+# --- Stand-in server (runs in the benchmark process) ---
+def video_id(number):
+    return f"bench{number:06d}" # 11 characters, like a YouTube video ID
+
+
+def video_number(video_id_):
+    return int(video_id_[5:])
+
+
+def video_metadata(number):
+    """Title and channel of synthetic video number, in typical YouTube shapes."""
+    artist = f"Stand-In Artist {number % ARTISTS}"
+    suffix = ("", " (Official Video)", " (Official Audio)", " [HD]")[number % 4]
+    return f"{artist} - Track {number}{suffix}", f"{artist} - Topic" if number % 3 else artist
+
+
+def lyrics_slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '-', text).strip('-').lower()
+
+
+class StandInServer(object):
+    """
+    Threaded local HTTP server standing in for YouTube, thumbnails and lyrics sites:
+      /api/video/<id>                    full video info, as youtube-dlp's JSON
+      /api/playlist/<list>?page=N        one page of flat playlist entries; the list ID ends in its number of entries
+      /media/<file>, /thumb/<id>.jpg     media files and thumbnail (Range requests supported)
+      /<host>/<path>                     HTTPS requests of the engine, rewritten (see run_scenario): Google results,
+                                         Genius and AZLyrics pages
+    Every request is delayed by latency seconds. Counts the requests and bytes served.
+    """
+    def __init__(self, media_dir, latency=0.0):
+        self.media = {}
+        for name in MEDIA_FILES + ("thumbnail.jpg",):
+            with open(os.path.join(media_dir, name), "rb") as f:
+                self.media[name] = f.read()
+        self.latency = latency
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # Keep-alive, like the real servers
+
+            def do_GET(self):
+                if server.latency:
+                    time.sleep(server.latency)
+                try:
+                    status, content_type, body = server.route(self)
+                except Exception as e: # A bug in the stand-in must not look like a slow engine
+                    status, content_type, body = 500, "text/plain", str(e).encode()
+                start, end = 0, len(body)
+                range_match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get("Range") or "")
+                if status == 200 and range_match and range_match.group(1):
+                    start = int(range_match.group(1))
+                    end = min(end, int(range_match.group(2)) + 1) if range_match.group(2) else end
+                    status = 206
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(end - start))
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(body)}")
+                self.end_headers()
+                self.wfile.write(body[start:end])
+                with server._lock:
+                    server.requests += 1
+                    server.bytes_sent += end - start
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def route(self, request):
+        """Returns (status, content type, body) for a request."""
+        parsed = urllib.parse.urlsplit(request.path)
+        query = urllib.parse.parse_qs(parsed.query)
+        parts = parsed.path.strip("/").split("/")
+        if parts[0] == "api" and parts[1] == "video":
+            return 200, "application/json", json.dumps(self.video_info(parts[2])).encode()
+        if parts[0] == "api" and parts[1] == "playlist":
+            return 200, "application/json", json.dumps(self.playlist_page(parts[2], int(query.get("page", ["0"])[0]))).encode()
+        if parts[0] == "media" and parts[1] in self.media:
+            return 200, "application/octet-stream", self.media[parts[1]]
+        if parts[0] == "thumb":
+            return 200, "image/jpeg", self.media["thumbnail.jpg"]
+        if parts[0] == "www.google.com" and parts[1] == "search":
+            return 200, "text/html", self.search_results(query.get("q", [""])[0]).encode()
+        if parts[0] == "genius.com":
+            return 200, "text/html", self.genius_page(parts[1]).encode()
+        if parts[0] == "www.azlyrics.com":
+            return 200, "text/html", self.azlyrics_page(parts[-1]).encode()
+        return 404, "text/plain", b"Not found"
+
+    def video_info(self, id_):
+        number = video_number(id_)
+        title, channel = video_metadata(number)
+        media_format = lambda format_id, name, **fields: {
+            "format_id": format_id, "url": f"{self.url}/media/{name}", "ext": name.rsplit(".", 1)[1],
+            "protocol": "http", "filesize": len(self.media[name]), **fields}
+        return {
+            "id": id_, "title": title, "channel": channel, "uploader": channel,
+            "description": f"{title}\nListen on all platforms.", "upload_date": "20240101", "duration": 10,
+            "webpage_url": f"{self.url}/watch?v={id_}",
+            "thumbnails": [{"url": f"{self.url}/thumb/{id_}.jpg", "width": 1280, "height": 720}],
+            "formats": [
+                media_format("140", "audio.m4a", acodec="mp4a.40.2", vcodec="none", abr=128),
+                media_format("251", "audio.webm", acodec="opus", vcodec="none", abr=130),
+                media_format("134", "video.mp4", acodec="none", vcodec="avc1.4d401e", width=640, height=360),
+            ],
+        }
+
+    def playlist_page(self, list_id, page):
+        count = int(re.search(r'(\d+)$', list_id).group(1))
+        numbers = range(page * PLAYLIST_PAGE_SIZE, min(count, (page + 1) * PLAYLIST_PAGE_SIZE))
+        entries = []
+        for number in numbers:
+            title, channel = video_metadata(number)
+            # Flat entries only list small thumbnails, like YouTube's
+            entries.append({"id": video_id(number), "title": title, "channel": channel,
+                            "thumbnails": [{"url": f"{self.url}/thumb/{video_id(number)}.jpg", "width": 336, "height": 188}]})
+        return {"title": f"Stand-In Playlist ({count} videos)", "count": count, "entries": entries,
+                "more": numbers.stop < count}
+
+    def search_results(self, search_query):
+        slug = lyrics_slug(search_query)
+        # Half of the tracks are found on Genius, the other half on AZLyrics
+        if zlib.crc32(search_query.encode()) % 2:
+            link = f"https://genius.com/{slug}"
+        else:
+            link = f"https://www.azlyrics.com/lyrics/stand-in/{slug}.html"
+        results = "".join(f'<div class="g"><a href="/url?q=https://example.com/{slug}-{k}&amp;sa=U">Result {k}</a></div>' for k in range(3))
+        return (f'<html><head><title>{search_query}</title></head><body><div id="search">'
+                f'<div class="g"><a href="/url?q={link}&amp;sa=U&amp;ved=0">{search_query} | Lyrics</a></div>{results}'
+                f'</div></body></html>')
+
+    def lyrics_lines(self, slug):
+        return [f"Line {k} of the song {slug}, sung over and over" for k in range(24)]
+
+    def filler(self):
+        return f'<script>var ads = "{"x" * LYRICS_PAGE_FILLER_BYTES}";</script>'
+
+    def genius_page(self, slug):
+        lines = "<br/>".join(["[Verse 1]"] + self.lyrics_lines(slug))
+        return (f'<html><head>{self.filler()}</head><body><div class="Lyrics__Root">'
+                f'<div data-lyrics-container="true" class="Lyrics__Container-sc-1">{lines}</div></div></body></html>')
+
+    def azlyrics_page(self, slug):
+        lines = "<br>\n".join(self.lyrics_lines(slug))
+        return (f'<html><head>{self.filler()}</head><body><div class="col-xs-12 col-lg-8 text-center">'
+                f'<div class="ringtone"></div><!-- Usage of azlyrics.com content by any third-party lyrics provider '
+                f'is prohibited by our licensing agreement. --><div>{lines}</div></div></body></html>')
+
+
+# --- Scenario run (in a fresh child process) ---
+def install_stand_in(server_url):
+    """
+    Points youtube-dlp and the engine's HTTP session at the stand-in: a youtube-dlp extractor for the stand-in's
+    watch/playlist URLs replaces all others, and HTTPS requests are rewritten to server_url/<host>/<path>.
+    """
+    import yt_dlp
+    from yt_dlp.extractor.common import InfoExtractor
+    from requests.adapters import HTTPAdapter
+    import ytp_engine
+
+    class StandInIE(InfoExtractor):
+        IE_NAME = "standin"
+        _VALID_URL = r'http://127\.0\.0\.1:\d+/(?:watch\?v=(?P<id>[\w-]+)|playlist\?list=(?P<list>[\w-]+))'
+
+        def _real_extract(self, url):
+            id_, list_id = self._match_valid_url(url).group("id", "list")
+            if id_:
+                return self._download_json(f"{server_url}/api/video/{id_}", id_)
+            first_page = self._download_json(f"{server_url}/api/playlist/{list_id}?page=0", list_id)
+
+            def entries(): # Pages after the first are fetched as the entries are consumed
+                page, number = first_page, 0
+                while True:
+                    for entry in page["entries"]:
+                        yield self.url_result(f"{server_url}/watch?v={entry['id']}", StandInIE, entry["id"], entry["title"],
+                                              channel=entry["channel"], thumbnails=entry["thumbnails"])
+                    if not page["more"]:
+                        return
+                    number += 1
+                    page = self._download_json(f"{server_url}/api/playlist/{list_id}?page={number}", list_id)
+
+            return self.playlist_result(entries(), list_id, first_page["title"], playlist_count=first_page["count"])
+
+    class StandInYoutubeDL(yt_dlp.YoutubeDL):
+        def __init__(self, params=None, auto_init=True):
+            super().__init__(params, auto_init=False) # Without the built-in extractors
+            self.add_info_extractor(StandInIE())
+
+    class StandInAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            url = urllib.parse.urlsplit(request.url)
+            request.url = f"{server_url}/{url.netloc}{url.path}" + (f"?{url.query}" if url.query else "")
+            return super().send(request, **kwargs)
+
+    yt_dlp.YoutubeDL = StandInYoutubeDL # The engine looks it up on the module when it starts a download
+    ytp_engine.get_http_session().mount("https://", StandInAdapter())
+
+
+def run_scenario(spec):
+    """Runs one queue in this process and returns its measurements (see measure)."""
+    try:
+        import resource
+    except ImportError: # Windows
+        resource = None
+    from ytp_cli import HeadlessDownloader
+    install_stand_in(spec["server_url"])
+    config_dir = spec["config_dir"]
+
+    class BenchmarkDownloader(HeadlessDownloader):
+        def _get_config_path(self):
+            return os.path.join(config_dir, "config.json") # Fresh: no settings file, caches, archive or journal
+
+    with open(os.devnull, "w") as devnull:
+        downloader = BenchmarkDownloader(None, log_level="error", stdout=devnull)
+        settings = downloader._load_settings()
+        settings.update(spec["settings"])
+        downloader.settings = settings
+        downloader.timings_path = os.path.join(config_dir, "timings.json")
+
+        children_before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+        cpu_before = time.process_time()
+        start = time.perf_counter()
+        exit_code = downloader.run(spec["urls"], spec["output_dir"], spec["output_format"], progress_interval=60)
+        wall_seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_before
+
+    ffmpeg_cpu_seconds = peak_rss = None
+    if resource is not None:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        ffmpeg_cpu_seconds = (children.ru_utime + children.ru_stime) - (children_before.ru_utime + children_before.ru_stime)
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak_rss = peak_rss if sys.platform == "darwin" else peak_rss * 1024 # Bytes on macOS, KiB elsewhere
+    with open(downloader.timings_path) as f:
+        report = json.load(f)
+    return {"exit_code": exit_code, "wall_seconds": wall_seconds, "cpu_seconds": cpu_seconds,
+            "ffmpeg_cpu_seconds": ffmpeg_cpu_seconds, "peak_rss_bytes": peak_rss, "timings": report}
+
+
+# --- Benchmark driver ---
+def make_media(media_dir, ffmpeg, seconds):
+    for name, options in MAKE_MEDIA.items():
+        command = [ffmpeg, "-y", "-loglevel", "error"] + [option.format(seconds=seconds) for option in options]
+        subprocess.run(command + [os.path.join(media_dir, name)], check=True)
+    # In a child process: on Linux a process inherits its parent's peak RSS across exec, so this one must stay small
+    subprocess.run([sys.executable, "-c", MAKE_THUMBNAIL_CHILD.format(path=os.path.join(media_dir, "thumbnail.jpg"))], check=True)
+
+
+def measure(server, scenario, mode, ffmpeg, settings):
+    """Runs a scenario in a fresh process against the stand-in server and returns its results."""
+    items, entries = SCENARIOS[scenario]
+    if entries:
+        urls = [f"{server.url}/playlist?list=PLbench{n}x{entries}" for n in range(items)]
+    else:
+        urls = [f"{server.url}/watch?v={video_id(n)}" for n in range(items)]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        config_dir = os.path.join(temp_dir, "config")
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(config_dir)
+        os.makedirs(output_dir)
+        spec = {"server_url": server.url, "urls": urls, "output_dir": output_dir, "output_format": MODES[mode],
+                "config_dir": config_dir, "settings": {"ffmpeg_path": ffmpeg, **settings}}
+        code = CHILD.format(benchmarks_dir=BENCHMARKS_DIR, spec=json.dumps(spec))
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(f"benchmark child failed:\n{result.stderr.strip()}")
+    output = json.loads(result.stdout.strip().splitlines()[-1])
+    timings = output["timings"]
+    done = timings["jobs"].get("done", 0)
+    cpu_seconds = output["cpu_seconds"] + (output["ffmpeg_cpu_seconds"] or 0)
+    return {
+        "items": done,
+        "failed": sum(timings["jobs"].values()) - done,
+        "wall_seconds": output["wall_seconds"],
+        "items_per_second": done / output["wall_seconds"],
+        "mib_per_second": timings["downloaded_bytes"] / output["wall_seconds"] / (1024 * 1024),
+        "cpu_seconds_per_item": cpu_seconds / done if done else None,
+        "engine_cpu_seconds": output["cpu_seconds"],
+        "ffmpeg_cpu_seconds": output["ffmpeg_cpu_seconds"],
+        "peak_rss_mib": None if output["peak_rss_bytes"] is None else output["peak_rss_bytes"] / (1024 * 1024),
+        "stage_p50_seconds": {stage: stats["p50_seconds"] for stage, stats in timings["stages"].items()},
+        "stderr": result.stderr.strip().splitlines()[-5:],
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Returns the regressions of results against an earlier run's results."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous or not result["items"]:
+            continue
+        if result["items_per_second"] < previous["items_per_second"] * (1 - max_regression):
+            regressions.append(f"{name}: {result['items_per_second']:.2f} items/s, was {previous['items_per_second']:.2f}")
+        if previous["cpu_seconds_per_item"] and result["cpu_seconds_per_item"] > previous["cpu_seconds_per_item"] * (1 + max_regression):
+            regressions.append(f"{name}: {result['cpu_seconds_per_item']:.3f} CPU s/item, was {previous['cpu_seconds_per_item']:.3f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Queue throughput of the real engine against a local stand-in for YouTube.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS), help="scenarios to run (default: all)")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES), help="output modes to run (default: audio video)")
+    parser.add_argument("--media-seconds", type=int, default=10, help="length of the synthetic media (default: 10)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay of every stand-in response (default: 0)")
+    parser.add_argument("--concurrent-downloads", type=int, metavar="N", help="download workers (default: the engine's)")
+    parser.add_argument("--host-rate", type=float, default=0, metavar="N",
+                        help="requests per second to any one host (default: 0, unlimited; the app's default is 2)")
+    parser.add_argument("--skip-lyrics", action="store_true", help="do not look up lyrics")
+    parser.add_argument("--ffmpeg", metavar="PATH", help="ffmpeg executable (default: the one on the PATH)")
+    parser.add_argument("--baseline", metavar="FILE", help="--json output of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="fail if items/s drop or CPU s/item grow by more than this fraction against --baseline (default: 0.15)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    ffmpeg = args.ffmpeg or shutil.which("ffmpeg")
+    if not ffmpeg or not shutil.which(ffmpeg):
+        print("FFmpeg not found. Use --ffmpeg PATH.", file=sys.stderr)
+        return 2
+    settings = {"host_requests_per_second": args.host_rate, "bandwidth_limit": 0, "skip_lyrics_scrape": args.skip_lyrics}
+    if args.concurrent_downloads:
+        settings["max_concurrent_downloads"] = args.concurrent_downloads
+
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory() as media_dir:
+        make_media(media_dir, ffmpeg, args.media_seconds)
+        with StandInServer(media_dir, args.latency_ms / 1000) as server:
+            for scenario in args.scenarios:
+                for mode in args.modes:
+                    name = f"{scenario} {mode}"
+                    try:
+                        results[name] = measure(server, scenario, mode, ffmpeg, settings)
+                    except RuntimeError as e:
+                        failures.append(f"{name}: {e}")
+                        continue
+                    if results[name]["failed"] or not results[name]["items"]:
+                        failures.append(f"{name}: {results[name]['failed']} download(s) failed: {' / '.join(results[name]['stderr'])}")
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.max_regression)
+    failures.extend(f"regression in {regression}" for regression in regressions)
+
+    if args.json:
+        print(json.dumps({"media_seconds": args.media_seconds, "latency_ms": args.latency_ms, "results": results, "failures": failures}, indent=2))
+    else:
+        print(f"Queue benchmark ({args.media_seconds} s media, {args.latency_ms:.0f} ms latency, fresh process and config per scenario)")
+        print(f"  {'scenario':<22} {'items':>6} {'items/s':>8} {'MiB/s':>8} {'CPU s/item':>11} {'peak RSS':>10}")
+        for name, result in results.items():
+            cpu = "n/a" if result["cpu_seconds_per_item"] is None else f"{result['cpu_seconds_per_item']:.3f}"
+            memory = "n/a" if result["peak_rss_mib"] is None else f"{result['peak_rss_mib']:.0f} MiB"
+            print(f"  {name:<22} {result['items']:>6} {result['items_per_second']:>8.2f} {result['mib_per_second']:>8.2f} {cpu:>11} {memory:>10}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
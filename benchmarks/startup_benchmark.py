@@ -0,0 +1,146 @@
+"""
+Cold-start benchmark for the YouTube Content Downloader.
+
+Every measurement runs in a fresh Python process, so nothing is cached in sys.modules:
+  - import time of ytp_engine, ytp_cli and the GUI module (ytpgui4.5.py)
+  - time to first frame: from launching the interpreter until the main window is mapped
+    and idle (needs a display; skipped otherwise)
+It also checks that none of the heavy dependencies (yt_dlp, requests, bs4, PIL, mutagen)
+is loaded by importing the modules, since those are deferred until first use
+(customtkinter loads PIL itself, so PIL is allowed for the GUI module).
+
+Exit code 1 if a heavy dependency is imported at startup or a --max-* budget is exceeded.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--max-import-ms 300] [--max-first-frame-ms 1500] [--json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_MODULE_PATH = os.path.join(REPO_DIR, "ytpgui4.5.py")
+
+# Must not be imported until they are needed (see the ytp_engine module docstring)
+DEFERRED_MODULES = ("yt_dlp", "requests", "bs4", "PIL", "mutagen")
+
+# Loads a module by name, or the GUI module by path (its file name is not importable)
+_LOAD_MODULE = '''
+import importlib, importlib.util, sys
+sys.path.insert(0, {repo_dir!r})
+def load(name):
+    if name == "ytpgui":
+        spec = importlib.util.spec_from_file_location("ytpgui", {gui_path!r})
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    return importlib.import_module(name)
+'''
+
+IMPORT_CHILD = _LOAD_MODULE + '''
+import json, time
+start = time.perf_counter()
+load({module!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{"import_ms": elapsed * 1000, "modules": sorted(sys.modules)}}))
+'''
+
+FIRST_FRAME_CHILD = _LOAD_MODULE + '''
+import json, time
+try:
+    app = load("ytpgui").YouTubeDownloaderApp()
+except Exception as e: # No display (TclError) or missing customtkinter
+    print(json.dumps({{"error": str(e)}}))
+    sys.exit(0)
+
+def first_frame(event=None):
+    app.unbind("<Map>")
+    # Mapped; once the pending redraws have run the window is drawn and accepts input
+    app.after_idle(lambda: (print(json.dumps({{"first_frame_time": time.time()}})), sys.stdout.flush(), app.destroy()))
+app.bind("<Map>", first_frame)
+app.mainloop()
+'''
+
+
+def run_child(code):
+    """Runs code in a fresh interpreter and returns (parsed JSON output, wall-clock start time)."""
+    launched_at = time.time()
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=REPO_DIR)
+    if result.returncode != 0:
+        raise RuntimeError(f"benchmark child failed:\n{result.stderr.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), launched_at
+
+
+def measure_import(module, runs, allowed=()):
+    """Median/min import time of module, and which deferred modules it loads (other than allowed ones)."""
+    times = []
+    loaded = set()
+    for _ in range(runs):
+        output, _ = run_child(IMPORT_CHILD.format(repo_dir=REPO_DIR, gui_path=GUI_MODULE_PATH, module=module))
+        times.append(output["import_ms"])
+        loaded.update(name.split(".")[0] for name in output["modules"])
+    return {
+        "median_ms": statistics.median(times),
+        "min_ms": min(times),
+        "deferred_modules_loaded": sorted(loaded.intersection(DEFERRED_MODULES).difference(allowed)),
+    }
+
+
+def measure_first_frame(runs):
+    times = []
+    for _ in range(runs):
+        output, launched_at = run_child(FIRST_FRAME_CHILD.format(repo_dir=REPO_DIR, gui_path=GUI_MODULE_PATH))
+        if "error" in output:
+            return {"skipped": output["error"]}
+        times.append((output["first_frame_time"] - launched_at) * 1000)
+    return {"median_ms": statistics.median(times), "min_ms": min(times)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and time to first frame in fresh processes.")
+    parser.add_argument("--runs", type=int, default=5, help="measurements per target (default: 5); the median is reported")
+    parser.add_argument("--max-import-ms", type=float, help="fail if the median import time of any module exceeds this")
+    parser.add_argument("--max-first-frame-ms", type=float, help="fail if the median time to first frame exceeds this")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = {"imports": {}, "first_frame": None}
+    for module in ("ytp_engine", "ytp_cli"):
+        results["imports"][module] = measure_import(module, args.runs)
+    # Whatever the GUI toolkit loads by itself is not the GUI module's doing
+    toolkit_modules = measure_import("customtkinter", 1)["deferred_modules_loaded"]
+    results["imports"]["ytpgui"] = measure_import("ytpgui", args.runs, allowed=toolkit_modules)
+    results["first_frame"] = measure_first_frame(args.runs)
+
+    failures = []
+    for module, result in results["imports"].items():
+        if result["deferred_modules_loaded"]:
+            failures.append(f"importing {module} loads {', '.join(result['deferred_modules_loaded'])}")
+        if args.max_import_ms is not None and result["median_ms"] > args.max_import_ms:
+            failures.append(f"{module} import took {result['median_ms']:.0f} ms (budget {args.max_import_ms:.0f} ms)")
+    first_frame = results["first_frame"]
+    if args.max_first_frame_ms is not None and "median_ms" in first_frame and first_frame["median_ms"] > args.max_first_frame_ms:
+        failures.append(f"time to first frame was {first_frame['median_ms']:.0f} ms (budget {args.max_first_frame_ms:.0f} ms)")
+    results["failures"] = failures
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Startup benchmark ({args.runs} fresh processes per target, median / min)")
+        for module, result in results["imports"].items():
+            print(f"  import {module:<12} {result['median_ms']:8.1f} ms / {result['min_ms']:8.1f} ms")
+        if "skipped" in first_frame:
+            print(f"  time to first frame  skipped: {first_frame['skipped']}")
+        else:
+            print(f"  time to first frame  {first_frame['median_ms']:8.1f} ms / {first_frame['min_ms']:8.1f} ms")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
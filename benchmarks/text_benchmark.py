@@ -0,0 +1,169 @@
+"""
+Text normalization benchmark for the YouTube Content Downloader.
+
+Runs sanitize_filename, clean_name_suffix and parse_artists over 100,000 video titles and
+channel/artist names. It compares the original per-pattern re.sub implementations (kept here as the
+reference) with ytp_text's, and checks that both give exactly the same output.
+The caches of ytp_text are cleared before every timed run, so only repeats within one run
+are answered from them (as within a playlist).
+
+The titles are generated from typical YouTube title shapes ("Artist - Song (Official Video)",
+"Song ft. X & Y", "Artist - Topic", stray punctuation, non-Latin scripts, ...) unless a file
+with real titles (one per line) is given with --titles.
+
+Exit code 1 if any output differs from the reference.
+
+Usage:
+    python benchmarks/text_benchmark.py [--count 100000] [--titles titles.txt] [--runs 3] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import ytp_text
+
+
+# --- Reference implementations (the original QueueEngine methods) ---
+def reference_sanitize_filename(filename):
+    filename = re.sub(r'[<>:"/\\|?*]', '', filename)
+    filename = re.sub(r'\s+', ' ', filename).strip()
+    filename = re.sub(r'\.+', '.', filename).strip('.')
+    if len(filename) > 200:
+        filename = filename[:200]
+    return filename
+
+
+def reference_clean_name_suffix(name):
+    suffixes_to_remove = [
+        r' - Topic$',
+        r' - Official Audio$',
+        r' - Official Video$',
+        r'\(Official Music Video\)$',
+        r'\(Official Audio\)$',
+        r'\[Official Music Video\]$',
+        r'\[Official Audio\]$',
+        r'^Album - ',
+    ]
+    for suffix_pattern in suffixes_to_remove:
+        name = re.sub(suffix_pattern, '', name, flags=re.IGNORECASE).strip()
+    return name
+
+
+def reference_parse_artists(artist_string):
+    if not artist_string:
+        return []
+    artist_string = re.sub(r'\s*feat\.\s*', ',', artist_string, flags=re.IGNORECASE)
+    artist_string = re.sub(r'\s*ft\.\s*', ',', artist_string, flags=re.IGNORECASE)
+    artist_string = re.sub(r'\s*&\s*', ',', artist_string, flags=re.IGNORECASE)
+    artists = [reference_clean_name_suffix(a.strip()) for a in artist_string.split(',') if a.strip()]
+    return [a for a in artists if a]
+
+
+# --- Synthetic titles ---
+WORDS = ("love", "night", "fire", "dream", "heart", "city", "summer", "gold", "rain", "forever", "dance",
+         "Lost", "Wild", "Blue", "Electric", "Midnight", "Paradise", "Echo", "Neon", "Ghost",
+         "愛", "夜", "Herz", "Noche", "Любовь", "사랑", "Café", "Mañana")
+TITLE_SUFFIXES = ("", "", "", " (Official Video)", " (Official Music Video)", " [Official Audio]", " (Lyrics)",
+                  " - Official Audio", " (Live)", " | 4K", " [HD]", "  (Remastered 2011)", "...", " ?!", " 🔥")
+CHANNEL_SUFFIXES = ("", "", "", " - Topic", " - Topic", "VEVO", " Official", " - Official Video", " (Official Audio)")
+
+
+def generate_samples(count, seed=1):
+    """Returns (titles, artist strings): count synthetic titles, and an artist/channel string for each."""
+    rng = random.Random(seed)
+    words = lambda n: " ".join(rng.choice(WORDS) for _ in range(n))
+    channels = [words(rng.randint(1, 3)).title() + rng.choice(CHANNEL_SUFFIXES) for _ in range(max(1, count // 50))]
+    titles, artists = [], []
+    for _ in range(count):
+        artist = rng.choice(channels)
+        featured = rng.random()
+        if featured < 0.15:
+            artist = f"{artist} feat. {rng.choice(channels)}"
+        elif featured < 0.25:
+            artist = f"{artist} & {rng.choice(channels)}, {rng.choice(channels)}"
+        song = words(rng.randint(1, 5))
+        shape = rng.random()
+        if shape < 0.5:
+            title = f"{artist} - {song}{rng.choice(TITLE_SUFFIXES)}"
+        elif shape < 0.7:
+            title = f"{song} ft. {rng.choice(channels)}{rng.choice(TITLE_SUFFIXES)}"
+        elif shape < 0.85:
+            title = f'{song}: "{words(2)}" / {words(1)}{rng.choice(TITLE_SUFFIXES)}'
+        else:
+            title = f"  {song}\t{rng.choice(TITLE_SUFFIXES)} ..{words(1)}.. "
+        titles.append(title)
+        artists.append(artist)
+    return titles, artists
+
+
+def clear_caches():
+    for function in (ytp_text.clean_name_suffix, ytp_text._parse_artists):
+        function.cache_clear()
+
+
+def time_runs(function, runs):
+    """Returns the best wall-clock time of function() over runs runs, and its last result."""
+    best = None
+    for _ in range(runs):
+        clear_caches()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the original and the compiled/batched text normalization.")
+    parser.add_argument("--count", type=int, default=100000, help="number of generated titles (default: 100000)")
+    parser.add_argument("--titles", metavar="FILE", help="use the titles in FILE (one per line) instead of generated ones")
+    parser.add_argument("--runs", type=int, default=3, help="timed runs per case (default: 3); the best is reported")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    titles, artists = generate_samples(args.count)
+    if args.titles:
+        with open(args.titles, "r", encoding="utf-8") as f:
+            titles = [line.rstrip("\n") for line in f if line.strip()]
+        artists = [title.split(" - ")[0] for title in titles] # Real artists are mostly the part before " - "
+
+    cases = {
+        "sanitize_filename": (titles, reference_sanitize_filename, ytp_text.sanitize_filenames),
+        "clean_name_suffix": (artists, reference_clean_name_suffix, lambda names: [ytp_text.clean_name_suffix(name) for name in names]),
+        "parse_artists": (artists, reference_parse_artists, lambda names: [ytp_text.parse_artists(name) for name in names]),
+    }
+    results = {}
+    failures = []
+    for name, (inputs, reference, batch) in cases.items():
+        reference_time, expected = time_runs(lambda: [reference(text) for text in inputs], args.runs)
+        batch_time, actual = time_runs(lambda: batch(inputs), args.runs)
+        mismatches = [text for text, a, b in zip(inputs, expected, actual) if a != b]
+        if mismatches:
+            failures.append(f"{name}: {len(mismatches)} output(s) differ, e.g. for {mismatches[0]!r}")
+        results[name] = {
+            "inputs": len(inputs),
+            "reference_ms": reference_time * 1000,
+            "batch_ms": batch_time * 1000,
+            "speedup": reference_time / batch_time,
+            "mismatches": len(mismatches),
+        }
+
+    if args.json:
+        print(json.dumps({"results": results, "failures": failures}, indent=2))
+    else:
+        print(f"Text normalization benchmark ({len(titles)} titles, best of {args.runs} runs)")
+        print(f"  {'function':<20} {'original':>12} {'ytp_text':>12} {'speedup':>8}")
+        for name, result in results.items():
+            print(f"  {name:<20} {result['reference_ms']:9.1f} ms {result['batch_ms']:9.1f} ms {result['speedup']:7.1f}x")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
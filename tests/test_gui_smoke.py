@@ -0,0 +1,69 @@
+"""
+Smoke test of the GUI module: builds the main window and the settings window with customtkinter replaced by
+stand-ins, so it runs without a display (benchmarks/startup_benchmark.py only builds the real window when there is one).
+"""
+import importlib.util
+import json
+import os
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+import ytp_engine
+
+GUI_MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ytpgui4.5.py")
+
+
+class FakeWidget(object):
+    """Stands in for CTk / CTkToplevel: accepts any constructor arguments, every public Tk method is a MagicMock."""
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('_'): # The app's own attributes, e.g. checked with hasattr before they are set
+            raise AttributeError(name)
+        method = mock.MagicMock(name=name)
+        setattr(self, name, method)
+        return method
+
+
+def fake_customtkinter():
+    module = types.ModuleType("customtkinter")
+    module.CTk = type("CTk", (FakeWidget,), {})
+    module.CTkToplevel = type("CTkToplevel", (FakeWidget,), {})
+    module.END = "end"
+    module.__getattr__ = lambda name: mock.MagicMock(name=name) # Widgets, variables, fonts, set_appearance_mode, ...
+    return module
+
+
+@pytest.fixture
+def gui(tmp_path, monkeypatch):
+    """The GUI module, loaded against the fake customtkinter, with its config file in tmp_path."""
+    monkeypatch.setitem(sys.modules, "customtkinter", fake_customtkinter())
+    monkeypatch.setattr(ytp_engine.QueueEngine, "_get_config_path", lambda self: str(tmp_path / "config.json"))
+    spec = importlib.util.spec_from_file_location("ytpgui", GUI_MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_main_window_builds(gui):
+    app = gui.YouTubeDownloaderApp()
+    assert app.settings['mp3_quality'] == '320k' # Defaults: there is no config file yet
+    assert app.queue_progress is None
+
+
+def test_save_settings_writes_config(gui, tmp_path):
+    app = gui.YouTubeDownloaderApp()
+    app._save_settings({'mp3_quality': '192k'})
+    with open(tmp_path / "config.json") as f:
+        assert json.load(f)['mp3_quality'] == '192k'
+    assert gui.YouTubeDownloaderApp()._load_settings()['mp3_quality'] == '192k'
+
+
+def test_settings_window_builds(gui):
+    app = gui.YouTubeDownloaderApp()
+    app._open_settings()
+    assert isinstance(app._settings_window, gui.SettingsWindow)
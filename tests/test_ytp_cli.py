@@ -0,0 +1,36 @@
+import pytest
+
+import ytp_cli
+
+
+@pytest.mark.parametrize("value, expected", [("auto", 'auto'), ("AUTO", 'auto'), ("1", 1), ("8", 8)])
+def test_transcode_workers_accepted(value, expected):
+    assert ytp_cli.build_parser().parse_args(['--transcode-workers', value]).transcode_workers == expected
+
+
+@pytest.mark.parametrize("value", ["abc", "0", "-2", "1.5", ""])
+def test_transcode_workers_rejected_with_usage_exit_code(value, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        ytp_cli.build_parser().parse_args(['--transcode-workers', value])
+    assert exit_info.value.code == ytp_cli.EXIT_USAGE
+    assert "expected 'auto' or a positive integer" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("option", ['--concurrent-downloads', '--tagging-workers'])
+def test_worker_counts_must_be_positive(option):
+    with pytest.raises(SystemExit) as exit_info:
+        ytp_cli.build_parser().parse_args([option, '0'])
+    assert exit_info.value.code == ytp_cli.EXIT_USAGE
+
+
+@pytest.mark.parametrize("value, expected", [("1", 1.0), ("0.25", 0.25), ("5", 5.0)])
+def test_progress_interval_accepted(value, expected):
+    assert ytp_cli.build_parser().parse_args(['--progress-interval', value]).progress_interval == expected
+
+
+@pytest.mark.parametrize("value", ["0", "-1", "0.0", "abc", "nan", "inf", ""])
+def test_progress_interval_rejected_with_usage_exit_code(value, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        ytp_cli.build_parser().parse_args(['--progress-interval', value])
+    assert exit_info.value.code == ytp_cli.EXIT_USAGE
+    assert "expected a positive number" in capsys.readouterr().err
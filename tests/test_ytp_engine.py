@@ -0,0 +1,406 @@
+import concurrent.futures
+import os
+import queue
+import threading
+from unittest import mock
+
+import pytest
+
+import ytp_engine
+
+
+class Engine(ytp_engine.QueueEngine):
+    """Queue engine with the state process_download_queue would set up, and an in-memory journal."""
+    def __init__(self, tmp_path):
+        self.settings = {'ffmpeg_path': str(tmp_path / "no-such-ffmpeg")}
+        self.abort_download_flag = threading.Event()
+        self._journal = mock.MagicMock()
+        self.errors = []
+
+    def show_error(self, title, message):
+        self.errors.append(title)
+
+
+def run_worker(engine, handler, tmp_path):
+    """Runs one pipeline worker over a single job whose stage is handler; returns the job."""
+    job = ytp_engine.DownloadJob(0, "https://youtu.be/aaaaaaaaaaa", str(tmp_path))
+    jobs = queue.Queue()
+    jobs.put(job)
+    jobs.put(None)
+    engine._pipeline_worker(0, 'transcoding', handler, jobs, None, ytp_engine.QueueProgress())
+    return job
+
+
+def test_missing_ffmpeg_stops_the_queue(tmp_path):
+    engine = Engine(tmp_path)
+    source = tmp_path / "source.webm"
+    source.write_bytes(b"audio")
+    with pytest.raises(ytp_engine.FFmpegNotFoundError):
+        engine._transcode_to_mp3(str(source), str(tmp_path / "out.mp3"), "192k")
+
+    job = run_worker(engine, lambda job, slot: engine._transcode_to_mp3(str(source), str(tmp_path / "out.mp3"), "192k"), tmp_path)
+    assert job.status == 'failed'
+    assert engine.abort_download_flag.is_set()
+    assert engine.errors == ["FFmpeg Not Found"]
+
+
+def test_other_missing_files_only_fail_their_job(tmp_path):
+    engine = Engine(tmp_path)
+    def handler(job, slot):
+        open(tmp_path / "removed.temp.mp3", 'rb') # e.g. a temp file deleted by the user
+    job = run_worker(engine, handler, tmp_path)
+    assert job.status == 'failed'
+    assert not engine.abort_download_flag.is_set()
+    assert engine.errors == ["Unexpected Error"]
+
+
+@pytest.mark.parametrize("fails", [False, True])
+def test_finished_jobs_release_their_run_data(tmp_path, fails):
+    engine = Engine(tmp_path)
+    prefetcher = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    blocker = threading.Event()
+    prefetcher.submit(blocker.wait)
+    pending_prefetch = prefetcher.submit(lambda: {'album_art': b"cover"})
+    def handler(job, slot):
+        job.info_dict = {'title': "Song", 'formats': [{'format_id': "251"}] * 100}
+        job.metadata_prefetch = pending_prefetch
+        job.album_art_prefetch = concurrent.futures.Future()
+        if fails:
+            raise RuntimeError("tagging failed")
+    job = run_worker(engine, handler, tmp_path)
+    blocker.set()
+    prefetcher.shutdown(wait=True)
+    assert job.status == ('failed' if fails else 'done')
+    assert job.info_dict is None and job.metadata_prefetch is None and job.album_art_prefetch is None
+    assert job.title == "Song"
+    assert pending_prefetch.cancelled() # Never started
+
+
+def test_sync_records_archived_tracks_in_the_manifest(tmp_path):
+    from mutagen.id3 import ID3
+    engine = Engine(tmp_path)
+    engine.settings['sync_playlists'] = True
+    engine._archive_key = ('mp3', '192')
+    engine._download_archive = ytp_engine.DownloadArchive(str(tmp_path / "archive.db"))
+    engine._output_index = ytp_engine.OutputDirectoryIndex()
+    engine._playlist_manifests = {}
+    engine._track_totals_lock = threading.Lock()
+    folder = tmp_path / "Playlist"
+    folder.mkdir()
+    old_path = folder / "01 - Song.mp3" # Downloaded before sync was turned on, at another position
+    old_path.write_bytes((b"\xff\xfb\x90\x64" + bytes(413)) * 20) # Silent MPEG-1 Layer III frames
+    ID3().save(str(old_path))
+    engine._download_archive.record("aaaaaaaaaaa", 'mp3', '192', str(old_path), True)
+
+    job = ytp_engine.DownloadJob(0, "https://youtu.be/aaaaaaaaaaa", str(folder), filename_base="03 - Song",
+                                 track_number=3, total_tracks=10, video_id="aaaaaaaaaaa")
+    assert not engine._sync_existing_track(job)
+    download_queue = queue.Queue()
+    engine._enqueue_job(job, download_queue, ytp_engine.QueueProgress())
+    assert download_queue.empty()
+    assert job.status == 'done'
+    new_path = folder / "03 - Song.mp3"
+    assert job.audio_path == str(new_path)
+    assert not old_path.exists()
+    assert engine._find_in_archive(job) == str(new_path)
+
+    engine._update_track_tags({0: [job]})
+    assert ID3(str(new_path))['TRCK'].text == ["3/10"]
+    engine._save_playlist_manifests({0: [job]})
+    entry = ytp_engine.PlaylistManifest(str(folder)).get('mp3', "aaaaaaaaaaa")
+    assert entry == {'file': "03 - Song.mp3", 'track': 3, 'total': 10, 'tagged': True, 'removed': False}
+    engine._download_archive.close()
+
+
+def test_resume_does_not_reuse_jobs_of_another_video(tmp_path):
+    journal_path = str(tmp_path / "journal.jsonl")
+    folder = str(tmp_path / "Playlist")
+    def playlist_job(track_number, video_id):
+        return ytp_engine.DownloadJob(0, f"https://youtu.be/{video_id}", folder, filename_base=f"{track_number:02d} - {video_id}",
+                                      track_number=track_number, total_tracks=3, video_id=video_id)
+
+    # Interrupted run: track 1 done, tracks 2 and 3 not yet
+    journal = ytp_engine.QueueJournal(journal_path)
+    journal.start(str(tmp_path), 'mp3', ["https://www.youtube.com/playlist?list=PL"])
+    interrupted_jobs = [playlist_job(1, "aaaaaaaaaaa"), playlist_job(2, "bbbbbbbbbbb"), playlist_job(3, "ccccccccccc")]
+    journal.add_jobs(interrupted_jobs)
+    journal.set_state(interrupted_jobs[0], 'done')
+    journal.close(finished=False)
+    resume_state = ytp_engine.QueueJournal.load(journal_path)
+
+    # Since then, the first two videos swapped places
+    engine = Engine(tmp_path)
+    engine._download_archive = None
+    engine._track_totals_lock = threading.Lock()
+    engine._journal = ytp_engine.QueueJournal(journal_path)
+    engine._journal.start(str(tmp_path), 'mp3', resume_state['urls'], resume=True)
+    def expand(queue_index, url, base_output_dir, ydl_opts_base):
+        yield playlist_job(1, "bbbbbbbbbbb")
+        yield playlist_job(2, "aaaaaaaaaaa")
+        yield playlist_job(3, "ccccccccccc")
+        return 3
+    engine._expand_queue_item = expand
+    download_queue = queue.Queue()
+    jobs = engine._run_queue_item(0, resume_state['urls'][0], str(tmp_path), {}, download_queue, ytp_engine.QueueProgress(),
+                                  resume_state['jobs_by_item'][0])
+    engine._journal.close(finished=False)
+
+    assert [(job.track_number, job.video_id, job.status) for job in jobs] == [
+        (1, "bbbbbbbbbbb", 'pending'), (2, "aaaaaaaaaaa", 'pending'), (3, "ccccccccccc", 'pending')]
+    assert jobs[2] is resume_state['jobs_by_item'][0][2] # Same video at the same position: the journaled job
+    assert [download_queue.get_nowait().video_id for _ in range(3)] == ["bbbbbbbbbbb", "aaaaaaaaaaa", "ccccccccccc"]
+    # Resuming again sees the playlist as it is now
+    reloaded = ytp_engine.QueueJournal.load(journal_path)['jobs_by_item'][0]
+    assert [(job.track_number, job.video_id, job.status) for job in reloaded] == [
+        (1, "bbbbbbbbbbb", 'pending'), (2, "aaaaaaaaaaa", 'pending'), (3, "ccccccccccc", 'pending')]
+
+
+def journal_jobs(folder):
+    return [ytp_engine.DownloadJob(0, f"https://youtu.be/{video_id}", folder, filename_base=f"{k + 1:02d} - Song",
+                                   title=f"Song {k + 1}", track_number=k + 1, playlist_title="Playlist", total_tracks=None,
+                                   video_id=video_id, artist="Artist", thumbnail_url="https://i.ytimg.com/vi/x/hq.jpg")
+            for k, video_id in enumerate(["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc", "ddddddddddd", "eeeeeeeeeee"])]
+
+
+def test_download_job_round_trips_through_the_journal_format():
+    job = journal_jobs("/music/Playlist")[1]
+    copy = ytp_engine.DownloadJob.from_dict(job.to_dict())
+    assert copy.to_dict() == job.to_dict()
+    assert copy.status == 'pending' and copy.journal_key == "0/2"
+
+
+def test_journal_replay_after_a_crash(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    urls = ["https://www.youtube.com/playlist?list=PL", "https://youtu.be/fffffffffff"]
+    journal = ytp_engine.QueueJournal(path)
+    journal.start(str(tmp_path), 'mp3', urls)
+    jobs = journal_jobs(str(tmp_path))
+    journal.add_jobs(jobs)
+    journal.finish_item(0, 5)
+    for job, state in zip(jobs, ['done', 'failed', 'transcoding', 'pending']):
+        journal.set_state(job, state)
+    journal.set_state(jobs[4], 'downloading')
+    journal.set_state(jobs[4], 'done')
+    journal.close(finished=False)
+    with open(path, 'rb+') as f: # The crash cut the last record (jobs[4] 'done') short
+        f.truncate(os.path.getsize(path) - 10)
+
+    state = ytp_engine.QueueJournal.load(path)
+    assert state['output_dir'] == str(tmp_path) and state['output_format'] == 'mp3' and state['urls'] == urls
+    loaded = state['jobs_by_item'][0]
+    assert [job.to_dict() for job in loaded] == [dict(job.to_dict(), total_tracks=5) for job in jobs]
+    # Finished jobs keep their state; interrupted ones (mid-stage, or whose last record was lost) start over
+    assert [job.status for job in loaded] == ['done', 'failed', 'pending', 'pending', 'pending']
+    assert state['expanded_items'] == {0}
+    assert state['pending'] == 3 + 1 # Plus the single video that was never expanded
+
+
+def test_aborted_jobs_are_journaled_as_pending(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    engine = Engine(tmp_path)
+    engine._journal = ytp_engine.QueueJournal(path)
+    engine._journal.start(str(tmp_path), 'mp3', ["https://www.youtube.com/playlist?list=PL"])
+    jobs = journal_jobs(str(tmp_path))[:2]
+    engine._journal.add_jobs(jobs)
+    engine._journal.finish_item(0, 2)
+    progress = ytp_engine.QueueProgress()
+    engine._finish_job(jobs[0], 'done', progress)
+    engine._finish_job(jobs[1], 'aborted', progress)
+    engine._journal.close(finished=False)
+
+    assert jobs[1].status == 'aborted'
+    loaded = ytp_engine.QueueJournal.load(path)['jobs_by_item'][0]
+    assert [job.status for job in loaded] == ['done', 'pending']
+
+
+def test_journal_of_a_finished_run_is_deleted(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ytp_engine.QueueJournal(path)
+    journal.start(str(tmp_path), 'mp3', ["https://youtu.be/aaaaaaaaaaa"])
+    journal.close(finished=True)
+    assert not os.path.exists(path)
+    assert ytp_engine.QueueJournal.load(path) is None
+
+
+def test_journal_with_nothing_left_to_do_is_not_resumed(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = ytp_engine.QueueJournal(path)
+    journal.start(str(tmp_path), 'mp3', ["https://www.youtube.com/playlist?list=PL"])
+    jobs = journal_jobs(str(tmp_path))[:2]
+    journal.add_jobs(jobs)
+    journal.finish_item(0, 2)
+    journal.set_state(jobs[0], 'done')
+    journal.set_state(jobs[1], 'failed')
+    journal.close(finished=False) # e.g. the app was closed before the run was marked finished
+    assert ytp_engine.QueueJournal.load(path) is None
+
+
+class Clock(object):
+    """Stands in for time.time in the caches; advanced by hand."""
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ytp_engine.time, 'time', clock)
+    return clock
+
+
+def test_lyrics_cache_answers_by_normalized_key(tmp_path, clock):
+    cache = ytp_engine.LyricsCache(str(tmp_path / "lyrics.sqlite3"))
+    assert cache.get("Artist", "Song") == (False, None)
+    cache.put("Artist", "Song (Official Video)", "la la la")
+    assert cache.get("ARTIST", "song") == (True, "la la la")
+    assert cache.get("Artist", "Song ft. Other [Lyrics]") == (True, "la la la")
+    assert cache.get("Artist", "Another Song") == (False, None)
+    cache.close()
+
+    reopened = ytp_engine.LyricsCache(str(tmp_path / "lyrics.sqlite3")) # Persistent across runs
+    assert reopened.get("Artist", "Song") == (True, "la la la")
+    reopened.close()
+
+
+def test_lyrics_cache_entries_expire(tmp_path, clock):
+    cache = ytp_engine.LyricsCache(str(tmp_path / "lyrics.sqlite3"), ttl=100, miss_ttl=10)
+    cache.put("Artist", "Found", "la la la")
+    cache.put("Artist", "Missing", None)
+    clock.advance(10)
+    assert cache.get("Artist", "Found") == (True, "la la la")
+    assert cache.get("Artist", "Missing") == (True, None) # A cached miss
+    clock.advance(1)
+    assert cache.get("Artist", "Missing") == (False, None) # Misses are retried sooner
+    assert cache.get("Artist", "Found") == (True, "la la la")
+    clock.advance(90)
+    assert cache.get("Artist", "Found") == (False, None)
+    cache.put("Artist", "Found", "la la la") # Looked up again: cached for another TTL
+    assert cache.get("Artist", "Found") == (True, "la la la")
+    cache.close()
+
+
+def test_lyrics_cache_evicts_least_recently_used_by_size(tmp_path, clock):
+    lyrics = "x" * 1000
+    entry_size = len(ytp_engine.normalize_lyrics_key("Artist", "A").encode('utf-8')) + len(lyrics)
+    cache = ytp_engine.LyricsCache(str(tmp_path / "lyrics.sqlite3"), max_bytes=2 * entry_size + entry_size // 2)
+    cache.put("Artist", "A", lyrics)
+    clock.advance(1)
+    cache.put("Artist", "B", lyrics)
+    clock.advance(1)
+    assert cache.get("Artist", "A") == (True, lyrics) # A is now used more recently than B
+    clock.advance(1)
+    cache.put("Artist", "C", lyrics)
+    assert cache.get("Artist", "B") == (False, None)
+    assert cache.get("Artist", "A") == (True, lyrics)
+    assert cache.get("Artist", "C") == (True, lyrics)
+    cache.close()
+
+
+def test_cached_lyrics_misses_cost_no_lookup(tmp_path, clock):
+    engine = Engine(tmp_path)
+    engine.log_message = lambda message, level="info": None
+    engine._lyrics_cache = ytp_engine.LyricsCache(str(tmp_path / "lyrics.sqlite3"))
+    lookups = []
+    def lookup(title, artist):
+        lookups.append(title)
+        return {"Found": ("la la la", True), "Missing": (None, True)}.get(title, (None, False)) # Else: the lookup failed
+    engine._scrape_lyrics_from_web = lookup
+    for _ in range(2):
+        assert engine._scrape_lyrics_online("Found", "Artist") == "la la la"
+        assert engine._scrape_lyrics_online("Missing", "Artist") is None
+        assert engine._scrape_lyrics_online("Error", "Artist") is None
+    assert lookups == ["Found", "Missing", "Error", "Error"] # Failed lookups are not cached
+    engine._lyrics_cache.close()
+
+
+def cover_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".jpg"))
+
+
+def test_album_art_cache_stores_identical_covers_once(tmp_path, clock):
+    directory = str(tmp_path / "album_art")
+    cache = ytp_engine.AlbumArtCache(directory)
+    cover = b"\xff\xd8 cover \xff\xd9"
+    cache.put("youtube:aaaaaaaaaaa/hqdefault@600q90", cover)
+    cache.put("youtube:bbbbbbbbbbb/hqdefault@600q90", cover) # Another video of the album, same cover
+    assert cover_files(directory) == [ytp_engine.hashlib.sha256(cover).hexdigest() + ".jpg"]
+    cache.close()
+
+    reopened = ytp_engine.AlbumArtCache(directory)
+    assert reopened.get("youtube:aaaaaaaaaaa/hqdefault@600q90") == cover
+    assert reopened.get("youtube:bbbbbbbbbbb/hqdefault@600q90") == cover
+    assert reopened.get("youtube:ccccccccccc/hqdefault@600q90") is None
+    assert reopened.get("youtube:aaaaaaaaaaa/hqdefault@600q90") == cover
+    assert reopened.stats == {'memory_hits': 1, 'disk_hits': 2, 'misses': 1}
+    reopened.close()
+
+
+def test_album_art_cache_evicts_least_recently_used_by_size(tmp_path, clock):
+    directory = str(tmp_path / "album_art")
+    cache = ytp_engine.AlbumArtCache(directory, max_bytes=250, memory_items=0) # Every get() reads the disk tier
+    covers = {name: name.encode() * 100 for name in "abc"}
+    cache.put("a", covers["a"])
+    cache.put("a-again", covers["a"]) # Second key of cover a
+    clock.advance(1)
+    cache.put("b", covers["b"])
+    clock.advance(1)
+    assert cache.get("a") == covers["a"] # a is now used more recently than b
+    clock.advance(1)
+    cache.put("c", covers["c"])
+    assert cache.get("b") is None
+    assert cache.get("a") == covers["a"] and cache.get("a-again") == covers["a"]
+    assert cache.get("c") == covers["c"]
+    assert len(cover_files(directory)) == 2
+
+    clock.advance(1)
+    cache.put("d", covers["c"] + b"d" * 100) # 201 bytes: only room for this one
+    assert cache.get("a") is None and cache.get("a-again") is None # Every key of an evicted cover goes with it
+    assert cache.get("c") is None
+    assert len(cover_files(directory)) == 1
+    cache.close()
+
+
+def test_album_art_cache_keeps_recent_covers_in_memory(tmp_path, clock):
+    cache = ytp_engine.AlbumArtCache(str(tmp_path / "album_art"), memory_items=2)
+    for name in "abc":
+        cache.put(name, name.encode() * 10)
+    assert list(cache._memory) == ["b", "c"]
+    assert cache.get("b") == b"b" * 10
+    assert cache.get("a") == b"a" * 10 # From disk, and back in memory
+    assert list(cache._memory) == ["b", "a"]
+    assert cache.stats == {'memory_hits': 1, 'disk_hits': 1, 'misses': 0}
+    cache.close()
+
+
+def test_album_art_cache_forgets_deleted_files(tmp_path, clock):
+    directory = str(tmp_path / "album_art")
+    cache = ytp_engine.AlbumArtCache(directory, memory_items=0)
+    cache.put("a", b"cover")
+    os.remove(os.path.join(directory, cover_files(directory)[0]))
+    assert cache.get("a") is None
+    cache.put("a", b"cover")
+    assert cache.get("a") == b"cover"
+    cache.close()
+
+
+def test_album_art_is_fetched_once_per_thumbnail(tmp_path, clock):
+    engine = Engine(tmp_path)
+    engine.log_message = lambda message, level="info": None
+    engine._album_art_cache = ytp_engine.AlbumArtCache(str(tmp_path / "album_art"))
+    fetched = []
+    def make_album_art(thumbnail_url):
+        fetched.append(thumbnail_url)
+        return b"cover of " + thumbnail_url.encode()
+    engine._make_album_art = make_album_art
+    # The same thumbnail from another host, in another format and with a signed query
+    first = engine._fetch_album_art("https://i.ytimg.com/vi/aaaaaaaaaaa/maxresdefault.jpg")
+    assert engine._fetch_album_art("https://i9.ytimg.com/vi_webp/aaaaaaaaaaa/maxresdefault.webp?sqp=x&rs=y") == first
+    assert engine._fetch_album_art("https://i.ytimg.com/vi/aaaaaaaaaaa/hqdefault.jpg") != first
+    assert fetched == ["https://i.ytimg.com/vi/aaaaaaaaaaa/maxresdefault.jpg", "https://i.ytimg.com/vi/aaaaaaaaaaa/hqdefault.jpg"]
+    engine._album_art_cache.close()
@@ -0,0 +1,118 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+import ytp_profile
+
+
+@pytest.mark.parametrize("name, group", [
+    ("album-art_3", "album-art"),
+    ("download_12", "download"),
+    ("transcode-1-2", "transcode"),
+    ("Thread-7 (worker)", "Thread (worker)"),
+    ("MainThread", "MainThread"),
+    ("7", "7"),
+])
+def test_thread_group(name, group):
+    assert ytp_profile.thread_group(name) == group
+
+
+@pytest.mark.parametrize("function, category", [
+    (('~', 0, "<method 'acquire' of '_thread.lock' objects>"), 'locks/queues'),
+    (('~', 0, "<method 'acquire' of '_thread.RLock' objects>"), 'locks/queues'),
+    (('~', 0, "<method 'get' of '_queue.SimpleQueue' objects>"), 'locks/queues'),
+    (('~', 0, "<built-in method time.sleep>"), 'sleep'),
+    (('~', 0, "<method 'recv_into' of '_socket.socket' objects>"), 'network'),
+    (('~', 0, "<method 'read' of '_ssl._SSLSocket' objects>"), 'network'),
+    (('~', 0, "<built-in method _socket.getaddrinfo>"), 'network'),
+    (('~', 0, "<built-in method posix.waitpid>"), 'subprocess'),
+    (('~', 0, "<method 'poll' of 'select.poll' objects>"), 'subprocess'),
+    (('~', 0, "<built-in method builtins.len>"), None),
+    (('ytp_engine.py', 10, "sleep"), None), # Not a built-in, even with a blocking name
+])
+def test_wait_category(function, category):
+    assert ytp_profile.wait_category(function) == category
+
+
+def test_wait_times_add_up_own_time_per_category():
+    class Stats(object):
+        stats = {
+            ('~', 0, "<built-in method time.sleep>"): (2, 2, 1.5, 1.5, {}),
+            ('~', 0, "<method 'acquire' of '_thread.lock' objects>"): (5, 5, 0.25, 0.25, {}),
+            ('~', 0, "<method 'acquire' of '_thread.RLock' objects>"): (1, 1, 0.5, 0.5, {}),
+            ('ytp_engine.py', 1, "work"): (1, 1, 3.0, 5.0, {}),
+        }
+    assert ytp_profile.wait_times(Stats()) == {'locks/queues': 0.75, 'sleep': 1.5, 'network': 0.0, 'subprocess': 0.0}
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def run_profiled_workload(profile_dir):
+    """Profiles a queue-like run: worker threads that compute, sleep and wait for a lock. Returns the ProfileReport."""
+    lock = threading.Lock()
+    def worker():
+        busy(0.02)
+        time.sleep(0.05)
+        with lock:
+            time.sleep(0.01)
+    profiler = ytp_profile.QueueProfiler(str(profile_dir))
+    profiler.start()
+    threads = [threading.Thread(target=worker, name=f"download_{k}") for k in range(3)]
+    threads.append(threading.Thread(target=worker, name="album-art_0"))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return profiler.stop()
+
+
+def test_queue_profiler_writes_the_profile_and_report(tmp_path):
+    report = run_profiled_workload(tmp_path)
+    assert os.path.isfile(report.prof_path) and report.prof_path.endswith(".prof")
+    assert os.path.isfile(report.report_path) and report.report_path.endswith(".txt")
+    assert os.path.splitext(report.prof_path)[0] == os.path.splitext(report.report_path)[0]
+    with open(report.report_path, encoding='utf-8') as f:
+        text = f.read()
+    assert "== CPU: top" in text and "== Thread waits (seconds) ==" in text
+
+    if sys.version_info < (3, 12): # One profiler per thread: the workers are grouped by name
+        assert report.thread_count == 5 # The calling thread and the four workers
+        assert set(report.waits_by_group) == {'MainThread', 'download', 'album-art'}
+        assert report.waits_by_group['download']['sleep'] >= 3 * 0.05
+    else:
+        assert set(report.waits_by_group) == {'all threads'}
+    assert sum(waits['sleep'] for waits in report.waits_by_group.values()) >= 4 * 0.05
+    assert any("busy" in label for label, _ in report.top_own_time)
+    assert report.wall_seconds > 0 and report.peak_traced_bytes > 0
+    assert report.summary_lines()[0].startswith("Profile of the queue run")
+
+
+def test_runs_in_the_same_second_do_not_overwrite_each_other(tmp_path, monkeypatch):
+    monkeypatch.setattr(ytp_profile.time, 'strftime', lambda format: "20260101-120000")
+    first = run_profiled_workload(tmp_path)
+    second = run_profiled_workload(tmp_path)
+    assert os.path.basename(first.prof_path) == "queue_run_20260101-120000.prof"
+    assert os.path.basename(second.prof_path) == "queue_run_20260101-120000-2.prof"
+    assert os.path.isfile(first.report_path) and os.path.isfile(second.report_path)
+
+
+def test_old_runs_are_pruned(tmp_path):
+    for day in range(1, 13):
+        for extension in (".prof", ".txt"):
+            (tmp_path / f"queue_run_202001{day:02d}-000000{extension}").write_text("old")
+    (tmp_path / "notes.txt").write_text("not a profile")
+    report = run_profiled_workload(tmp_path)
+
+    runs = sorted({os.path.splitext(name)[0] for name in os.listdir(tmp_path) if name.startswith("queue_run_")})
+    assert len(runs) == ytp_profile.PROFILE_KEEP_RUNS == 10
+    assert runs[0] == "queue_run_20200104-000000" # The three oldest are gone, with both of their files
+    assert runs[-1] == os.path.splitext(os.path.basename(report.prof_path))[0]
+    assert len([name for name in os.listdir(tmp_path) if name.startswith("queue_run_")]) == 20
+    assert (tmp_path / "notes.txt").exists()
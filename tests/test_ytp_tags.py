@@ -0,0 +1,89 @@
+import os
+
+import pytest
+from mutagen._tags import PaddingInfo
+from mutagen.id3 import ID3
+
+import ytp_tags
+
+
+MP3_FRAME = b"\xff\xfb\x90\x64" + bytes(413) # One silent MPEG-1 Layer III frame, 128 kbit/s
+AUDIO = MP3_FRAME * 100
+RESERVED_PADDING = 64 * 1024 # As reserved by the transcode stage (ffmpeg -metadata_header_padding)
+
+
+def make_mp3(path, padding=RESERVED_PADDING):
+    """Writes an MP3 whose ID3 tag is empty but for padding bytes; returns its path."""
+    with open(path, 'wb') as f:
+        f.write(AUDIO)
+    if padding is not None:
+        ID3().save(str(path), padding=lambda info: padding)
+    return str(path)
+
+
+def audio_after_tag(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data[data.index(MP3_FRAME):]
+
+
+def tag_track(path, cover_size):
+    tags = ytp_tags.open_tag_writer(path)
+    tags.set_title("Song")
+    tags.set_artists(["Artist", "Other Artist"])
+    tags.set_album("Album")
+    tags.set_year("2024")
+    tags.set_track(3, 12)
+    tags.set_cover(b"\xff\xd8" + bytes(cover_size) + b"\xff\xd9")
+    tags.set_lyrics("la la la\n" * 50)
+    return tags.save()
+
+
+def test_padding_keeper_keeps_the_tag_size_when_the_new_tag_fits():
+    keeper = ytp_tags.ID3PaddingKeeper(tag_size=70000)
+    # The new frames leave 50,000 bytes of the old tag; mutagen's default would shrink that padding
+    info = PaddingInfo(50000, 70000 + len(AUDIO))
+    assert info.get_default_padding() < 50000
+    assert keeper(info) == 50000
+    assert keeper.in_place is True
+    assert keeper.audio_bytes == len(AUDIO)
+
+
+def test_padding_keeper_lets_mutagen_pad_a_tag_that_outgrew_the_old_one():
+    keeper = ytp_tags.ID3PaddingKeeper(tag_size=1000)
+    info = PaddingInfo(-5000, 1000 + len(AUDIO))
+    assert keeper(info) == info.get_default_padding()
+    assert keeper.in_place is False
+    assert keeper.audio_bytes == len(AUDIO)
+
+
+def test_mp3_tags_are_written_into_the_reserved_padding(tmp_path):
+    path = make_mp3(tmp_path / "song.mp3")
+    tag_size = ID3(path).size
+    file_size = os.path.getsize(path)
+
+    keeper = tag_track(path, cover_size=30000)
+    assert keeper.in_place is True
+    assert os.path.getsize(path) == file_size # Nothing moved: the tag was overwritten in place
+    assert ID3(path).size == tag_size
+    assert audio_after_tag(path) == AUDIO
+    tags = ID3(path)
+    assert tags['TIT2'].text == ["Song"] and tags['TPE1'].text == ["Artist", "Other Artist"]
+    assert tags['TRCK'].text == ["3/12"] and len(tags['APIC:Cover'].data) == 30004
+
+    # Retagging with clear=False (e.g. a new track number) still fits
+    tags = ytp_tags.open_tag_writer(path, clear=False)
+    tags.set_track(4, 12)
+    assert tags.save().in_place is True
+    assert os.path.getsize(path) == file_size
+    assert ID3(path)['TRCK'].text == ["4/12"] and ID3(path)['TIT2'].text == ["Song"]
+
+
+@pytest.mark.parametrize("padding", [1024, None]) # Too little padding, and no tag at all
+def test_mp3_tags_that_do_not_fit_rewrite_the_file(tmp_path, padding):
+    path = make_mp3(tmp_path / "song.mp3", padding)
+    keeper = tag_track(path, cover_size=30000)
+    assert keeper.in_place is False
+    assert keeper.audio_bytes == len(AUDIO)
+    assert ID3(path).size > 30000
+    assert audio_after_tag(path) == AUDIO
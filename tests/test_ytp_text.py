@@ -0,0 +1,206 @@
+"""
+ytp_text must give exactly the output of the original per-pattern re.sub implementations (the QueueEngine
+methods it replaced), which are kept here as the reference.
+"""
+import random
+import re
+
+import pytest
+
+import ytp_text
+
+
+def reference_sanitize_filename(filename):
+    filename = re.sub(r'[<>:"/\\|?*]', '', filename)
+    filename = re.sub(r'\s+', ' ', filename).strip()
+    filename = re.sub(r'\.+', '.', filename).strip('.')
+    if len(filename) > 200:
+        filename = filename[:200]
+    return filename
+
+
+def reference_clean_name_suffix(name):
+    suffixes_to_remove = [
+        r' - Topic$',
+        r' - Official Audio$',
+        r' - Official Video$',
+        r'\(Official Music Video\)$',
+        r'\(Official Audio\)$',
+        r'\[Official Music Video\]$',
+        r'\[Official Audio\]$',
+        r'^Album - ',
+    ]
+    for suffix_pattern in suffixes_to_remove:
+        name = re.sub(suffix_pattern, '', name, flags=re.IGNORECASE).strip()
+    return name
+
+
+def reference_parse_artists(artist_string):
+    if not artist_string:
+        return []
+    artist_string = re.sub(r'\s*feat\.\s*', ',', artist_string, flags=re.IGNORECASE)
+    artist_string = re.sub(r'\s*ft\.\s*', ',', artist_string, flags=re.IGNORECASE)
+    artist_string = re.sub(r'\s*&\s*', ',', artist_string, flags=re.IGNORECASE)
+    artists = [reference_clean_name_suffix(a.strip()) for a in artist_string.split(',') if a.strip()]
+    return [a for a in artists if a]
+
+
+REAL_TITLES = [
+    "Rick Astley - Never Gonna Give You Up (Official Music Video)",
+    "Daft Punk - Get Lucky (Official Audio) ft. Pharrell Williams, Nile Rodgers",
+    "Queen – Bohemian Rhapsody (Official Video Remastered)",
+    "Ed Sheeran - Shape of You [Official Video]",
+    "Luis Fonsi - Despacito ft. Daddy Yankee",
+    "Dua Lipa & Elton John - Cold Heart (PNAU Remix) [Official Audio]",
+    "Calvin Harris, Dua Lipa - One Kiss (Official Video)",
+    "BLACKPINK - 'How You Like That' M/V",
+    "Billie Eilish - bad guy",
+    "AC/DC - Back In Black (Official Video)",
+    "Guns N' Roses - Sweet Child O' Mine (Official Music Video)",
+    "What's Up? - 4 Non Blondes",
+    "Travis Scott - SICKO MODE ft. Drake",
+    "Lil Nas X - Old Town Road (feat. Billy Ray Cyrus) [Remix]",
+    "Skrillex x Fred again.. x Flowdan - Rumble",
+    "Fred again.. - Delilah (pull me out of this)",
+    "Sigur Rós - Hoppípolla",
+    "BTS (방탄소년단) 'Dynamite' Official MV",
+    "米津玄師 MV「Lemon」",
+    "Stromae - Alors on danse (Official Music Video)",
+    "Rammstein - Du Hast (Official Video)",
+    "Мумий Тролль - Владивосток 2000",
+    "Café Tacvba - Eres",
+    "Nirvana - Smells Like Teen Spirit (Official Music Video)",
+    "The Weeknd - Blinding Lights (Official Audio)",
+    "Artist - Song | Live at Wembley 1986 | 4K",
+    "Song Title...   (Lyrics)  ",
+    "Who Are You? * Remastered 2011 *",
+]
+
+REAL_ARTISTS = [
+    "Rick Astley",
+    "Rick Astley - Topic",
+    "Daft Punk feat. Pharrell Williams & Nile Rodgers",
+    "Luis Fonsi ft. Daddy Yankee",
+    "Dua Lipa & Elton John",
+    "Calvin Harris, Dua Lipa",
+    "Skrillex x Fred again.. x Flowdan",
+    "Simon & Garfunkel",
+    "Earth, Wind & Fire",
+    "Tyler, The Creator",
+    "Lil Nas X feat. Billy Ray Cyrus",
+    "BTS (방탄소년단) - Topic",
+    "Queen - Official Audio",
+    "Rammstein - Official Video",
+    "Album - Greatest Hits",
+    "Sigur Rós",
+    "Beyoncé FEAT. JAY-Z",
+    "Post Malone FT. Swae Lee",
+    "Various Artists - Topic",
+    "Coldplay [Official Audio]",
+    "Mumford & Sons (Official Music Video)",
+]
+
+EDGE_CASES = [
+    "",
+    " ",
+    "   \t\n  ",
+    ".",
+    "...",
+    "CON",
+    "PRN",
+    "AUX",
+    "NUL",
+    "COM1",
+    "LPT1.txt",
+    "trailing dot.",
+    "trailing dots...",
+    "trailing space ",
+    "trailing dot and space. ",
+    " .leading dot and space",
+    ". . .",
+    '<>:"/\\|?*',
+    'a<b>c:d"e/f\\g|h?i*j',
+    "multiple   spaces\tand\ttabs\nand newlines",
+    "dots..in....the...middle",
+    "x" * 250,
+    "é" * 199 + " .",
+    "feat.",
+    "ft.",
+    "&",
+    " & ",
+    ",,,",
+    "A feat. B ft. C & D, E",
+    "A feat.B",
+    "A ft.B&C",
+    "A  FEAT.  B",
+    "A x B",
+    "A X B",
+    "A and B",
+    "Album - ",
+    "Album - Album - Name",
+    " - Topic",
+    "Name - Topic - Topic",
+    "Name (Official Audio) - Topic",
+    "Name - Topic (Official Audio)",
+    "Name - topic",
+    "Name - TOPIC  ",
+    "Name [Official Music Video] [Official Audio]",
+    "Crème Brûlée & Ñandú",
+    "Москва feat. 北京",
+    "🔥 Fire 🔥 ft. 🎵",
+    "Zero\u200bWidth\u200bSpace",
+    "non\u00a0breaking\u00a0space",
+    "full\u3000width\u3000space",
+]
+
+ALL_INPUTS = REAL_TITLES + REAL_ARTISTS + EDGE_CASES
+
+
+@pytest.fixture(autouse=True)
+def cold_caches():
+    ytp_text.clean_name_suffix.cache_clear()
+    ytp_text._parse_artists.cache_clear()
+
+
+@pytest.mark.parametrize("text", ALL_INPUTS)
+def test_sanitize_filename(text):
+    assert ytp_text.sanitize_filename(text) == reference_sanitize_filename(text)
+
+
+@pytest.mark.parametrize("text", ALL_INPUTS)
+def test_clean_name_suffix(text):
+    assert ytp_text.clean_name_suffix(text) == reference_clean_name_suffix(text)
+    assert ytp_text.clean_name_suffix(text) == reference_clean_name_suffix(text) # Now from the cache
+
+
+@pytest.mark.parametrize("text", ALL_INPUTS)
+def test_parse_artists(text):
+    assert ytp_text.parse_artists(text) == reference_parse_artists(text)
+    assert ytp_text.parse_artists(text) == reference_parse_artists(text) # Now from the cache
+
+
+def test_parse_artists_of_none():
+    assert ytp_text.parse_artists(None) == reference_parse_artists(None) == []
+
+
+def test_parse_artists_returns_a_new_list_every_call():
+    artists = ytp_text.parse_artists("A & B")
+    artists.append("C")
+    assert ytp_text.parse_artists("A & B") == ["A", "B"]
+
+
+def test_sanitize_filenames():
+    assert ytp_text.sanitize_filenames(ALL_INPUTS) == [reference_sanitize_filename(text) for text in ALL_INPUTS]
+
+
+def test_random_strings():
+    # Strings built from the characters and fragments the patterns care about, in random combinations
+    fragments = ["a", "B", "é", "愛", " ", "  ", "\t", "\n", "\u00a0", "\u3000", ".", "..", ",", "&", " & ", "feat.", " FEAT. ", "ft.", " Ft. ",
+                 " x ", "<", ">", ":", '"', "/", "\\", "|", "?", "*", " - Topic", " - Official Audio", " - Official Video",
+                 "(Official Music Video)", "(Official Audio)", "[Official Music Video]", "[official audio]", "Album - "]
+    rng = random.Random(17)
+    for _ in range(5000):
+        text = "".join(rng.choice(fragments) for _ in range(rng.randint(0, 12)))
+        assert ytp_text.sanitize_filename(text) == reference_sanitize_filename(text), text
+        assert ytp_text.clean_name_suffix(text) == reference_clean_name_suffix(text), text
+        assert ytp_text.parse_artists(text) == reference_parse_artists(text), text
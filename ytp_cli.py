@@ -0,0 +1,294 @@
+"""
+Headless command line for the YouTube Content Downloader.
+
+Runs the same download queue engine as the GUI (ytp_engine) without importing tkinter or
+customtkinter, so batches can run from cron on machines without a display.
+Progress is written to stdout as JSON lines (one object per line, see HeadlessDownloader.emit);
+log messages go to stderr.
+
+Exit codes:
+    0    every queue item was downloaded
+    1    at least one queue item failed
+    2    invalid arguments or setup (no URLs, bad URL, FFmpeg not found, ...)
+    130  interrupted (SIGINT/SIGTERM); the run can be continued with --resume
+
+Examples:
+    python ytp_cli.py -o ~/Music -f mp3 --mp3-quality 256k "https://www.youtube.com/playlist?list=..."
+    python ytp_cli.py -i urls.txt -o /srv/media -f mp4 --video-quality 720p > progress.jsonl
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import signal
+import sys
+import threading
+import time
+from ytp_engine import QueueEngine, QueueJournal, is_valid_queue_url
+
+
+EXIT_OK = 0
+EXIT_ITEMS_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+# Command line format names -> output formats understood by the queue engine
+OUTPUT_FORMATS = {'mp3': "Audio (MP3)", 'opus': "Audio (Opus)", 'm4a': "Audio (M4A)", 'mp4': "Video (MP4)"}
+
+LOG_LEVELS = {'debug': 0, 'info': 1, 'warning': 2, 'error': 3}
+
+
+class HeadlessDownloader(QueueEngine):
+    """Queue engine front-end that reports to stdout (JSON lines) and stderr (log) instead of a GUI."""
+    def __init__(self, settings, log_level="info", stdout=None, stderr=None):
+        self.settings = settings
+        self.abort_download_flag = threading.Event()
+        self.download_queue = []
+        self.queue_progress = None
+        self.min_log_level = LOG_LEVELS[log_level]
+        self.stdout = stdout or sys.stdout
+        self.stderr = stderr or sys.stderr
+        self._output_lock = threading.Lock() # Keeps lines from different worker threads whole
+        self.timings_path = None # --timings-json; None: the engine's default location
+
+    def emit(self, event, **fields):
+        """Writes one JSON progress event to stdout: {"event": ..., "time": <unix time>, ...fields}."""
+        line = json.dumps({'event': event, 'time': round(time.time(), 3), **fields})
+        with self._output_lock:
+            self.stdout.write(line + "\n")
+            self.stdout.flush()
+
+    def log_message(self, message, level="info"):
+        """Writes a log message to stderr, in the same format as the GUI activity log."""
+        if LOG_LEVELS.get(level, 1) < self.min_log_level:
+            return
+        current_time = time.strftime("%H:%M:%S")
+        with self._output_lock:
+            self.stderr.write(f"[{current_time}] {level.upper()}: {message}\n")
+            self.stderr.flush()
+
+    def show_error(self, title, message):
+        self.log_message(f"{title}: {message}", level="error")
+
+    def show_info(self, title, message):
+        self.log_message(f"{title}: {message}", level="info")
+
+    def _get_journal_path(self):
+        # Separate from the GUI's journal, so a cron run never offers itself for resuming in the GUI (or vice versa)
+        return os.path.join(os.path.dirname(self._get_config_path()), "cli_queue_journal.jsonl")
+
+    def _get_run_timings_path(self):
+        return self.timings_path or super()._get_run_timings_path()
+
+    def _finish_job(self, job, status, progress):
+        super()._finish_job(job, status, progress)
+        self.emit('download', item=job.queue_index, url=job.url, title=job.title,
+                  track=job.track_number, status=status, path=job.audio_path or job.downloaded_path)
+
+    def run(self, urls, output_dir, output_format, resume_state=None, progress_interval=1.0):
+        """
+        Runs the queue to completion, emitting a 'progress' event every progress_interval seconds
+        and one 'item' event per queue URL. Returns the process exit code.
+        """
+        self.download_queue = urls
+        self.emit('start', items=len(urls), output_dir=output_dir, format=output_format, resumed=resume_state is not None)
+
+        result = {}
+        queue_thread = threading.Thread(
+            target=lambda: result.update(jobs_by_item=self.run_download_queue(output_dir, output_format, resume_state)))
+        queue_thread.daemon = True
+        queue_thread.start()
+        while queue_thread.is_alive():
+            queue_thread.join(progress_interval) # Also lets SIGINT/SIGTERM handlers run promptly
+            progress = self.queue_progress
+            if progress is not None and queue_thread.is_alive():
+                self.emit('progress', **progress.snapshot())
+
+        jobs_by_item = result.get('jobs_by_item') or {}
+        abort_requested = self.abort_download_flag.is_set()
+        items_done = items_failed = items_aborted = 0
+        for index, url in enumerate(urls):
+            jobs = jobs_by_item.get(index)
+            if jobs and all(job.status == 'done' for job in jobs):
+                status = 'done'
+                items_done += 1
+            elif abort_requested and (index not in jobs_by_item or any(job.status in ('pending', 'aborted') for job in jobs or [])):
+                status = 'aborted' # Not (fully) attempted; --resume picks it up
+                items_aborted += 1
+            else:
+                status = 'failed'
+                items_failed += 1
+            failed_downloads = sum(1 for job in jobs or [] if job.status == 'failed')
+            self.emit('item', item=index, url=url, status=status, downloads=len(jobs or []), failed_downloads=failed_downloads)
+
+        aborted = items_aborted > 0 # An interrupt that arrived after the last download changes nothing
+        if aborted:
+            exit_code = EXIT_INTERRUPTED
+        elif items_failed:
+            exit_code = EXIT_ITEMS_FAILED
+        else:
+            exit_code = EXIT_OK
+        self.emit('finish', items=len(urls), items_done=items_done, items_failed=items_failed,
+                  aborted=aborted, exit_code=exit_code)
+        return exit_code
+
+
+def read_url_files(paths):
+    """Reads URLs from text files (one per line, lines starting with '#' are comments); '-' reads standard input."""
+    urls = []
+    for path in paths:
+        if path == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        urls.extend(line.strip() for line in lines if not line.lstrip().startswith('#'))
+    return urls
+
+
+def positive_int(value):
+    """argparse type: an integer of at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive integer, got {value!r}")
+    return number
+
+
+def positive_float(value):
+    """argparse type: a finite number greater than 0."""
+    try:
+        number = float(value)
+    except ValueError:
+        number = 0.0
+    if not (number > 0 and math.isfinite(number)):
+        raise argparse.ArgumentTypeError(f"expected a positive number, got {value!r}")
+    return number
+
+
+def worker_count(value):
+    """argparse type: 'auto' or a positive integer (the 'transcode_workers' setting)."""
+    if value.strip().lower() == 'auto':
+        return 'auto'
+    try:
+        return positive_int(value)
+    except argparse.ArgumentTypeError:
+        raise argparse.ArgumentTypeError(f"expected 'auto' or a positive integer, got {value!r}") from None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Download YouTube videos and playlists without the GUI. "
+                    "Defaults come from the GUI's settings file; options override them for this run.",
+        epilog="Progress is written to stdout as JSON lines. Exit codes: 0 all items downloaded, "
+               "1 some items failed, 2 invalid arguments or setup, 130 interrupted (continue with --resume).")
+    parser.add_argument('urls', nargs='*', help="YouTube video, shorts or playlist URLs")
+    parser.add_argument('-i', '--input-file', action='append', default=[], metavar='FILE',
+                        help="read URLs from FILE, one per line ('-' for standard input); may be repeated")
+    parser.add_argument('-o', '--output-dir', help="output directory (created if missing)")
+    parser.add_argument('-f', '--format', choices=sorted(OUTPUT_FORMATS), default='mp3', help="output format (default: mp3); opus and m4a keep YouTube's audio stream without re-encoding it")
+    parser.add_argument('--mp3-quality', choices=["128k", "192k", "256k", "320k"], help="MP3 bitrate (also used to encode Opus/M4A sources in another codec)")
+    parser.add_argument('--video-quality', choices=["360p", "480p", "720p", "1080p", "1440p", "2160p", "best"], help="maximum video resolution")
+    parser.add_argument('--ffmpeg', metavar='PATH', help="path to the ffmpeg executable")
+    parser.add_argument('--concurrent-downloads', type=positive_int, metavar='N', help="number of download workers")
+    parser.add_argument('--transcode-workers', type=worker_count, metavar='N', help="number of MP3 transcode / Opus and M4A remux workers, or 'auto'")
+    parser.add_argument('--tagging-workers', type=positive_int, metavar='N', help="number of tagging workers")
+    parser.add_argument('--bandwidth-limit', type=float, metavar='KIB_PER_S',
+                        help="total download bandwidth in KiB/s, shared by all downloads (0: unlimited)")
+    parser.add_argument('--host-rate', type=float, metavar='N',
+                        help="requests per second to any one host (0: unlimited); slowed down further on HTTP 429/403")
+    parser.add_argument('--skip-lyrics', action='store_true', help="do not scrape lyrics")
+    parser.add_argument('--skip-album-art', action='store_true', help="do not embed album art")
+    parser.add_argument('--no-archive', action='store_true', help="re-download videos recorded in the download archive")
+    parser.add_argument('--sync', action='store_true',
+                        help="sync playlist folders: only download new tracks, rename/retag moved ones, move removed ones aside")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue the last interrupted command line run (URLs, output directory and format are taken from it)")
+    parser.add_argument('--progress-interval', type=positive_float, default=1.0, metavar='SECONDS',
+                        help="seconds between progress events (default: 1)")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile the run (CPU, memory allocations, thread waits) into the config directory's profiles folder; also YTP_PROFILE=1")
+    parser.add_argument('--timings-json', metavar='FILE',
+                        help="save the per-stage timing report of the run to FILE (default: last_run_timings.json in the config directory)")
+    parser.add_argument('--log-level', choices=list(LOG_LEVELS), default='info', help="minimum level logged to stderr (default: info)")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    downloader = HeadlessDownloader(None, log_level=args.log_level)
+    settings = downloader._load_settings()
+    overrides = {
+        'output_dir': args.output_dir,
+        'mp3_quality': args.mp3_quality,
+        'video_quality': args.video_quality,
+        'ffmpeg_path': args.ffmpeg,
+        'max_concurrent_downloads': args.concurrent_downloads,
+        'transcode_workers': args.transcode_workers,
+        'tagging_workers': args.tagging_workers,
+        'bandwidth_limit': args.bandwidth_limit,
+        'host_requests_per_second': args.host_rate,
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    if args.skip_lyrics:
+        settings['skip_lyrics_scrape'] = True
+    if args.skip_album_art:
+        settings['skip_album_art'] = True
+    if args.no_archive:
+        settings['use_download_archive'] = False
+    if args.sync:
+        settings['sync_playlists'] = True
+    if args.profile:
+        settings['profile_queue_runs'] = True
+    downloader.settings = settings
+    if args.timings_json:
+        downloader.timings_path = os.path.abspath(os.path.expanduser(args.timings_json))
+
+    resume_state = None
+    if args.resume:
+        resume_state = QueueJournal.load(downloader._get_journal_path())
+        if resume_state is None:
+            downloader.log_message("No interrupted run to resume.", level="error")
+            return EXIT_USAGE
+        urls = resume_state['urls']
+        output_dir = resume_state['output_dir']
+        output_format = resume_state['output_format']
+    else:
+        try:
+            urls = list(args.urls) + read_url_files(args.input_file)
+        except OSError as e:
+            parser.error(f"cannot read URL file: {e}")
+        urls = list(dict.fromkeys(url for url in urls if url)) # Drop blanks and duplicates, keep order
+        if not urls:
+            parser.error("no URLs given")
+        invalid = [url for url in urls if not is_valid_queue_url(url)]
+        if invalid:
+            parser.error(f"invalid YouTube URL: {invalid[0]}")
+        output_dir = os.path.abspath(os.path.expanduser(settings['output_dir']))
+        output_format = OUTPUT_FORMATS[args.format]
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+        except OSError as e:
+            parser.error(f"cannot create output directory: {e}")
+
+    ffmpeg_executable = downloader._get_ffmpeg_executable()
+    if shutil.which(ffmpeg_executable) is None:
+        downloader.log_message(f"FFmpeg not found at '{ffmpeg_executable}'. Use --ffmpeg or set its path in the GUI settings.", level="error")
+        return EXIT_USAGE
+
+    def request_abort(signum, frame):
+        downloader.log_message("Interrupted, stopping after the files in progress...", level="warning")
+        downloader.abort_download_flag.set()
+    signal.signal(signal.SIGINT, request_abort)
+    signal.signal(signal.SIGTERM, request_abort)
+
+    return downloader.run(urls, output_dir, output_format, resume_state, args.progress_interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
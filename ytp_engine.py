@@ -0,0 +1,2560 @@
+"""
+Download queue engine of the YouTube Content Downloader.
+
+Everything needed to run a download queue (playlist expansion, the download -> transcode -> tag
+pipeline, the download archive and the queue journal) without any GUI toolkit, so it is shared by
+the customtkinter app (ytpgui4.5.py) and the headless command line (ytp_cli.py).
+This module must never import tkinter or customtkinter.
+
+Heavy dependencies are imported where they are first needed, so that starting the GUI or the
+command line does not pay for them: yt_dlp when a queue runs, requests/PIL when album art is
+fetched, bs4 when lyrics are scraped and mutagen when tags are written.
+benchmarks/startup_benchmark.py checks that none of them is loaded at startup.
+"""
+import os
+import threading
+import queue # Thread-safe job queue for the download worker pool
+import concurrent.futures # Background album art / lyrics prefetching
+import bisect # Prefix lookups in the sorted output directory index
+import sqlite3 # Persistent download archive and lyrics cache
+import subprocess
+import re # For cleaning filenames and text
+import unicodedata # Normalizing lyrics cache keys
+import time # For logging timestamps and simulating delays
+import math
+import json # For saving/loading settings
+import hashlib # Content addresses of cached album art
+import collections # In-memory LRU tier of the album art cache
+import itertools
+import contextlib # Timing spans (see RunTimings)
+from appdirs import user_config_dir # For cross-platform config directory
+import ytp_text # File name / artist / album name normalization
+import ytp_tags # Tag writers for MP3 / Opus / M4A files
+import ytp_profile # Opt-in profiling of queue runs
+import sys # Import sys for PyInstaller checks
+
+
+# --- Determine if running in a PyInstaller bundle ---
+# This flag will be True if the application is running as a PyInstaller-created executable.
+IS_FROZEN = getattr(sys, 'frozen', False)
+
+# Determine the correct FFmpeg executable name based on OS
+if sys.platform.startswith('win'):
+    FFMPEG_EXECUTABLE_NAME = 'ffmpeg.exe'
+else: # Linux, macOS
+    FFMPEG_EXECUTABLE_NAME = 'ffmpeg'
+
+# Determine the default FFmpeg path based on the execution environment
+if IS_FROZEN:
+    # When bundled by PyInstaller, files added with --add-binary or --add-data
+    # are often placed in the root of sys._MEIPASS (for 'onefile' mode)
+    # or in the directory of the executable (for 'onedir' mode).
+    # sys._MEIPASS is a temporary directory created for onefile executables.
+    # We prioritize sys._MEIPASS if it exists, otherwise assume 'onedir' mode
+    # where resources are relative to the executable's directory.
+    _base_path = sys._MEIPASS if hasattr(sys, '_MEIPASS') else os.path.dirname(sys.executable)
+    DEFAULT_FFMPEG_PATH_DETERMINED = os.path.join(_base_path, FFMPEG_EXECUTABLE_NAME)
+else:
+    # When running as a standard Python script (development environment),
+    # assume FFmpeg is in the same directory as the script.
+    # If you prefer to rely on system PATH during development, change this to "ffmpeg".
+    DEFAULT_FFMPEG_PATH_DETERMINED = os.path.join(os.path.dirname(os.path.abspath(__file__)), FFMPEG_EXECUTABLE_NAME)
+
+
+# --- Configuration ---
+# This variable now holds the *initial* default FFmpeg path,
+# which is dynamically set based on whether the app is bundled or not.
+# User settings will always override this initial default if they have saved a custom path.
+DEFAULT_FFMPEG_PATH = DEFAULT_FFMPEG_PATH_DETERMINED
+
+
+# Shared HTTP session for thumbnails and lyrics scraping (see get_http_session)
+HTTP_TIMEOUT = (5, 15) # (connect, read) seconds, for every request
+HTTP_MAX_POOLED_HOSTS = 16 # Hosts with a kept-alive connection pool (thumbnail CDN, Google, lyrics sites)
+HTTP_MAX_CONNECTIONS_PER_HOST = 4 # Requests to one host beyond this wait for a free connection
+HTTP_RETRIES = 3 # Retries of connection errors, 429 and 5xx responses
+HTTP_RETRY_BACKOFF = 0.5 # Seconds before the first retry, doubled for every further retry
+
+# Rate limiting (see TokenBucket and HostRateLimiter)
+BANDWIDTH_BURST_SECONDS = 1.0 # The bandwidth limit may be exceeded by this many seconds' worth of bytes at once
+HOST_THROTTLED_STATUSES = (429, 403) # Answers taken as "too many requests" from a host
+HOST_BACKOFF_MIN_INTERVAL = 1.0 # Seconds between requests to a host after its first throttled answer (at least)
+HOST_BACKOFF_MAX_INTERVAL = 30.0 # Seconds between requests to a host, at most, however often it throttles
+HOST_BACKOFF_RECOVERY = 5 # Successful requests in a row after which a throttled host's interval is halved again
+YOUTUBE_HOST = 'www.youtube.com' # Host name the video downloads are paced under
+
+# Lyrics cache (see LyricsCache)
+LYRICS_CACHE_MAX_BYTES = 32 * 1024 * 1024 # Least recently used entries are evicted beyond this
+LYRICS_CACHE_TTL = 180 * 24 * 3600 # Seconds before found lyrics are looked up again
+LYRICS_CACHE_MISS_TTL = 14 * 24 * 3600 # Seconds before a "no lyrics found" result is retried
+
+# Album art (see QueueEngine._fetch_album_art and AlbumArtCache)
+ALBUM_ART_SIZE = 1000 # Width and height of the square cover, in pixels
+ALBUM_ART_JPEG_QUALITY = 90
+ALBUM_ART_CACHE_MAX_BYTES = 256 * 1024 * 1024 # Least recently used covers are evicted from disk beyond this
+ALBUM_ART_MEMORY_CACHE_ITEMS = 64 # Covers kept in memory (roughly 100-300 KB each)
+ALBUM_ART_WORKERS = min(4, os.cpu_count() or 1) # Threads decoding / resizing / encoding covers during a queue run
+
+# Audio output formats: format menu name -> (file extension, youtube-dlp format selection)
+AUDIO_FORMATS = {
+    "Audio (MP3)": ('mp3', 'bestaudio/best'),
+    "Audio (Opus)": ('opus', 'bestaudio[acodec=opus]/bestaudio/best'),
+    "Audio (M4A)": ('m4a', 'bestaudio[ext=m4a]/bestaudio[acodec^=mp4a]/bestaudio/best'),
+}
+# MP3s are always encoded. These copy YouTube's audio stream into their container without re-encoding it
+# (see QueueEngine._remux_audio), and only encode sources in another codec:
+# extension -> (codec copied as is, ffmpeg muxer, ffmpeg encoder for other codecs)
+AUDIO_PASSTHROUGH_CONTAINERS = {
+    'opus': ('opus', 'opus', 'libopus'), # Ogg Opus, YouTube's Opus comes in WebM
+    'm4a': ('mp4a', 'ipod', 'aac'),
+}
+
+# Single-write tagging: ID3 padding reserved in the MP3 when transcoding (see QueueEngine._id3_padding),
+# so that the tags fit into it and the audio is not moved (rewritten) when they are saved
+ID3_PADDING_TEXT_FRAMES = 4 * 1024 # Title, artist, album, year and track frames, with room for a longer TRCK later
+ID3_PADDING_ALBUM_ART = 320 * 1024 # For a cover whose size is not known yet (1000x1000 covers are about 100-300 KB)
+ID3_PADDING_LYRICS = 8 * 1024 # For lyrics that have not been looked up yet
+
+# Opt-in profiling of queue runs (see QueueEngine.run_download_queue): "1" profiles every run, "0" none,
+# whatever the 'profile_queue_runs' setting says
+PROFILE_ENV_VAR = 'YTP_PROFILE'
+
+# Playlist entries are listed (and turned into jobs) this many at a time; YouTube serves 100 per page
+PLAYLIST_PAGE_SIZE = 100
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Returns the process-wide requests.Session used for album art and lyrics requests, creating it on first use.
+    Connections are kept alive and pooled per host, so a playlist reuses a handful of TCP/TLS connections
+    instead of opening a new one for every thumbnail, search and lyrics page. Safe to use from several threads.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util.retry import Retry
+            retry = Retry(
+                total=HTTP_RETRIES,
+                backoff_factor=HTTP_RETRY_BACKOFF,
+                status_forcelist=(500, 502, 503, 504), # 429 is retried by http_get, paced by the host rate limiter
+                allowed_methods=frozenset(['GET', 'HEAD']),
+                respect_retry_after_header=False, # Otherwise 429 would be retried here, bypassing the host backoff
+                raise_on_status=False, # Hand back the last response so raise_for_status reports it
+            )
+            adapter = HTTPAdapter(pool_connections=HTTP_MAX_POOLED_HOSTS, pool_maxsize=HTTP_MAX_CONNECTIONS_PER_HOST,
+                                  pool_block=True, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket: tokens refill at rate per second up to capacity, and consume(amount) takes
+    amount of them, sleeping for as long as the bucket is in debt afterwards. As the bandwidth limit
+    (one token per byte) it is shared by all download workers, so together they stay under the limit.
+    """
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.waited = 0.0 # Total seconds callers were held back
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        """Takes amount tokens, waiting until the bucket has refilled enough for them. Returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            # A debt is paid by this caller's wait; later callers also wait for the refill it used up
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostRateLimiter(object):
+    """
+    Per-host request pacing with adaptive backoff, shared by all threads.
+    wait(host) holds a request back until the host's interval since its previous request has passed
+    (1 / requests_per_second, or no wait if unlimited). A throttled answer (HTTP 429/403) doubles that host's
+    interval, up to HOST_BACKOFF_MAX_INTERVAL (or to a shorter Retry-After); HOST_BACKOFF_RECOVERY successful
+    requests in a row halve it again, back down to the configured interval. Changes are logged through log.
+    """
+    def __init__(self, requests_per_second=0, log=None):
+        self._hosts = {} # host -> [interval, time of the next free slot, successes since the last throttled answer]
+        self._lock = threading.Lock()
+        self.configure(requests_per_second, log)
+
+    def configure(self, requests_per_second, log=None):
+        """Sets the normal rate for every host (0: unlimited) and the log callback; forgets earlier backoffs."""
+        with self._lock:
+            self.base_interval = 1.0 / requests_per_second if requests_per_second else 0.0
+            self.log = log
+            self.throttled_count = 0
+            self._hosts.clear()
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = [self.base_interval, 0.0, 0]
+        return state
+
+    def wait(self, host):
+        """Waits for the host's next free request slot. Returns the seconds waited."""
+        with self._lock:
+            state = self._state(host)
+            now = time.monotonic()
+            start = max(now, state[1])
+            state[1] = start + state[0] # Reserve the slot, so threads waiting for the same host are spaced out
+        if start > now:
+            time.sleep(start - now)
+        return start - now
+
+    def throttled(self, host, status, retry_after=None):
+        """Records a throttled answer from host: slows the requests to it down."""
+        with self._lock:
+            state = self._state(host)
+            interval = min(HOST_BACKOFF_MAX_INTERVAL, max(state[0] * 2, HOST_BACKOFF_MIN_INTERVAL, retry_after or 0))
+            state[0] = interval
+            state[1] = max(state[1], time.monotonic() + interval)
+            state[2] = 0
+            self.throttled_count += 1
+            log = self.log
+        if log is not None:
+            log(f"Rate limited by {host} (HTTP {status}): slowing down to one request every {interval:.1f} s.", level="warning")
+
+    def succeeded(self, host):
+        """Records a successful request to host: after enough of them, a slowed-down host is sped up again."""
+        with self._lock:
+            state = self._state(host)
+            if state[0] <= self.base_interval:
+                return
+            state[2] += 1
+            if state[2] < HOST_BACKOFF_RECOVERY:
+                return
+            state[0] = max(self.base_interval, state[0] / 2)
+            state[2] = 0
+            interval = state[0]
+            recovered = interval <= self.base_interval
+            log = self.log
+        if log is not None:
+            if recovered:
+                log(f"Requests to {host} are back to their normal rate.")
+            else:
+                log(f"Requests to {host} sped up to one every {interval:.1f} s.")
+
+
+# Paces the album art / lyrics requests (see http_get) and the video downloads; configured for each queue run
+host_rate_limiter = HostRateLimiter()
+
+
+def http_get(url, **kwargs):
+    """
+    GET through the shared HTTP session (see get_http_session), paced per host by host_rate_limiter.
+    429 answers are retried (up to HTTP_RETRIES times) after the backoff they cause; 403 answers are returned
+    as they are, but also slow the host down. Returns the response.
+    """
+    from urllib.parse import urlsplit
+    host = urlsplit(url).hostname or ''
+    session = get_http_session()
+    for attempt in range(HTTP_RETRIES + 1):
+        host_rate_limiter.wait(host)
+        response = session.get(url, **kwargs)
+        if response.status_code not in HOST_THROTTLED_STATUSES:
+            host_rate_limiter.succeeded(host)
+            return response
+        retry_after = response.headers.get('Retry-After', '')
+        host_rate_limiter.throttled(host, response.status_code, float(retry_after) if retry_after.isdigit() else None)
+        if response.status_code != 429:
+            break
+    return response
+
+
+# --- youtube-dlp Custom Logger and Progress Hook ---
+class FFmpegNotFoundError(Exception):
+    """The ffmpeg executable could not be launched (see QueueEngine._run_ffmpeg). Stops the whole queue."""
+
+
+class YTDL_Logger(object):
+    """Custom logger to pipe youtube-dlp messages to the queue engine's log."""
+    def __init__(self, app_instance):
+        self.app = app_instance
+
+    def debug(self, msg):
+        # Filter out overly verbose debug messages, keep essential ones
+        if any(keyword in msg for keyword in ["Downloading webpage", "Extracting URL", "Downloading", "Destination", "ffmpeg"]):
+            self.app.log_message(f"[YTDL] {msg}", level="debug")
+        pass # Comment out for less verbose debug logs in GUI
+
+    def warning(self, msg):
+        self.app.log_message(f"[YTDL WARNING] {msg}", level="warning")
+
+    def error(self, msg):
+        # Errors from ytdlp should ideally trigger a GUI messagebox, not just log
+        self.app.log_message(f"[YTDL ERROR] {msg}", level="error")
+        self.app.show_error("youtube-dlp Error", msg)
+
+class YTDL_Progress_Hook(object):
+    """
+    Custom progress hook: records download progress in the app's shared QueueProgress.
+    It does no GUI work itself; the GUI refreshes from QueueProgress at a capped rate.
+    """
+    def __init__(self, app_instance):
+        self.app = app_instance
+        self.bandwidth_limiter = None # Shared TokenBucket of the queue run, if the bandwidth is limited
+        self._limited_bytes = {} # filename -> bytes already taken from the bandwidth limiter
+
+    def __call__(self, d):
+        progress = self.app.queue_progress
+        filename = d.get('filename', 'Unknown File')
+
+        if d['status'] == 'downloading':
+            if progress is not None:
+                total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
+                progress.update_file(filename, d.get('downloaded_bytes') or 0, total_bytes, d.get('speed'))
+            if self.bandwidth_limiter is not None:
+                # Called after every block received: holding the download thread back here paces its transfer
+                downloaded_bytes = d.get('downloaded_bytes') or 0
+                new_bytes = downloaded_bytes - self._limited_bytes.get(filename, 0)
+                self._limited_bytes[filename] = downloaded_bytes
+                if new_bytes > 0:
+                    self.bandwidth_limiter.consume(new_bytes)
+
+        elif d['status'] == 'finished':
+            self._limited_bytes.pop(filename, None)
+            self.app.log_message(f"[DOWNLOAD] Finished processing: {filename}", level="info")
+            if progress is not None:
+                progress.finish_file(filename, d.get('total_bytes') or d.get('downloaded_bytes'))
+
+        elif d['status'] == 'error':
+            self._limited_bytes.pop(filename, None)
+            self.app.log_message(f"[DOWNLOAD ERROR] {filename}: {d.get('error', 'An error occurred.')}", level="error")
+            if progress is not None:
+                progress.finish_file(filename, None)
+
+
+def format_bytes(num_bytes):
+    """Formats a byte count for display, e.g. 1536 -> '1.5 KiB'."""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(num_bytes) < 1024 or unit == "GiB":
+            return f"{num_bytes:.1f} {unit}" if unit != "B" else f"{int(num_bytes)} B"
+        num_bytes /= 1024
+
+
+def format_duration(seconds):
+    """Formats a number of seconds as M:SS or H:MM:SS."""
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def percentile(sorted_values, fraction):
+    """Returns the nearest-rank percentile (fraction 0..1) of a sorted, non-empty list."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+
+class RunTimings(object):
+    """
+    Timing spans of one queue run: how long each stage took for every job, and how many bytes it handled
+    (recorded from any thread), summarized per stage at the end (see summary). Stages of a run:
+      playlist_extraction, playlist_page      listing a playlist (first request, then every further page)
+      download                                youtube-dlp extraction and download of one video
+      transcode / remux                       ffmpeg: MP3 encode, or copy into the Opus / M4A container
+      tagging                                 process_audio_metadata, all of the below included
+      prefetch_wait                           tagging waiting for the album art / lyrics fetched in the background
+      album_art, thumbnail_download, album_art_processing
+      lyrics, lyrics_lookup, google_search, lyrics_page
+      tag_save                                writing the tags into the file
+    Prefetched album art and lyrics are timed where they are fetched, so their spans overlap other stages.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self._spans = collections.defaultdict(list) # stage -> [(seconds, bytes, failed)]
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, stage):
+        """Times the with block as one span of stage. Yields a dict: set its 'bytes' to the bytes handled."""
+        info = {'bytes': 0}
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield info
+            failed = False
+        finally:
+            self.record(stage, time.perf_counter() - start, info['bytes'], failed)
+
+    def record(self, stage, seconds, num_bytes=0, failed=False):
+        with self._lock:
+            self._spans[stage].append((seconds, num_bytes, failed))
+
+    def summary(self):
+        """
+        Returns {'started': unix time, 'wall_seconds': ..., 'stages': {stage: {'count', 'failed', 'total_seconds',
+        'p50_seconds', 'p95_seconds', 'max_seconds', 'bytes', 'mib_per_second'}}}; mib_per_second is the stage's
+        throughput while busy (bytes / total_seconds), None for stages that handle no bytes.
+        """
+        with self._lock:
+            spans = {stage: list(stage_spans) for stage, stage_spans in self._spans.items()}
+        stages = {}
+        for stage, stage_spans in spans.items():
+            seconds = sorted(span[0] for span in stage_spans)
+            total_seconds = sum(seconds)
+            total_bytes = sum(span[1] for span in stage_spans)
+            stages[stage] = {
+                'count': len(stage_spans),
+                'failed': sum(1 for span in stage_spans if span[2]),
+                'total_seconds': round(total_seconds, 4),
+                'p50_seconds': round(percentile(seconds, 0.5), 4),
+                'p95_seconds': round(percentile(seconds, 0.95), 4),
+                'max_seconds': round(seconds[-1], 4),
+                'bytes': total_bytes,
+                'mib_per_second': round(total_bytes / total_seconds / (1024 * 1024), 3) if total_bytes and total_seconds else None,
+            }
+        return {'started': self.started, 'wall_seconds': round(time.perf_counter() - self._start, 3), 'stages': stages}
+
+
+class QueueProgress(object):
+    """
+    Thread-safe progress state for a whole queue run: bytes done/total, items done/total,
+    aggregate speed and a queue-level ETA across all active downloads.
+    Written by the progress hooks and pipeline workers, read by the GUI refresh timer.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.items_total = 0 # Downloads scheduled so far (grows while playlists are expanded)
+        self.items_done = 0 # Downloads that left the pipeline (done, failed or aborted)
+        self.items_downloaded = 0 # Downloads whose network stage completed
+        self.bytes_done = 0 # Bytes of files that finished downloading
+        self._active = {} # filename -> [downloaded_bytes, total_bytes or None, speed or None]
+
+    def add_items(self, count):
+        with self._lock:
+            self.items_total += count
+
+    def item_finished(self):
+        with self._lock:
+            self.items_done += 1
+
+    def item_downloaded(self):
+        with self._lock:
+            self.items_downloaded += 1
+
+    def update_file(self, filename, downloaded_bytes, total_bytes, speed):
+        with self._lock:
+            self._active[filename] = [downloaded_bytes, total_bytes, speed]
+
+    def finish_file(self, filename, size):
+        with self._lock:
+            state = self._active.pop(filename, None)
+            if size is None and state is not None:
+                size = state[0]
+            if size:
+                self.bytes_done += size
+
+    def snapshot(self):
+        """Returns a consistent copy of the aggregate progress as a dict."""
+        with self._lock:
+            active = list(self._active.values())
+            items_done, items_total, items_downloaded = self.items_done, self.items_total, self.items_downloaded
+            bytes_done = self.bytes_done
+
+        active_downloaded = sum(state[0] for state in active)
+        active_total = sum(state[1] or state[0] for state in active)
+        speed = sum(state[2] or 0 for state in active)
+
+        # Fractional progress of in-flight files counts towards the item total
+        in_flight = sum(min(1.0, state[0] / state[1]) for state in active if state[1])
+        fraction = min(1.0, (items_done + in_flight) / items_total) if items_total else 0.0
+
+        eta = None
+        if speed > 0:
+            remaining_bytes = max(0, active_total - active_downloaded)
+            items_not_started = max(0, items_total - max(items_done, items_downloaded) - len(active))
+            if items_not_started and items_downloaded:
+                remaining_bytes += items_not_started * (bytes_done / items_downloaded) # Estimate from finished downloads
+            eta = remaining_bytes / speed
+
+        return {
+            'items_done': items_done,
+            'items_total': items_total,
+            'bytes_done': bytes_done + active_downloaded,
+            'bytes_total': bytes_done + active_total,
+            'speed': speed,
+            'eta': eta,
+            'fraction': fraction,
+        }
+
+
+class YTDL_Postprocessor_Hook(object):
+    """Records the final path of the file youtube-dlp produced, as reported by its post-processing hooks."""
+    def __init__(self):
+        self.final_filepath = None
+
+    def __call__(self, d):
+        # MoveFiles is always the last postprocessor to run and reports where the file ended up
+        if d['status'] == 'finished' and d.get('postprocessor') == 'MoveFiles':
+            self.final_filepath = d['info_dict'].get('filepath')
+
+
+def future_result(future):
+    """Returns the result of a finished, successful Future without waiting; None otherwise."""
+    if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+class OutputDirectoryIndex(object):
+    """
+    In-memory, sorted index of the file names in the output directories of a queue run.
+    Used as a fallback to resolve output paths by prefix without re-listing the folder for every item.
+    """
+    def __init__(self):
+        self._names = {} # directory -> sorted list of file names
+        self._lock = threading.Lock()
+
+    def _load(self, directory, refresh=False):
+        # Caller must hold self._lock
+        names = self._names.get(directory)
+        if names is None or refresh:
+            try:
+                names = sorted(entry.name for entry in os.scandir(directory) if entry.is_file())
+            except FileNotFoundError:
+                names = []
+            self._names[directory] = names
+        return names
+
+    def add(self, path):
+        """Records a file that has just been written."""
+        directory, name = os.path.split(os.path.abspath(path))
+        with self._lock:
+            names = self._load(directory)
+            position = bisect.bisect_left(names, name)
+            if position == len(names) or names[position] != name:
+                names.insert(position, name)
+
+    def discard(self, path):
+        """Forgets a file that has been removed."""
+        directory, name = os.path.split(os.path.abspath(path))
+        with self._lock:
+            names = self._names.get(directory, [])
+            position = bisect.bisect_left(names, name)
+            if position < len(names) and names[position] == name:
+                del names[position]
+
+    def find(self, directory, prefix, extension=None):
+        """
+        Returns the path of the first file in directory whose name starts with prefix
+        (and ends with extension, if given), or None. The directory is re-read at most once per miss.
+        """
+        directory = os.path.abspath(directory)
+        with self._lock:
+            for refresh in (False, True):
+                names = self._load(directory, refresh=refresh)
+                position = bisect.bisect_left(names, prefix)
+                while position < len(names) and names[position].startswith(prefix):
+                    name = names[position]
+                    if not name.endswith(('.part', '.ytdl', '.temp.mp3', '.temp.opus', '.temp.m4a')) and (extension is None or name.endswith(extension)):
+                        return os.path.join(directory, name)
+                    position += 1
+        return None
+
+
+class DownloadArchive(object):
+    """
+    Persistent SQLite index of finished downloads, keyed by (video ID, format, quality).
+    Lets a queue run skip items that were already downloaded (and tagged) in O(1),
+    before any network extraction. Safe to use from several worker threads.
+    """
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS downloads ("
+                " video_id TEXT NOT NULL,"
+                " format TEXT NOT NULL,"
+                " quality TEXT NOT NULL,"
+                " output_path TEXT NOT NULL,"
+                " tagged INTEGER NOT NULL DEFAULT 0,"
+                " completed_at REAL NOT NULL,"
+                " PRIMARY KEY (video_id, format, quality))"
+            )
+
+    def lookup(self, video_id, output_format, quality):
+        """Returns (output_path, tagged) for a recorded download, or None."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT output_path, tagged FROM downloads WHERE video_id = ? AND format = ? AND quality = ?",
+                (video_id, output_format, quality)).fetchone()
+        return (row[0], bool(row[1])) if row else None
+
+    def record(self, video_id, output_format, quality, output_path, tagged):
+        """Records (or replaces) a finished download."""
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO downloads (video_id, format, quality, output_path, tagged, completed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, output_format, quality, output_path, int(tagged), time.time()))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# Bracketed title noise that does not change the lyrics, e.g. "(Official Video)" or "[feat. X]"
+_LYRICS_KEY_NOISE = re.compile(
+    r'[(\[][^)\]]*\b(?:official|video|audio|lyrics?|visuali[sz]er|hd|hq|4k|remaster(?:ed)?|explicit|feat|ft|featuring)\b[^)\]]*[)\]]')
+_LYRICS_KEY_FEATURING = re.compile(r'\s(?:feat\.?|ft\.?|featuring)\s.*$')
+_LYRICS_KEY_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_lyrics_key(artist, title):
+    """
+    Returns the lyrics cache key of a track. Case, punctuation, Unicode forms, featured artists
+    and bracketed video noise such as '(Official Video)' do not change the key.
+    """
+    def normalize(text):
+        text = unicodedata.normalize('NFKC', text or '').casefold()
+        text = _LYRICS_KEY_NOISE.sub(' ', text)
+        text = _LYRICS_KEY_FEATURING.sub('', text)
+        text = _LYRICS_KEY_PUNCTUATION.sub(' ', text)
+        return ' '.join(text.split())
+    return f"{normalize(artist)}\n{normalize(title)}"
+
+
+class LyricsCache(object):
+    """
+    Persistent SQLite cache of online lyrics lookups, keyed by normalized (artist, title).
+    Misses ("no lyrics found") are cached too, so repeating them costs no requests.
+    Entries expire after a TTL (a shorter one for misses), and the least recently used entries
+    are evicted once the cache holds more than max_bytes. Safe to use from several worker threads.
+    """
+    def __init__(self, db_path, max_bytes=LYRICS_CACHE_MAX_BYTES, ttl=LYRICS_CACHE_TTL, miss_ttl=LYRICS_CACHE_MISS_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS lyrics ("
+                " key TEXT PRIMARY KEY,"
+                " lyrics TEXT," # NULL: searched, but no lyrics were found
+                " size INTEGER NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+
+    def get(self, artist, title):
+        """Returns (True, lyrics or None) for a cached, unexpired lookup and (False, None) otherwise."""
+        key = normalize_lyrics_key(artist, title)
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT lyrics, fetched_at FROM lyrics WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            lyrics, fetched_at = row
+            if now - fetched_at > (self.ttl if lyrics is not None else self.miss_ttl):
+                self._connection.execute("DELETE FROM lyrics WHERE key = ?", (key,))
+                return False, None
+            self._connection.execute("UPDATE lyrics SET last_used = ? WHERE key = ?", (now, key))
+        return True, lyrics
+
+    def put(self, artist, title, lyrics):
+        """Stores the result of a lookup (lyrics, or None if none were found), then evicts down to max_bytes."""
+        key = normalize_lyrics_key(artist, title)
+        now = time.time()
+        size = len(key.encode('utf-8')) + (len(lyrics.encode('utf-8')) if lyrics else 0)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO lyrics (key, lyrics, size, fetched_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, lyrics, size, now, now))
+            # Keep the most recently used entries that fit into max_bytes
+            self._connection.execute(
+                "DELETE FROM lyrics WHERE key IN ("
+                " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC, key) AS total FROM lyrics)"
+                " WHERE total > ?)", (self.max_bytes,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+# YouTube thumbnail URLs: https://i.ytimg.com/vi/<video ID>/<variant>.jpg (or vi_webp/....webp), often with a signed query
+_YOUTUBE_THUMBNAIL_URL = re.compile(r'^https?://i\d*\.ytimg\.com/vi(?:_webp)?/([\w-]{11})/(\w+)\.\w+(?:\?.*)?$')
+
+
+def album_art_source(thumbnail_url):
+    """
+    Returns the album art cache key part identifying a thumbnail: 'youtube:<video ID>/<variant>' for
+    YouTube thumbnails (whose URLs differ by host, image format and query signature), otherwise the URL.
+    """
+    match = _YOUTUBE_THUMBNAIL_URL.match(thumbnail_url)
+    if match:
+        return f"youtube:{match.group(1)}/{match.group(2)}"
+    return thumbnail_url
+
+
+def select_thumbnail(thumbnails, fallback_url=None, min_size=ALBUM_ART_SIZE):
+    """
+    Picks the thumbnail to make album art from out of a youtube-dlp 'thumbnails' list: the smallest one
+    whose shorter side is at least min_size (JPEG first among equals, it decodes fastest), otherwise the
+    largest one. Without any known sizes, fallback_url (the 'thumbnail' field) or the last listed thumbnail.
+    Returns (url, shorter side in pixels or None if unknown); url is None if there is no thumbnail at all.
+    """
+    listed = [thumbnail for thumbnail in thumbnails or () if thumbnail.get('url')]
+    sized = [thumbnail for thumbnail in listed if thumbnail.get('width') and thumbnail.get('height')]
+    if not sized:
+        return fallback_url or (listed[-1]['url'] if listed else None), None
+
+    def short_side(thumbnail):
+        return min(thumbnail['width'], thumbnail['height'])
+
+    def is_jpeg(thumbnail):
+        return thumbnail['url'].split('?')[0].lower().endswith(('.jpg', '.jpeg'))
+
+    large_enough = [thumbnail for thumbnail in sized if short_side(thumbnail) >= min_size]
+    if large_enough:
+        best = min(large_enough, key=lambda t: (t['width'] * t['height'], not is_jpeg(t)))
+    else:
+        best = max(sized, key=lambda t: (short_side(t), t['width'] * t['height'], is_jpeg(t)))
+    return best['url'], short_side(best)
+
+
+def make_album_art(image_data, size=ALBUM_ART_SIZE, quality=ALBUM_ART_JPEG_QUALITY):
+    """
+    Turns thumbnail image data into square JPEG album art: cropped to the center square and scaled down
+    to size x size pixels with LANCZOS. Smaller images are not scaled up. JPEGs larger than needed are
+    decoded at a reduced scale (1/2, 1/4 or 1/8, never below size), which saves most of the decoding
+    time and memory. Returns the JPEG bytes.
+    """
+    from io import BytesIO
+    from PIL import Image
+
+    img = Image.open(BytesIO(image_data))
+    width, height = img.size
+    if img.format == 'JPEG' and min(width, height) > size:
+        scale = size / min(width, height)
+        img.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+        width, height = img.size
+
+    # Crop to square from center
+    side = min(width, height)
+    left = (width - side) // 2
+    top = (height - side) // 2
+    img = img.crop((left, top, left + side, top + side))
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    if side > size:
+        img = img.resize((size, size), Image.Resampling.LANCZOS)
+
+    img_byte_arr = BytesIO()
+    img.save(img_byte_arr, format='JPEG', quality=quality)
+    return img_byte_arr.getvalue()
+
+
+class AlbumArtCache(object):
+    """
+    Content-addressed cache of processed album art (JPEG bytes), keyed by thumbnail source plus size and quality.
+    Covers are stored on disk as <SHA-256 of the JPEG>.jpg, so identical covers are stored once however many
+    keys map to them; a SQLite index maps keys to digests. The most recently used covers are also kept in memory.
+    The least recently used covers are evicted from disk once they take more than max_bytes.
+    Safe to use from several worker threads.
+    """
+    def __init__(self, directory, max_bytes=ALBUM_ART_CACHE_MAX_BYTES, memory_items=ALBUM_ART_MEMORY_CACHE_ITEMS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0} # Results of get() in this session
+        self._memory = collections.OrderedDict() # key -> JPEG bytes, least recently used first
+        self._key_locks = {} # key -> Lock held while that cover is being fetched (see lock)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._connection.execute("PRAGMA foreign_keys = ON") # Evicting a cover drops the keys that map to it
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS covers ("
+                " digest TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cover_keys ("
+                " key TEXT PRIMARY KEY,"
+                " digest TEXT NOT NULL REFERENCES covers(digest) ON DELETE CASCADE)"
+            )
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, f"{digest}.jpg")
+
+    def lock(self, key):
+        """
+        Returns the lock of a key. Holding it while fetching and storing a missing cover makes
+        concurrent requests for the same cover wait for that one fetch instead of repeating it.
+        """
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, key):
+        """Returns the cached JPEG bytes of a key, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return data
+            row = self._connection.execute("SELECT digest FROM cover_keys WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+            digest = row[0]
+            try:
+                with open(self._blob_path(digest), 'rb') as f:
+                    data = f.read()
+            except OSError: # Deleted behind our back; forget it
+                with self._connection:
+                    self._connection.execute("DELETE FROM covers WHERE digest = ?", (digest,))
+                self.stats['misses'] += 1
+                return None
+            with self._connection:
+                self._connection.execute("UPDATE covers SET last_used = ? WHERE digest = ?", (time.time(), digest))
+            self._remember(key, data)
+            self.stats['disk_hits'] += 1
+            return data
+
+    def put(self, key, data):
+        """Stores the JPEG bytes of a key (the file is only written if no key has that content yet), then evicts down to max_bytes."""
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            path = self._blob_path(digest)
+            if not os.path.exists(path):
+                temp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path) # Readers never see a half-written cover
+            with self._connection:
+                # An upsert, not INSERT OR REPLACE: replacing the row would delete it first, and with it (ON DELETE
+                # CASCADE) the other keys of the same cover
+                self._connection.execute("INSERT INTO covers (digest, size, last_used) VALUES (?, ?, ?)"
+                                         " ON CONFLICT (digest) DO UPDATE SET last_used = excluded.last_used",
+                                         (digest, len(data), time.time()))
+                self._connection.execute("INSERT OR REPLACE INTO cover_keys (key, digest) VALUES (?, ?)", (key, digest))
+                # Keep the most recently used covers that fit into max_bytes
+                evicted = [row[0] for row in self._connection.execute(
+                    "SELECT digest FROM (SELECT digest, SUM(size) OVER (ORDER BY last_used DESC, digest) AS total FROM covers)"
+                    " WHERE total > ?", (self.max_bytes,))]
+                self._connection.executemany("DELETE FROM covers WHERE digest = ?", [(d,) for d in evicted])
+            for evicted_digest in evicted:
+                try:
+                    os.remove(self._blob_path(evicted_digest))
+                except OSError:
+                    pass
+            self._remember(key, data)
+
+    def _remember(self, key, data):
+        """Adds a cover to the in-memory tier (lock held)."""
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+            self._memory.clear()
+
+
+class QueueJournal(object):
+    """
+    Append-only JSON-lines journal of a queue run, so an interrupted run (crash or abort) can be resumed.
+    Records the run's settings and URLs, every DownloadJob once it is known, and each job state change:
+    pending / downloading / transcoding / tagging / done / failed.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _write(self, record):
+        # Caller must hold self._lock. One flushed line per record, so a crash loses at most the last line.
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def start(self, output_dir, output_format, urls, resume=False):
+        """Opens the journal for a run. A resumed run appends to the existing journal."""
+        with self._lock:
+            self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+            if not resume:
+                self._write({'type': 'run', 'output_dir': output_dir, 'output_format': output_format, 'urls': urls})
+
+    def add_jobs(self, jobs):
+        with self._lock:
+            for job in jobs:
+                self._write({'type': 'job', 'job': job.to_dict()})
+
+    def finish_item(self, queue_index, total_tracks):
+        """Records that a queue item was fully expanded into jobs, and its final track total (None for single videos)."""
+        with self._lock:
+            self._write({'type': 'expanded', 'item': queue_index, 'total_tracks': total_tracks})
+
+    def set_state(self, job, state):
+        with self._lock:
+            if self._file is not None:
+                self._write({'type': 'state', 'key': job.journal_key, 'state': state})
+
+    def close(self, finished):
+        """Closes the journal; a run that finished (not aborted or crashed) has nothing to resume, so it is deleted."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if finished and os.path.exists(self.path):
+                os.remove(self.path)
+
+    @staticmethod
+    def load(path):
+        """
+        Replays a journal file. Returns None if there is no journal or nothing left to do, otherwise a dict with
+        output_dir, output_format, urls, jobs_by_item (queue index -> DownloadJobs), expanded_items (queue indexes
+        whose jobs are complete; the others were interrupted while their playlist was listed) and pending
+        (unfinished job count, plus one for every item that still needs expanding).
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return None
+
+        run = None
+        jobs = {} # journal key -> DownloadJob, in insertion order
+        expanded = {} # queue index -> final track total
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue # Partially written last line after a crash
+            if record['type'] == 'run':
+                run = record
+            elif record['type'] == 'job':
+                job = DownloadJob.from_dict(record['job'])
+                jobs[job.journal_key] = job
+            elif record['type'] == 'state' and record['key'] in jobs:
+                jobs[record['key']].status = record['state']
+            elif record['type'] == 'expanded':
+                expanded[record['item']] = record['total_tracks']
+        if run is None:
+            return None
+
+        jobs_by_item = {}
+        for job in jobs.values():
+            if job.status not in ('done', 'failed'):
+                job.status = 'pending' # Interrupted mid-stage: start that job over (partial downloads continue from .part files)
+            if job.is_playlist_item and expanded.get(job.queue_index):
+                job.total_tracks = expanded[job.queue_index]
+            jobs_by_item.setdefault(job.queue_index, []).append(job)
+        pending = sum(1 for job in jobs.values() if job.status == 'pending')
+        unexpanded = sum(1 for index in range(len(run['urls'])) if index not in expanded)
+        if not pending and not unexpanded:
+            return None
+        return {
+            'output_dir': run['output_dir'],
+            'output_format': run['output_format'],
+            'urls': run['urls'],
+            'jobs_by_item': jobs_by_item,
+            'expanded_items': set(expanded),
+            'pending': pending + unexpanded,
+        }
+
+
+class PlaylistManifest(object):
+    """
+    What a playlist folder contains, for playlist sync: per output format ('mp3'/'opus'/'m4a'/'mp4'), the file of every
+    synced video with the track number and total it was tagged with. Stored as a JSON file in the folder itself,
+    so it moves with the folder. Tracks that left the playlist are kept (marked removed, their file moved to
+    PlaylistManifest.REMOVED_FOLDER), so they are restored without a download if they come back.
+    Safe to use from several worker threads; changes are written by save().
+    """
+    FILE_NAME = ".ytp_playlist_manifest.json"
+    REMOVED_FOLDER = "Removed from playlist"
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, self.FILE_NAME)
+        self._lock = threading.Lock()
+        self._changed = False
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._tracks = json.load(f).get('tracks', {})
+        except (FileNotFoundError, json.JSONDecodeError, AttributeError):
+            self._tracks = {}
+
+    def get(self, output_format, video_id):
+        """Returns the manifest entry of a video (file, track, total, tagged, removed), or None."""
+        with self._lock:
+            entry = self._tracks.get(output_format, {}).get(video_id)
+            return dict(entry) if entry else None
+
+    def video_ids(self, output_format):
+        """Returns the IDs of the videos currently in the playlist folder (not removed ones)."""
+        with self._lock:
+            return [video_id for video_id, entry in self._tracks.get(output_format, {}).items() if not entry.get('removed')]
+
+    def record(self, output_format, video_id, path, track_number, total_tracks, tagged, removed=False):
+        """Records (or replaces) the file of a video; path is absolute."""
+        with self._lock:
+            self._tracks.setdefault(output_format, {})[video_id] = {
+                'file': os.path.relpath(path, self.folder), 'track': track_number, 'total': total_tracks,
+                'tagged': bool(tagged), 'removed': removed,
+            }
+            self._changed = True
+
+    def file_path(self, entry):
+        return os.path.join(self.folder, entry['file'])
+
+    def save(self):
+        """Writes the manifest if it changed (atomically, so an interrupted save keeps the previous one)."""
+        with self._lock:
+            if not self._changed:
+                return
+            temp_path = self.path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': 1, 'tracks': self._tracks}, f, ensure_ascii=False, indent=1)
+            os.replace(temp_path, self.path)
+            self._changed = False
+
+
+class DownloadJob(object):
+    """A single video download travelling through the download pipeline."""
+    def __init__(self, queue_index, url, output_dir, filename_base=None, title=None,
+                 track_number=None, playlist_title=None, total_tracks=1, video_id=None,
+                 artist=None, thumbnail_url=None):
+        self.queue_index = queue_index # Index of the queue URL this job was expanded from
+        self.url = url
+        self.output_dir = output_dir
+        self.filename_base = filename_base # Fixed output name for playlist entries, None for single videos
+        self.title = title
+        self.track_number = track_number
+        self.playlist_title = playlist_title
+        self.total_tracks = total_tracks # None while a playlist is still being listed and states no count
+        self.video_id = video_id # Download archive key; may only be known after extraction
+        self.artist = artist # From the flat playlist entry, used to prefetch metadata before the download
+        self.thumbnail_url = thumbnail_url # Likewise; None if the entry listed no thumbnail large enough for album art
+        self.status = 'pending' # pending / downloaded / transcoded / done / failed / aborted
+        self.info_dict = None # Filled in by the download stage
+        self.downloaded_path = None # Final path reported by youtube-dlp
+        self.audio_path = None # Audio file (MP3, Opus or M4A), filled in by the transcode stage
+        self.metadata_prefetch = None # Future of the album art / lyrics prefetch, see QueueEngine._start_metadata_prefetch
+        self.album_art_prefetch = None # Future of a separate album art prefetch, see QueueEngine._start_album_art_prefetch
+        self.tagged_track = None # (track number, total or 0) in the audio file's tags, once tagged; see QueueEngine._update_track_tags
+
+    @property
+    def is_playlist_item(self):
+        return self.track_number is not None
+
+    def release(self):
+        """
+        Drops the extraction result and the prefetches once the job is finished, so a long queue does not keep
+        every video's formats, cover and lyrics until the run ends. The title is kept for the end-of-run reports.
+        """
+        if self.info_dict is not None:
+            self.title = self.title or self.info_dict.get('title')
+            self.info_dict = None
+        for prefetch in (self.metadata_prefetch, self.album_art_prefetch):
+            if prefetch is not None:
+                prefetch.cancel() # Not needed any more if it has not started yet
+        self.metadata_prefetch = None
+        self.album_art_prefetch = None
+
+    @property
+    def journal_key(self):
+        """Identifies the job within its queue run."""
+        return f"{self.queue_index}/{self.track_number or 0}"
+
+    def to_dict(self):
+        """Serializable description of the job (without run-time state), for the queue journal."""
+        return {
+            'queue_index': self.queue_index, 'url': self.url, 'output_dir': self.output_dir,
+            'filename_base': self.filename_base, 'title': self.title, 'track_number': self.track_number,
+            'playlist_title': self.playlist_title, 'total_tracks': self.total_tracks, 'video_id': self.video_id,
+            'artist': self.artist, 'thumbnail_url': self.thumbnail_url,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+def playlist_pages(entries, page_size):
+    """
+    Yields the entries of a youtube-dlp playlist result in lists of up to page_size, consuming them lazily:
+    extractor generators and LazyLists are iterated, PagedLists are sliced, so pages are only fetched when needed.
+    """
+    if entries is None:
+        return
+    if hasattr(entries, 'getslice'): # PagedList: not iterable, but fetches only the pages a slice needs
+        start = 0
+        while True:
+            page = entries.getslice(start, start + page_size)
+            if page:
+                yield page
+            if len(page) < page_size:
+                return
+            start += page_size
+    iterator = iter(entries)
+    while True:
+        page = list(itertools.islice(iterator, page_size))
+        if not page:
+            return
+        yield page
+
+
+def is_valid_queue_url(url):
+    """Returns True if url is accepted as a queue entry (a YouTube video, shorts or playlist URL)."""
+    return url.startswith("http://") or url.startswith("https://") and ("youtube.com/" in url or "youtu.be/" in url or "/shorts/" in url)
+
+
+class QueueEngine(object):
+    """
+    Runs download queues. Front-ends (the GUI app, the command line) derive from this class and provide:
+    self.settings (see _load_settings), self.abort_download_flag (threading.Event) and self.download_queue
+    (list of URLs), and override the reporting hooks log_message, show_error, show_info,
+    _set_worker_status and _on_queue_run_finished as needed.
+    All hooks may be called from worker threads.
+    """
+    _lyrics_cache = None # LyricsCache, open while a queue runs
+    _album_art_cache = None # AlbumArtCache, open while a queue runs
+    _album_art_processor = None # Album art worker pool (see _make_album_art), while a queue runs
+    _tag_write_stats = None # Single-write tagging counters of a queue run (see _record_tag_write)
+    _timings = None # RunTimings of the queue run in progress
+
+    def log_message(self, message, level="info"):
+        """Reports a log message."""
+        pass
+
+    def show_error(self, title, message):
+        """Reports an error to the user."""
+        self.log_message(f"ERROR: {message}", level="error")
+
+    def show_info(self, title, message):
+        """Reports an informational message to the user."""
+        self.log_message(f"INFO: {message}", level="info")
+
+    def _set_worker_status(self, slot, status):
+        """Reports what a pipeline worker is doing."""
+        pass
+
+    def _on_queue_run_finished(self):
+        """Called once process_download_queue is done, whether it finished, was aborted or failed."""
+        pass
+
+    def _get_config_path(self):
+        """Returns the path to the configuration file."""
+        config_dir = user_config_dir("YouTubeDownloader", "MyCompany") # Vendor name optional
+        os.makedirs(config_dir, exist_ok=True)
+        return os.path.join(config_dir, "config.json")
+
+    def _get_run_timings_path(self):
+        """Where the timing report of the last queue run is saved (see _report_run_timings)."""
+        return os.path.join(os.path.dirname(self._get_config_path()), "last_run_timings.json")
+
+    def _span(self, stage):
+        """Context manager timing one span of stage in the running queue's RunTimings (no-op outside a queue run)."""
+        timings = self._timings
+        return timings.span(stage) if timings is not None else contextlib.nullcontext({'bytes': 0})
+
+    def _report_run_timings(self, jobs_by_item, output_format):
+        """Logs the per-stage timing summary of a queue run and saves it, with the job counts, as JSON."""
+        report = self._timings.summary()
+        jobs = [job for item_jobs in jobs_by_item.values() for job in item_jobs or []]
+        report['output_format'] = output_format
+        report['jobs'] = dict(collections.Counter(job.status for job in jobs))
+        downloaded_bytes = report['stages'].get('download', {}).get('bytes', 0)
+        report['downloaded_bytes'] = downloaded_bytes
+        report['downloaded_mib_per_second'] = round(downloaded_bytes / report['wall_seconds'] / (1024 * 1024), 3) if report['wall_seconds'] else None
+
+        if report['stages']:
+            self.log_message(f"Run timings: {len(jobs)} job(s) in {format_duration(report['wall_seconds'])}, "
+                             f"{format_bytes(downloaded_bytes)} downloaded ({format_bytes(downloaded_bytes / max(report['wall_seconds'], 0.001))}/s).")
+            self.log_message(f"  {'stage':<22}{'count':>6}{'p50':>9}{'p95':>9}{'max':>9}{'total':>10}{'bytes':>12}{'MiB/s':>8}")
+            for stage, stats in sorted(report['stages'].items(), key=lambda item: -item[1]['total_seconds']):
+                throughput = f"{stats['mib_per_second']:.1f}" if stats['mib_per_second'] is not None else "-"
+                self.log_message(f"  {stage:<22}{stats['count']:>6}{stats['p50_seconds']:>8.2f}s{stats['p95_seconds']:>8.2f}s"
+                                 f"{stats['max_seconds']:>8.2f}s{stats['total_seconds']:>9.1f}s{format_bytes(stats['bytes']):>12}{throughput:>8}")
+        path = self._get_run_timings_path()
+        try:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            self.log_message(f"Timing report saved to '{path}'.")
+        except OSError as e:
+            self.log_message(f"Could not save the timing report to '{path}': {e}", level="warning")
+        return report
+
+    def _get_journal_path(self):
+        """Returns the path to the journal of the current (or last interrupted) queue run."""
+        return os.path.join(os.path.dirname(self._get_config_path()), "queue_journal.jsonl")
+
+    def _load_settings(self):
+        """Loads settings from the config file or returns defaults."""
+        config_path = self._get_config_path()
+        default_settings = {
+            'ffmpeg_path': DEFAULT_FFMPEG_PATH, # Now dynamically determined
+            'output_dir': os.path.join(os.path.expanduser("~"), "Downloads"),
+            'mp3_quality': '320k',
+            'video_quality': '1080p',
+            'max_concurrent_downloads': 3, # Size of the download worker pool
+            'transcode_workers': 'auto', # Parallel MP3 conversions / Opus and M4A remuxes ('auto' = one per CPU core / download worker)
+            'tagging_workers': 2, # Parallel album art / lyrics / tag writers
+            'skip_lyrics_scrape': False,
+            'skip_album_art': False,
+            'show_progress_bar': True, # New default
+            'use_download_archive': True, # Skip videos already downloaded with the same format/quality
+            'archive_verify_files': True, # Only skip if the archived file still exists on disk
+            'sync_playlists': False, # Keep playlist folders in sync: only download new tracks, rename/retag the rest
+            'bandwidth_limit': 0, # KiB/s shared by all downloads (0 = unlimited)
+            'host_requests_per_second': 2, # Requests to any one host (YouTube, thumbnails, lyrics sites); 0 = unlimited
+            'profile_queue_runs': False # Save CPU / memory / thread wait profiles of queue runs (see run_download_queue)
+        }
+        try:
+            with open(config_path, 'r') as f:
+                settings = json.load(f)
+                # Merge with defaults to ensure all keys exist and handle new settings
+                loaded_settings = {**default_settings, **settings}
+                return loaded_settings
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            return default_settings
+
+    def _stage_sizes(self, output_format):
+        """Returns the number of (download, transcode, tagging) workers for a queue run."""
+        download_workers = max(1, int(self.settings.get('max_concurrent_downloads', 3)))
+        if "Audio" not in output_format:
+            return download_workers, 0, 0 # Videos are finished as soon as they are downloaded
+        transcode_workers = self.settings.get('transcode_workers', 'auto')
+        if transcode_workers == 'auto' and AUDIO_FORMATS.get(output_format, ('mp3',))[0] in AUDIO_PASSTHROUGH_CONTAINERS:
+            transcode_workers = download_workers # Copying streams is I/O: keeping pace with the downloads is enough
+        elif transcode_workers == 'auto':
+            transcode_workers = os.cpu_count() or 2 # One ffmpeg process per core
+        transcode_workers = max(1, int(transcode_workers))
+        tagging_workers = max(1, int(self.settings.get('tagging_workers', 2)))
+        return download_workers, transcode_workers, tagging_workers
+
+    def _configure_rate_limits(self):
+        """Sets up the bandwidth limit and the per-host request rate of a queue run from the settings, and logs them."""
+        bandwidth_limit = float(self.settings.get('bandwidth_limit', 0) or 0) * 1024 # Bytes per second
+        self._bandwidth_limiter = TokenBucket(bandwidth_limit, bandwidth_limit * BANDWIDTH_BURST_SECONDS) if bandwidth_limit > 0 else None
+        requests_per_second = float(self.settings.get('host_requests_per_second', 0) or 0)
+        host_rate_limiter.configure(requests_per_second, self.log_message)
+        bandwidth = f"{format_bytes(bandwidth_limit)}/s shared by all downloads" if bandwidth_limit > 0 else "unlimited"
+        request_rate = f"{requests_per_second:g}/s" if requests_per_second > 0 else "unlimited"
+        self.log_message(f"Bandwidth: {bandwidth}; requests per host: {request_rate} (slowed down on HTTP 429/403).")
+
+    def _log_rate_limit_summary(self):
+        """Logs how much a queue run was held back by the bandwidth limit and by throttling hosts."""
+        if self._bandwidth_limiter is not None and self._bandwidth_limiter.waited:
+            self.log_message(f"Bandwidth limit: downloads were held back for {self._bandwidth_limiter.waited:.1f} s in total.")
+        if host_rate_limiter.throttled_count:
+            self.log_message(f"Rate limiting: {host_rate_limiter.throttled_count} throttled answer(s) (HTTP 429/403) slowed requests down.",
+                             level="warning")
+
+    def _build_ydl_opts(self, base_output_dir, output_format):
+        """Builds the youtube-dlp options shared by every download in a queue run."""
+        # Determine target video format based on settings
+        if output_format in AUDIO_FORMATS:
+            # Best audio only (in the output's codec if available); the MP3 conversion or the copy into
+            # the output container runs afterwards in the pipeline's transcode stage
+            format_string = AUDIO_FORMATS[output_format][1]
+        else: # Video (MP4)
+            # Specific resolution if available, otherwise best MP4
+            resolution = self.settings.get('video_quality', '1080p')
+            if resolution == 'best':
+                format_string = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+            else:
+                # Use the resolution filter, fallback to general best mp4 if specific res not found
+                # Note: youtube-dlp format selection is complex; this is a basic filter
+                format_string = f'bestvideo[ext=mp4][height<={resolution.replace("p", "")}]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+
+
+        progress_hook = YTDL_Progress_Hook(self)
+        progress_hook.bandwidth_limiter = getattr(self, '_bandwidth_limiter', None)
+
+        # Common youtube-dlp options
+        return {
+            'format': format_string,
+            'quiet': False,
+            'noprogress': True,
+            'logger': YTDL_Logger(self),
+            'progress_hooks': [progress_hook],
+            # A single download never needs more than the shared limit (this also sizes yt-dlp's read blocks to it)
+            'ratelimit': progress_hook.bandwidth_limiter.rate if progress_hook.bandwidth_limiter is not None else None,
+            'ffmpeg_location': self.settings['ffmpeg_path'],
+            'writethumbnail': False, # IMPORTANT: Disable ytdlp writing thumbnail to disk
+            'outtmpl': os.path.join(base_output_dir, '%(title)s.%(ext)s'), # Default template
+            'no_warnings': True,
+            'continuedl': True, # Resume partially downloaded .part files (e.g. after resuming a journaled queue)
+            'postprocessors': []
+        }
+
+    def _expand_queue_item(self, queue_index, url, base_output_dir, ydl_opts_base):
+        """
+        Generator: turns one queue URL into the DownloadJobs it requires, yielding each as soon as it is known.
+        Playlists are expanded into one job per entry, single videos into a single job.
+        Playlist entries are listed lazily, page by page, so the first downloads start after the first page.
+        Returns (as the StopIteration value) the playlist's number of entries once all are listed, None for single videos.
+        """
+        is_playlist = ("playlist?list=" in url or "/playlist/" in url) and not "/shorts/" in url # Simple heuristic
+
+        if not is_playlist:
+            # Single video: downloaded directly into the base_output_dir
+            yield DownloadJob(queue_index, url, base_output_dir, video_id=self.extract_video_id(url))
+            return None
+
+        self.log_message("Detected a playlist URL. Fetching playlist info...")
+        info_ydl_opts = ydl_opts_base.copy()
+        info_ydl_opts['extract_flat'] = True
+        info_ydl_opts['quiet'] = True
+        info_ydl_opts['logger'] = YTDL_Logger(self)
+        info_ydl_opts.pop('postprocessors', None) # Remove postprocessors for info extraction pass
+        info_ydl_opts.pop('format', None) # Remove format for info extraction pass
+
+        import yt_dlp
+        with yt_dlp.YoutubeDL(info_ydl_opts) as ydl:
+            # Unprocessed, 'entries' is the extractor's lazy iterator: pages are only fetched as entries are consumed
+            with self._span('playlist_extraction'):
+                playlist_info_dict = ydl.extract_info(url, download=False, process=False)
+                while playlist_info_dict.get('_type') in ('url', 'url_transparent'): # Redirected to another extractor
+                    playlist_info_dict = ydl.extract_info(playlist_info_dict['url'], download=False, process=False,
+                                                          ie_key=playlist_info_dict.get('ie_key'))
+
+            entries = playlist_info_dict.get('entries')
+            playlist_title_raw = playlist_info_dict.get('title') or 'Unknown Playlist'
+            playlist_title_cleaned = self.clean_name_suffix(playlist_title_raw)
+            # Until every entry is listed, the track total is the count the playlist states, if any
+            listed_total = playlist_info_dict.get('playlist_count')
+            listed_total = listed_total if isinstance(listed_total, int) and listed_total > 0 else None
+            del playlist_info_dict # Only the entries are needed from here on
+
+            current_output_dir = None
+            entry_count = 0
+            pages = playlist_pages(entries, PLAYLIST_PAGE_SIZE)
+            while True:
+                # Only the listing itself is timed, not the time the jobs spend waiting for a free download worker
+                with self._span('playlist_page'):
+                    page = next(pages, None)
+                if page is None:
+                    break
+                if current_output_dir is None:
+                    # Create a dedicated folder for the playlist within the base_output_dir
+                    current_output_dir = os.path.join(base_output_dir, self.sanitize_filename(playlist_title_cleaned))
+                    os.makedirs(current_output_dir, exist_ok=True)
+                    self.log_message(f"Created playlist folder: '{current_output_dir}'")
+                    if listed_total:
+                        self.log_message(f"Playlist '{playlist_title_cleaned}' has {listed_total} videos.")
+                    else:
+                        self.log_message(f"Playlist '{playlist_title_cleaned}': listing videos while downloading...")
+
+                # File name parts of a whole page at once (artists mostly repeat within a playlist)
+                page = [entry or {} for entry in page]
+                video_titles_raw = [entry.get('title') or f"Untitled Video {entry_count + k + 1}" for k, entry in enumerate(page)]
+                artists_raw = [entry.get('artist', entry.get('channel', '')) for entry in page]
+                clean_video_titles = ytp_text.sanitize_filenames(video_titles_raw)
+                clean_artists = ytp_text.sanitize_filenames(artist or '' for artist in artists_raw)
+
+                for k, entry in enumerate(page):
+                    j = entry_count + k
+                    video_url = entry.get('url')
+                    if not video_url:
+                        self.log_message(f"  Skipping video {j+1}: No URL found.", level="warning")
+                        continue
+
+                    video_title_raw = video_titles_raw[k]
+                    artist_raw = artists_raw[k]
+                    clean_video_title = clean_video_titles[k]
+                    # clean_artist is done in process_audio_metadata now
+                    track_num_str = f"{j+1:02d}"
+                    filename_base = f"{track_num_str} - {clean_artists[k] if artist_raw else 'Unknown Artist'} - {clean_video_title}"
+
+                    # Flat entries only list small thumbnails; if none is large enough for album art,
+                    # the download stage picks one from the full video info instead
+                    thumbnail_url, thumbnail_size = select_thumbnail(entry.get('thumbnails'), entry.get('thumbnail'))
+                    if thumbnail_size is not None and thumbnail_size < ALBUM_ART_SIZE:
+                        thumbnail_url = None
+                    yield DownloadJob(queue_index, video_url, current_output_dir, filename_base=filename_base,
+                                      title=video_title_raw, track_number=j + 1,
+                                      playlist_title=playlist_title_cleaned, total_tracks=listed_total,
+                                      video_id=entry.get('id'), artist=artist_raw or None, thumbnail_url=thumbnail_url)
+                entry_count += len(page)
+
+        if not entry_count:
+            self.show_error("youtube-dlp Error", "Could not extract playlist entries or playlist is empty. Is the URL valid?")
+            return None
+        self.log_message(f"Listed all {entry_count} videos of playlist '{playlist_title_cleaned}'.")
+        return entry_count
+
+    def _profiling_enabled(self):
+        """True if queue runs are profiled: the YTP_PROFILE environment variable if set, else the setting."""
+        env_value = os.environ.get(PROFILE_ENV_VAR, '').strip()
+        if env_value:
+            return env_value.lower() not in ('0', 'false', 'no', 'off')
+        return bool(self.settings.get('profile_queue_runs', False))
+
+    def _get_profile_dir(self):
+        """Where queue run profiles are saved (see ytp_profile.QueueProfiler)."""
+        return os.path.join(os.path.dirname(self._get_config_path()), "profiles")
+
+    def run_download_queue(self, base_output_dir, output_format, resume_state=None):
+        """
+        Runs process_download_queue (front-ends start queue runs here) and returns its result.
+        If profiling is enabled (see _profiling_enabled), the run is profiled with ytp_profile.QueueProfiler:
+        the profiles are saved to the profile directory and summarized in the log.
+        """
+        if not self._profiling_enabled():
+            return self.process_download_queue(base_output_dir, output_format, resume_state)
+        profiler = ytp_profile.QueueProfiler(self._get_profile_dir())
+        profiler.start()
+        self.log_message("Profiling this queue run (CPU, memory allocations and thread waits)...")
+        try:
+            return self.process_download_queue(base_output_dir, output_format, resume_state)
+        finally:
+            try:
+                for line in profiler.stop().summary_lines():
+                    self.log_message(line)
+            except Exception as e: # Profiling must never fail the run
+                self.log_message(f"Could not save the profile of the queue run: {e}", level="warning")
+
+    def process_download_queue(self, base_output_dir, output_format, resume_state=None):
+        """
+        Processes items in the download queue through a staged pipeline:
+        download -> transcode -> tag, each stage with its own pool of workers.
+        Stages are connected by bounded queues, so a full downstream stage stops
+        new downloads from starting and memory/disk use stay bounded.
+        This thread expands queue items (and playlists, page by page) into DownloadJobs and feeds the first stage
+        as they are listed, so downloads start before a large playlist is fully listed.
+        Every job and state change is written to the queue journal; resume_state (from QueueJournal.load)
+        continues an interrupted run, re-using its already expanded jobs.
+        Returns jobs_by_item: queue index -> list of DownloadJobs (None if the item could not be expanded).
+        """
+        is_aborted = False
+        total_items = len(self.download_queue)
+        download_workers, transcode_workers, tagging_workers = self._stage_sizes(output_format)
+        self._configure_rate_limits()
+        ydl_opts_base = self._build_ydl_opts(base_output_dir, output_format)
+
+        jobs_by_item = {} # queue index -> list of DownloadJobs, None if the item could not be expanded
+        progress = QueueProgress()
+        self.queue_progress = progress
+
+        self._output_index = OutputDirectoryIndex() # Fallback path lookups for this run
+        self._track_totals_lock = threading.Lock() # Playlist track totals are filled in while jobs are tagged
+        self._playlist_manifests = {} # Playlist folder -> PlaylistManifest, in playlist sync mode
+        self._tag_write_stats = collections.Counter() # Tracks tagged in place / rewritten, audio bytes not rewritten
+        self._timings = RunTimings()
+        self._archive_key = self._get_archive_key(output_format)
+        self._download_archive = None
+        if self.settings.get('use_download_archive', True):
+            try:
+                self._download_archive = DownloadArchive(os.path.join(os.path.dirname(self._get_config_path()), "download_archive.sqlite3"))
+            except sqlite3.Error as e:
+                self.log_message(f"Could not open the download archive, continuing without it: {e}", level="warning")
+        if "Audio" in output_format and not self.settings.get('skip_lyrics_scrape', False):
+            try:
+                self._lyrics_cache = LyricsCache(os.path.join(os.path.dirname(self._get_config_path()), "lyrics_cache.sqlite3"))
+            except sqlite3.Error as e:
+                self.log_message(f"Could not open the lyrics cache, continuing without it: {e}", level="warning")
+        if "Audio" in output_format and not self.settings.get('skip_album_art', False):
+            try:
+                self._album_art_cache = AlbumArtCache(os.path.join(os.path.dirname(self._get_config_path()), "album_art_cache"))
+            except (sqlite3.Error, OSError) as e:
+                self.log_message(f"Could not open the album art cache, continuing without it: {e}", level="warning")
+        self._journal = QueueJournal(self._get_journal_path())
+        self._journal.start(base_output_dir, output_format, self.download_queue, resume=resume_state is not None)
+
+        downloaders = {} # slot -> long-lived YoutubeDL instance of that download worker
+        download_stage = lambda job, slot: self._download_stage(
+            job, self._get_worker_downloader(downloaders, slot, base_output_dir, output_format),
+            base_output_dir, output_format, slot)
+        # (journal state, worker count, handler) for every stage, in pipeline order
+        stages = [('downloading', download_workers, download_stage)]
+        if "Audio" in output_format:
+            stages.append(('transcoding', transcode_workers, self._transcode_stage))
+            stages.append(('tagging', tagging_workers, self._tagging_stage))
+
+        # Bounded queue in front of each stage, sized to that stage's workers (backpressure)
+        stage_queues = [queue.Queue(maxsize=worker_count) for _, worker_count, _ in stages]
+        stage_workers = []
+        slot = 0
+        for stage_index, (stage_state, worker_count, handler) in enumerate(stages):
+            output_queue = stage_queues[stage_index + 1] if stage_index + 1 < len(stages) else None
+            workers = []
+            for _ in range(worker_count):
+                worker = threading.Thread(target=self._pipeline_worker, name=f"pipeline-{stage_state}-{slot}",
+                                          args=(slot, stage_state, handler, stage_queues[stage_index], output_queue, progress))
+                worker.daemon = True
+                worker.start()
+                workers.append(worker)
+                slot += 1
+            stage_workers.append(workers)
+        self.log_message(f"Started pipeline: {download_workers} download, {transcode_workers} transcode and {tagging_workers} tagging worker(s).")
+
+        # Album art and lyrics are fetched while the audio downloads and transcodes (see _start_metadata_prefetch)
+        self._metadata_prefetcher = None
+        if "Audio" in output_format and not (self.settings.get('skip_album_art', False) and self.settings.get('skip_lyrics_scrape', False)):
+            self._metadata_prefetcher = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(download_workers, tagging_workers), thread_name_prefix="metadata-prefetch")
+        if "Audio" in output_format and not self.settings.get('skip_album_art', False):
+            # Decoding, resizing and encoding covers is CPU work: at most a few at a time, off the download workers
+            self._album_art_processor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=ALBUM_ART_WORKERS, thread_name_prefix="album-art")
+
+        try:
+            try:
+                for i, url in enumerate(self.download_queue):
+                    if self.abort_download_flag.is_set():
+                        self.log_message(f"Download queue aborted by user at item {i+1}/{total_items}.", level="warning")
+                        is_aborted = True
+                        break
+
+                    self.log_message(f"\n--- Processing Item {i+1}/{total_items}: {url} ---")
+
+                    if resume_state is not None and i in resume_state['expanded_items']:
+                        # Already expanded by the interrupted run; only its unfinished jobs still need to run
+                        jobs = resume_state['jobs_by_item'].get(i, [])
+                        jobs_by_item[i] = jobs
+                        unfinished = [job for job in jobs if job.status == 'pending']
+                        self.log_message(f"Resuming item: {len(jobs) - len(unfinished)} of {len(jobs)} download(s) already finished.")
+                        progress.add_items(len(jobs))
+                        for job in jobs:
+                            if job.status != 'pending':
+                                progress.item_finished()
+                        for job in unfinished:
+                            self._enqueue_job(job, stage_queues[0], progress)
+                        continue
+
+                    # Jobs of a playlist the interrupted run had only partly listed are picked up where they were
+                    journaled_jobs = resume_state['jobs_by_item'].get(i, []) if resume_state is not None else []
+                    jobs = self._run_queue_item(i, url, base_output_dir, ydl_opts_base, stage_queues[0], progress, journaled_jobs)
+                    if jobs is None and self.abort_download_flag.is_set():
+                        # Aborted while the playlist was listed: the item stays unexpanded, for resuming
+                        self.log_message(f"Download queue aborted by user at item {i+1}/{total_items}.", level="warning")
+                        is_aborted = True
+                        break
+                    jobs_by_item[i] = jobs
+            finally:
+                # Shut the stages down in order: once every worker of a stage has exited,
+                # nothing more can reach the next stage, so it can be sent its sentinels.
+                for stage_queue, workers in zip(stage_queues, stage_workers):
+                    for _ in workers:
+                        stage_queue.put(None)
+                    for worker in workers:
+                        worker.join()
+                for ydl in downloaders.values():
+                    ydl.close()
+                if self._metadata_prefetcher is not None:
+                    # Only aborted jobs still have prefetches: drop the queued ones, let running ones finish
+                    self._metadata_prefetcher.shutdown(wait=True, cancel_futures=True)
+                if self._album_art_processor is not None:
+                    self._album_art_processor.shutdown(wait=True)
+                    self._album_art_processor = None
+                if self._download_archive is not None:
+                    self._download_archive.close()
+                if self._lyrics_cache is not None:
+                    self._lyrics_cache.close()
+                    self._lyrics_cache = None
+                self._log_rate_limit_summary()
+                if self._tag_write_stats['in_place'] or self._tag_write_stats['rewritten']:
+                    self.log_message(f"Single-write tagging: {self._tag_write_stats['in_place']} track(s) tagged in place, "
+                                     f"{self._tag_write_stats['rewritten']} rewritten; "
+                                     f"{format_bytes(self._tag_write_stats['bytes_saved'])} of audio writes saved.")
+                if self._album_art_cache is not None:
+                    stats = self._album_art_cache.stats
+                    if any(stats.values()):
+                        self.log_message(f"Album art cache: {stats['memory_hits'] + stats['disk_hits']} cover(s) reused "
+                                         f"({stats['disk_hits']} from disk), {stats['misses']} fetched.")
+                    self._album_art_cache.close()
+                    self._album_art_cache = None
+
+            if self.abort_download_flag.is_set():
+                is_aborted = True
+            if "Audio" in output_format:
+                self._update_track_tags(jobs_by_item)
+            self._save_playlist_manifests(jobs_by_item)
+            self._report_run_timings(jobs_by_item, output_format)
+            # An aborted run keeps its journal so it can be resumed; a finished one deletes it
+            self._journal.close(finished=not is_aborted)
+
+            # A queue item counts as processed only if every one of its downloads succeeded
+            completed_items = sum(1 for jobs in jobs_by_item.values() if jobs and all(job.status == 'done' for job in jobs))
+
+            if not is_aborted: # Only show completion message if not aborted
+                self.show_info("Queue Complete", f"Download queue finished! Processed {completed_items} of {total_items} items.")
+            else:
+                self.show_info("Queue Aborted", f"Download queue aborted. Processed {completed_items} of {total_items} items before stopping.")
+
+        except Exception as e:
+            self.show_error("Queue Processing Error", f"An error occurred while managing the download queue: {e}")
+            import traceback
+            self.log_message(f"Queue Traceback: {traceback.format_exc()}", level="error")
+        finally:
+            self._journal.close(finished=False) # No-op if already closed; keeps the journal after a crash
+            self.queue_progress = None # Stops front-ends from showing stale progress
+            self._timings = None
+            self._on_queue_run_finished()
+        return jobs_by_item
+
+    def _run_queue_item(self, queue_index, url, base_output_dir, ydl_opts_base, download_queue, progress, journaled_jobs=()):
+        """
+        Expands a queue item and feeds its jobs to the download stage as they are listed (see _expand_queue_item),
+        journaling each new one. journaled_jobs are the item's jobs from an interrupted run; those are used
+        instead of their newly listed twins (same position, same video), and only run again if unfinished.
+        A position that holds another video since (the playlist changed) gets the newly listed job.
+        Once every job is known, the track total is filled in on all of them.
+        Returns the item's jobs, or None if it could not be (fully) expanded.
+        """
+        import yt_dlp
+        journaled_jobs = {job.journal_key: job for job in journaled_jobs}
+        jobs = []
+        expansion = self._expand_queue_item(queue_index, url, base_output_dir, ydl_opts_base)
+        try:
+            while True:
+                if self.abort_download_flag.is_set():
+                    return None # Not fully listed; a resumed run lists the item again
+                try:
+                    job = next(expansion)
+                except StopIteration as expanded:
+                    total_tracks = expanded.value
+                    break
+                journaled_job = journaled_jobs.get(job.journal_key)
+                if journaled_job is not None and journaled_job.video_id == job.video_id:
+                    job = journaled_job
+                else:
+                    self._journal.add_jobs([job]) # Replaces a journaled job at the same position
+                jobs.append(job)
+                progress.add_items(1)
+                if job.status != 'pending':
+                    progress.item_finished() # Finished by the interrupted run
+                elif self._sync_existing_track(job):
+                    self._finish_job(job, 'done', progress) # Already in the playlist folder
+                else:
+                    self._enqueue_job(job, download_queue, progress)
+        except yt_dlp.utils.DownloadError as de:
+            self.log_message(f"Error processing {url}: {de}", level="error")
+            self.show_error("Download Error", f"Error for {url}: {de}")
+            return None
+        except Exception as e:
+            self.log_message(f"An unexpected error occurred for {url}: {e}", level="error")
+            self.show_error("Unexpected Error", f"An unexpected error occurred for {url}: {e}")
+            import traceback
+            self.log_message(f"Traceback: {traceback.format_exc()}", level="error")
+            return None
+        finally:
+            expansion.close()
+
+        if not jobs:
+            return None
+        if total_tracks:
+            with self._track_totals_lock:
+                for job in jobs:
+                    job.total_tracks = total_tracks
+        self._journal.finish_item(queue_index, total_tracks)
+        try:
+            self._sync_removed_tracks(jobs)
+        except OSError as e:
+            self.log_message(f"Sync: could not move the tracks removed from the playlist: {e}", level="warning")
+        return jobs
+
+    def _update_track_tags(self, jobs_by_item):
+        """
+        Rewrites the track number tag of every playlist audio file whose tag no longer matches its track number and total:
+        tagged before the playlist's track total was known (or with a stated total that turned out different),
+        or kept by playlist sync after the playlist was reordered or changed size.
+        """
+        for jobs in jobs_by_item.values():
+            for job in jobs or []:
+                if job.tagged_track is None or not job.total_tracks or job.tagged_track == (job.track_number, job.total_tracks):
+                    continue
+                track_string = f"{job.track_number}/{job.total_tracks}"
+                try:
+                    tags = ytp_tags.open_tag_writer(job.audio_path, clear=False)
+                    tags.set_track(job.track_number, job.total_tracks)
+                    tags.save() # MP3s in place: there is room for a longer TRCK
+                    job.tagged_track = (job.track_number, job.total_tracks)
+                    self.log_message(f"Updated track number to {track_string} in '{os.path.basename(job.audio_path)}'.")
+                except Exception as e:
+                    self.log_message(f"Could not update the track number of '{job.audio_path}': {e}", level="warning")
+
+    def _get_playlist_manifest(self, folder):
+        """Returns the PlaylistManifest of a playlist folder, loading it on first use in this run."""
+        with self._track_totals_lock:
+            if folder not in self._playlist_manifests:
+                self._playlist_manifests[folder] = PlaylistManifest(folder)
+            return self._playlist_manifests[folder]
+
+    def _sync_existing_track(self, job):
+        """
+        Playlist sync: if the job's video is already in its playlist folder (according to the folder's manifest),
+        gives that file the job's current name (after a reorder, or when a removed track came back) instead of
+        downloading it again; its TRCK tag is brought up to date at the end of the run (see _update_track_tags).
+        Returns True if the job is done that way.
+        """
+        if not self.settings.get('sync_playlists', False) or not job.is_playlist_item or not job.video_id:
+            return False
+        output_format = self._archive_key[0]
+        manifest = self._get_playlist_manifest(job.output_dir)
+        entry = manifest.get(output_format, job.video_id)
+        if entry is None or not entry['tagged']:
+            return False # New to the folder, or tagging failed last time: process it
+        current_path = manifest.file_path(entry)
+        if not os.path.exists(current_path):
+            return False # Deleted since: download it again
+
+        path = self._sync_rename(job, current_path)
+        if output_format != 'mp4':
+            job.audio_path = path
+            job.tagged_track = (entry['track'], entry['total'] or 0)
+        else:
+            job.downloaded_path = path
+        manifest.record(output_format, job.video_id, path, entry['track'], entry['total'], tagged=True)
+        return True
+
+    def _sync_archived_track(self, job, archived_path):
+        """
+        Playlist sync, for a job satisfied by the download archive but not (yet) in its folder's manifest: if the
+        archived file is in the job's playlist folder, it gets the job's current name and the job's path, so
+        _save_playlist_manifests records it. Its track number tag is unknown, so _update_track_tags rewrites it.
+        """
+        if not self.settings.get('sync_playlists', False) or not job.is_playlist_item:
+            return
+        archived_path = os.path.abspath(archived_path)
+        if os.path.normcase(os.path.dirname(archived_path)) != os.path.normcase(os.path.abspath(job.output_dir)):
+            return # Downloaded to another folder: not part of this playlist folder
+        path = self._sync_rename(job, archived_path)
+        if path != archived_path:
+            self._record_in_archive(job, path, tagged=True)
+        if self._archive_key[0] != 'mp4':
+            job.audio_path = path
+            job.tagged_track = (None, 0)
+        else:
+            job.downloaded_path = path
+
+    def _sync_rename(self, job, current_path):
+        """
+        Playlist sync: gives a kept file the job's current name (after a reorder, or when a removed track came back),
+        unless another file already has that name. Returns the file's path.
+        """
+        path = os.path.join(job.output_dir, job.filename_base + os.path.splitext(current_path)[1])
+        if os.path.abspath(path) == os.path.abspath(current_path):
+            return current_path
+        if os.path.exists(path):
+            self.log_message(f"  Sync: keeping '{os.path.basename(current_path)}', '{os.path.basename(path)}' already exists.", level="warning")
+            return current_path
+        os.replace(current_path, path)
+        self._output_index.discard(current_path)
+        self._output_index.add(path)
+        self.log_message(f"  Sync: renamed '{os.path.relpath(current_path, job.output_dir)}' to '{os.path.basename(path)}'.")
+        return path
+
+    def _sync_removed_tracks(self, jobs):
+        """
+        Playlist sync, once a playlist is fully listed: moves the files of videos that are no longer in it
+        into the folder's PlaylistManifest.REMOVED_FOLDER (nothing is deleted).
+        """
+        if not jobs or not self.settings.get('sync_playlists', False) or not jobs[0].is_playlist_item:
+            return
+        output_format = self._archive_key[0]
+        manifest = self._get_playlist_manifest(jobs[0].output_dir)
+        listed = set(job.video_id for job in jobs)
+        for video_id in manifest.video_ids(output_format):
+            if video_id in listed:
+                continue
+            entry = manifest.get(output_format, video_id)
+            current_path = manifest.file_path(entry)
+            if not os.path.exists(current_path):
+                continue
+            removed_folder = os.path.join(manifest.folder, PlaylistManifest.REMOVED_FOLDER)
+            os.makedirs(removed_folder, exist_ok=True)
+            path = os.path.join(removed_folder, os.path.basename(current_path))
+            os.replace(current_path, path)
+            self._output_index.discard(current_path)
+            manifest.record(output_format, video_id, path, entry['track'], entry['total'], entry['tagged'], removed=True)
+            self.log_message(f"Sync: '{entry['file']}' is no longer in the playlist, moved to '{PlaylistManifest.REMOVED_FOLDER}'.")
+
+    def _save_playlist_manifests(self, jobs_by_item):
+        """Playlist sync: records this run's finished playlist downloads in their folders' manifests and saves them."""
+        if not self.settings.get('sync_playlists', False):
+            return
+        output_format = self._archive_key[0]
+        for jobs in jobs_by_item.values():
+            for job in jobs or []:
+                path = job.audio_path if output_format != 'mp4' else job.downloaded_path
+                if job.status != 'done' or not job.is_playlist_item or not job.video_id or not path:
+                    continue
+                if output_format != 'mp4':
+                    track_number, total_tracks = job.tagged_track or (job.track_number, 0)
+                else:
+                    track_number, total_tracks = job.track_number, job.total_tracks
+                self._get_playlist_manifest(job.output_dir).record(
+                    output_format, job.video_id, path, track_number, total_tracks, tagged=output_format == 'mp4' or job.tagged_track is not None)
+        for manifest in self._playlist_manifests.values():
+            try:
+                manifest.save()
+            except OSError as e:
+                self.log_message(f"Could not save the playlist manifest '{manifest.path}': {e}", level="warning")
+
+    def _enqueue_job(self, job, download_queue, progress):
+        """Feeds a job to the download stage, unless the download archive shows it is already done."""
+        archived_path = self._find_in_archive(job)
+        if archived_path:
+            # Already satisfied by a previous run: no extraction, no download
+            self.log_message(f"  Skipping '{job.title or job.url}': already downloaded to {archived_path}")
+            self._sync_archived_track(job, archived_path)
+            self._finish_job(job, 'done', progress)
+            return
+        download_queue.put(job) # Blocks while the download stage is saturated
+
+    def _pipeline_worker(self, slot, stage_state, handler, input_queue, output_queue, progress):
+        """
+        Pipeline worker thread: runs one stage's handler on every DownloadJob taken off
+        input_queue until it receives a None sentinel, then hands each job to output_queue.
+        stage_state is the journal state recorded while a job is in this stage.
+        Errors are isolated per job so one failing video never stops the rest of the queue.
+        """
+        import yt_dlp
+        while True:
+            job = input_queue.get()
+            if job is None:
+                self._set_worker_status(slot, "Idle")
+                return
+
+            # Only new downloads are stopped by an abort; jobs that are already downloaded
+            # are still transcoded and tagged so no half-processed files are left behind.
+            if self.abort_download_flag.is_set() and job.status == 'pending':
+                self._finish_job(job, 'aborted', progress)
+                continue
+
+            self._journal.set_state(job, stage_state)
+            try:
+                handler(job, slot)
+            except yt_dlp.utils.DownloadError as de:
+                self.log_message(f"Error processing {job.url}: {de}", level="error")
+                self.show_error("Download Error", f"Error for {job.url}: {de}")
+                self._finish_job(job, 'failed', progress)
+                continue
+            except FFmpegNotFoundError:
+                self.log_message(f"Error: FFmpeg not found at '{self.settings['ffmpeg_path']}'. Please check settings.", level="error")
+                self.show_error("FFmpeg Not Found", f"FFmpeg executable not found at '{self.settings['ffmpeg_path']}'. Please ensure it's installed and the path is correct in Settings.")
+                self.abort_download_flag.set() # Critical error, stop the whole queue
+                self._finish_job(job, 'failed', progress)
+                continue
+            except Exception as e:
+                self.log_message(f"An unexpected error occurred for {job.url}: {e}", level="error")
+                self.show_error("Unexpected Error", f"An unexpected error occurred for {job.url}: {e}")
+                import traceback
+                self.log_message(f"Traceback: {traceback.format_exc()}", level="error")
+                self._finish_job(job, 'failed', progress)
+                continue
+            finally:
+                self._set_worker_status(slot, "Idle")
+
+            if job.status == 'done' or output_queue is None:
+                self._finish_job(job, 'done', progress)
+            else:
+                output_queue.put(job) # Blocks while the next stage is saturated
+
+    def _finish_job(self, job, status, progress):
+        """Records the final status of a job in the job, the queue journal and the queue progress."""
+        job.status = status
+        job.release()
+        # Aborted jobs go back to 'pending' in the journal so that resuming the run picks them up again
+        self._journal.set_state(job, 'pending' if status == 'aborted' else status)
+        progress.item_finished()
+
+    def _get_worker_downloader(self, downloaders, slot, base_output_dir, output_format):
+        """
+        Returns the YoutubeDL instance owned by a download worker, creating it on first use.
+        The instance lives for the whole queue run, so extractor initialisation, the cookie jar
+        and open HTTP connections are reused across every video the worker downloads.
+        """
+        ydl = downloaders.get(slot)
+        if ydl is None:
+            import yt_dlp
+            ydl_opts = self._build_ydl_opts(base_output_dir, output_format)
+            # Per-item output names are supplied through extra_info on each extract_info call:
+            # ytp_subdir is the playlist folder ('.' for single videos), ytp_filename the fixed
+            # playlist file name (single videos fall back to their title).
+            ydl_opts['outtmpl'] = os.path.join(base_output_dir, '%(ytp_subdir)s', '%(ytp_filename,title)s.%(ext)s')
+            ydl_opts['postprocessor_hooks'] = [YTDL_Postprocessor_Hook()]
+            ydl = yt_dlp.YoutubeDL(ydl_opts)
+            downloaders[slot] = ydl
+        return ydl
+
+    def _download_stage(self, job, ydl, base_output_dir, output_format, slot):
+        """Pipeline stage 1 (network): downloads a single DownloadJob with the worker's YoutubeDL instance."""
+        import yt_dlp
+        self._set_worker_status(slot, f"Downloading '{job.title or job.url}'")
+
+        extra_info = {'ytp_subdir': os.path.relpath(job.output_dir, base_output_dir)}
+        if job.is_playlist_item:
+            # Fixed playlist file name for this video
+            extra_info['ytp_filename'] = job.filename_base
+            self.log_message(f"  Downloading video {job.track_number}/{job.total_tracks or '?'}: '{job.title}'")
+        else:
+            self.log_message(f"  Downloading single video: '{job.url}'")
+
+        if job.is_playlist_item:
+            # Everything needed is known from the flat playlist entry: fetch it while the audio downloads
+            # (album art only if the entry listed a thumbnail large enough for it)
+            self._start_metadata_prefetch(job, job.title, self._main_artist(job.artist), job.thumbnail_url)
+
+        postprocessor_hook = ydl.params['postprocessor_hooks'][0]
+        postprocessor_hook.final_filepath = None
+        host_rate_limiter.wait(YOUTUBE_HOST)
+        try:
+            with self._span('download') as span:
+                job.info_dict = ydl.extract_info(job.url, download=True, extra_info=extra_info)
+                span['bytes'] = sum(d.get('filesize') or d.get('filesize_approx') or 0
+                                    for d in job.info_dict.get('requested_downloads') or [job.info_dict])
+        except yt_dlp.utils.DownloadError as de:
+            throttled = re.search(r'HTTP Error (429|403)', str(de))
+            if throttled:
+                host_rate_limiter.throttled(YOUTUBE_HOST, int(throttled.group(1)))
+            raise
+        host_rate_limiter.succeeded(YOUTUBE_HOST)
+        if not job.is_playlist_item:
+            # Single videos are only known after extraction: fetch while the audio is transcoded
+            self._start_metadata_prefetch(job, job.info_dict.get('title'),
+                                          self._main_artist(job.info_dict.get('artist') or job.info_dict.get('channel')),
+                                          self._select_album_art_thumbnail(job.info_dict))
+        elif not job.thumbnail_url:
+            # Fetch the album art from the best-suited thumbnail of the full video info while the audio is transcoded
+            self._start_album_art_prefetch(job, self._select_album_art_thumbnail(job.info_dict))
+
+        if postprocessor_hook.final_filepath:
+            job.downloaded_path = os.path.normpath(postprocessor_hook.final_filepath)
+            self._output_index.add(job.downloaded_path)
+        else:
+            # No path reported (e.g. nothing was post-processed): look the file up in the directory index
+            base_name = job.filename_base if job.is_playlist_item else self.sanitize_filename(job.info_dict.get('title', ''))
+            job.downloaded_path = self._output_index.find(job.output_dir, base_name)
+            if not job.downloaded_path:
+                raise RuntimeError(f"Could not locate the downloaded file for '{job.info_dict.get('title')}'.")
+            self.log_message(f"  Found download at alternative path: {job.downloaded_path}")
+
+        job.status = 'downloaded'
+        job.video_id = job.video_id or job.info_dict.get('id')
+        self.queue_progress.item_downloaded()
+        if "Audio" not in output_format:
+            self.log_message(f"Video '{job.info_dict.get('title')}' downloaded successfully to {job.downloaded_path}")
+            self._record_in_archive(job, job.downloaded_path, tagged=False)
+
+    def _transcode_stage(self, job, slot):
+        """
+        Pipeline stage 2 (CPU): converts a downloaded audio stream to MP3 at the configured quality,
+        or copies it into the Opus / M4A container (see _remux_audio).
+        Each transcode worker drives its own single-threaded ffmpeg process, so the stage
+        behaves as a process pool and scales with the number of cores.
+        """
+        video_title = job.info_dict.get('title')
+        extension = self._archive_key[0]
+        audio_path = os.path.splitext(job.downloaded_path)[0] + "." + extension
+        quality = self.settings.get('mp3_quality', '320k')
+        if extension == 'mp3':
+            self._set_worker_status(slot, f"Transcoding '{video_title}'")
+            with self._span('transcode') as span:
+                self._transcode_to_mp3(job.downloaded_path, audio_path, quality, id3_padding=self._id3_padding(job))
+                span['bytes'] = os.path.getsize(audio_path)
+            self.log_message(f"  Transcoded to MP3: {os.path.basename(audio_path)}")
+        else:
+            self._set_worker_status(slot, f"Remuxing '{video_title}'")
+            with self._span('remux') as span:
+                copied = self._remux_audio(job.downloaded_path, audio_path, job.info_dict.get('acodec'), quality)
+                span['bytes'] = os.path.getsize(audio_path)
+            self.log_message(f"  {'Copied' if copied else 'Encoded'} audio into {extension.upper()}: {os.path.basename(audio_path)}")
+        self._output_index.discard(job.downloaded_path)
+        self._output_index.add(audio_path)
+        job.audio_path = audio_path # Known exactly, so tagging can start immediately
+        job.status = 'transcoded'
+
+    def _get_ffmpeg_executable(self):
+        """Returns the ffmpeg executable to launch, resolving the configured path (file, folder or empty)."""
+        ffmpeg_path = self.settings.get('ffmpeg_path') or "ffmpeg" # Empty means rely on the system PATH
+        if os.path.isdir(ffmpeg_path):
+            ffmpeg_path = os.path.join(ffmpeg_path, FFMPEG_EXECUTABLE_NAME)
+        return ffmpeg_path
+
+    def _id3_padding(self, job):
+        """
+        Returns the ID3 padding (bytes) to reserve when transcoding a job, so that its tags fit into it:
+        the size of its album art and lyrics if they were prefetched already, else typical sizes.
+        """
+        padding = ID3_PADDING_TEXT_FRAMES
+        prefetched = future_result(job.metadata_prefetch) or {}
+        if not self.settings.get('skip_album_art', False):
+            album_art = future_result(job.album_art_prefetch) or prefetched.get('album_art')
+            padding += len(album_art) if album_art else ID3_PADDING_ALBUM_ART
+        if not self.settings.get('skip_lyrics_scrape', False):
+            if job.metadata_prefetch is not None and job.metadata_prefetch.done():
+                padding += len((prefetched.get('lyrics') or '').encode('utf-8'))
+            else:
+                padding += ID3_PADDING_LYRICS
+            # Lyrics from the video description take precedence; they are known already
+            description = job.info_dict.get('description') or ''
+            padding += len(description.encode('utf-8')) if re.search(r'lyrics', description, re.IGNORECASE) else 0
+        return padding
+
+    def _transcode_to_mp3(self, source_path, mp3_path, quality, id3_padding=0):
+        """
+        Encodes source_path to an MP3 at the given bitrate (e.g. '320k') and removes the source.
+        id3_padding bytes are reserved in the MP3's ID3 tag, for the tags written later (see _id3_padding).
+        Raises FFmpegNotFoundError if ffmpeg cannot be launched and RuntimeError if the encode fails.
+        """
+        self._run_ffmpeg(source_path, mp3_path, [
+            '-codec:a', 'libmp3lame', '-b:a', quality,
+            '-id3v2_version', '4', '-metadata_header_padding', str(id3_padding), # v2.4, as mutagen saves it
+            '-f', 'mp3',
+        ])
+
+    def _remux_audio(self, source_path, audio_path, source_codec, quality):
+        """
+        Copies the audio stream of source_path into the container of audio_path (.opus or .m4a) without
+        re-encoding it, and removes the source. A source in another codec (YouTube did not serve the container's
+        codec for this video) is encoded at the given bitrate instead. Returns True if the stream was copied.
+        Raises FFmpegNotFoundError if ffmpeg cannot be launched and RuntimeError if ffmpeg fails.
+        """
+        codec, muxer, encoder = AUDIO_PASSTHROUGH_CONTAINERS[os.path.splitext(audio_path)[1][1:]]
+        copy = (source_codec or '').startswith(codec)
+        if not copy:
+            self.log_message(f"  Source audio is '{source_codec}', not {codec}: encoding it with {encoder}.", level="warning")
+        codec_options = ['-codec:a', 'copy'] if copy else ['-codec:a', encoder, '-b:a', quality]
+        self._run_ffmpeg(source_path, audio_path, codec_options + ['-f', muxer])
+        return copy
+
+    def _run_ffmpeg(self, source_path, output_path, output_options):
+        """
+        Runs ffmpeg on the audio of source_path with output_options, writing output_path, and removes the source.
+        Raises FFmpegNotFoundError if ffmpeg cannot be launched and RuntimeError if it fails.
+        """
+        root, extension = os.path.splitext(output_path)
+        temp_path = root + ".temp" + extension # Never expose a half-written file
+        command = [
+            self._get_ffmpeg_executable(), '-hide_banner', '-nostdin', '-loglevel', 'error', '-y',
+            '-threads', '1', # One core per encode; parallelism comes from running several encodes
+            '-i', source_path,
+            '-vn',
+        ] + output_options + [temp_path]
+        # Hide the console window that would otherwise flash up for every encode on Windows
+        creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+        try:
+            result = subprocess.run(command, capture_output=True, text=True, creationflags=creationflags)
+        except FileNotFoundError as e: # Only the executable: a missing input file is reported by ffmpeg itself
+            raise FFmpegNotFoundError(command[0]) from e
+        if result.returncode != 0:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise RuntimeError(f"ffmpeg failed to convert '{os.path.basename(source_path)}': {result.stderr.strip()[-500:]}")
+
+        os.replace(temp_path, output_path)
+        if os.path.abspath(source_path) != os.path.abspath(output_path):
+            os.remove(source_path) # Original download is no longer needed
+
+    def _tagging_stage(self, job, slot):
+        """Pipeline stage 3 (metadata): embeds tags, album art and lyrics into the audio file."""
+        video_title = job.info_dict.get('title')
+        self._set_worker_status(slot, f"Tagging '{video_title}'")
+        with self._track_totals_lock:
+            total_tracks = job.total_tracks # May still be unknown while the playlist is being listed
+        with self._span('tagging'):
+            tagged = self.process_audio_metadata(job.audio_path, job.info_dict, job.is_playlist_item, job.track_number, job.playlist_title, total_tracks,
+                                                 prefetched_metadata=job.metadata_prefetch, prefetched_album_art=job.album_art_prefetch)
+        if tagged and job.is_playlist_item:
+            job.tagged_track = (job.track_number, total_tracks or 0) # 0: tagged without a total; see _update_track_tags
+        self._record_in_archive(job, job.audio_path, tagged)
+        job.status = 'done'
+
+    def _main_artist(self, artist_string):
+        """Returns the first artist of an artist/channel string as tagged by process_audio_metadata, or ''."""
+        artists = self.parse_artists(artist_string or '')
+        return artists[0] if artists else ''
+
+    def _start_metadata_prefetch(self, job, title, artist, thumbnail_url):
+        """Starts fetching a job's album art and lyrics in the background, for the tagging stage to embed."""
+        if self._metadata_prefetcher is None or job.metadata_prefetch is not None:
+            return
+        job.metadata_prefetch = self._metadata_prefetcher.submit(self._prefetch_metadata, title, artist, thumbnail_url)
+
+    def _start_album_art_prefetch(self, job, thumbnail_url):
+        """Starts fetching a job's album art in the background, for a job whose metadata prefetch went without it."""
+        if self._metadata_prefetcher is None or self.settings.get('skip_album_art', False) or not thumbnail_url:
+            return
+        job.album_art_prefetch = self._metadata_prefetcher.submit(self._fetch_album_art, thumbnail_url)
+
+    def _select_album_art_thumbnail(self, info):
+        """Returns the URL of the thumbnail to make album art from (see select_thumbnail), or None."""
+        return select_thumbnail(info.get('thumbnails'), info.get('thumbnail'))[0]
+
+    def _prefetch_metadata(self, title, artist, thumbnail_url):
+        """
+        Fetches the album art and scrapes the lyrics of a track. Runs on the metadata prefetch pool.
+        Returns a dict with the lookup key ('title', 'artist', 'thumbnail_url'), 'album_art' (JPEG bytes)
+        and 'lyrics'; each of the last two is None if skipped in the settings or not found.
+        """
+        result = {'title': title, 'artist': artist, 'thumbnail_url': thumbnail_url, 'album_art': None, 'lyrics': None}
+        if not self.settings.get('skip_album_art', False) and thumbnail_url:
+            result['album_art'] = self._fetch_album_art(thumbnail_url)
+        if not self.settings.get('skip_lyrics_scrape', False) and title:
+            result['lyrics'] = self._scrape_lyrics_online(title, artist)
+        return result
+
+    def _wait_for_prefetch(self, prefetched_metadata):
+        """Returns the result of a metadata prefetch (waiting for it if needed), or None if there is none or it failed."""
+        if prefetched_metadata is None:
+            return None
+        try:
+            if prefetched_metadata.done():
+                return prefetched_metadata.result()
+            with self._span('prefetch_wait'):
+                return prefetched_metadata.result()
+        except Exception as e:
+            self.log_message(f"  Warning: Metadata prefetch failed, fetching now instead: {e}", level="warning")
+            return None
+
+    def _get_archive_key(self, output_format):
+        """Returns the (format, quality) pair under which downloads of this run are archived."""
+        if output_format in AUDIO_FORMATS:
+            extension = AUDIO_FORMATS[output_format][0]
+            # Passthrough files keep the source's quality (the bitrate only applies to sources that need encoding)
+            return extension, 'source' if extension in AUDIO_PASSTHROUGH_CONTAINERS else self.settings.get('mp3_quality', '320k')
+        return 'mp4', self.settings.get('video_quality', '1080p')
+
+    def _find_in_archive(self, job):
+        """Returns the archived output path if this job was already completed by a previous run, else None."""
+        if self._download_archive is None or not job.video_id:
+            return None
+        output_format, quality = self._archive_key
+        entry = self._download_archive.lookup(job.video_id, output_format, quality)
+        if entry is None:
+            return None
+        output_path, tagged = entry
+        if output_format != 'mp4' and not tagged:
+            return None # Tagging failed last time, process it again
+        if self.settings.get('archive_verify_files', True) and not os.path.exists(output_path):
+            return None # File was moved or deleted since
+        return output_path
+
+    def _record_in_archive(self, job, output_path, tagged):
+        """Stores a finished job in the download archive (if enabled)."""
+        if self._download_archive is None or not job.video_id:
+            return
+        output_format, quality = self._archive_key
+        try:
+            self._download_archive.record(job.video_id, output_format, quality, os.path.abspath(output_path), tagged)
+        except sqlite3.Error as e:
+            self.log_message(f"  Warning: Could not update the download archive: {e}", level="warning")
+
+    def extract_video_id(self, url):
+        """Returns the 11-character YouTube video ID of a watch/shorts/youtu.be URL, or None."""
+        match = re.search(r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/)([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])', url)
+        return match.group(1) if match else None
+
+    def sanitize_filename(self, filename):
+        """Sanitizes a string to be a valid filename for common OSes."""
+        return ytp_text.sanitize_filename(filename)
+
+    def clean_name_suffix(self, name):
+        """Removes common auto-generated suffixes from artist/album names."""
+        return ytp_text.clean_name_suffix(name)
+
+    def parse_artists(self, artist_string):
+        """
+        Parses a string containing potentially multiple artists into a list.
+        Handles common delimiters like ',', ' & ', ' feat. '.
+        """
+        return ytp_text.parse_artists(artist_string)
+
+    def process_audio_metadata(self, audio_file_path, video_info, is_playlist_item, track_number, playlist_title, total_tracks,
+                               prefetched_metadata=None, prefetched_album_art=None):
+        """
+        Processes and embeds metadata into the audio file (MP3, Opus or M4A, see ytp_tags).
+        prefetched_metadata is the Future of a _prefetch_metadata call; its album art and lyrics are used
+        when they match this track, anything missing is fetched here. prefetched_album_art is the Future
+        of a _fetch_album_art call for this track, if its album art was prefetched separately.
+        Returns True if the tags were saved, False if tagging failed.
+        """
+        from mutagen import MutagenError
+        self.log_message(f"Processing metadata for: {os.path.basename(audio_file_path)}")
+        try:
+            # Existing tags are cleared to prevent duplication/conflict
+            tags = ytp_tags.open_tag_writer(audio_file_path)
+
+
+            # --- Tagging individual fields ---
+            # Title
+            title = video_info.get('title', 'Unknown Title')
+            tags.set_title(title)
+            self.log_message(f"  Tagged Title: {title}")
+
+            # Artist
+            # Prioritize ytdlp 'artist' field, then 'channel', then try parsing
+            artists_list = []
+            if video_info.get('artist'):
+                artists_list = self.parse_artists(video_info['artist'])
+            elif video_info.get('channel'):
+                artists_list = self.parse_artists(video_info['channel'])
+
+            if not artists_list:
+                artists_list = ['Unknown Artist'] # Fallback if no artist found
+            
+            # Every container supports multiple artists
+            tags.set_artists(artists_list)
+            self.log_message(f"  Tagged Artist(s): {', '.join(artists_list)}")
+
+
+            # Album
+            album = "Unknown Album" # Default fallback
+            if is_playlist_item and playlist_title:
+                album = self.clean_name_suffix(playlist_title)
+            else:
+                # For single videos:
+                # 1. Try to get album directly from video_info
+                if video_info.get('album'):
+                    album = self.clean_name_suffix(video_info['album'])
+                # 2. Fallback to channel name, but with a check to avoid redundancy or generic names
+                elif video_info.get('channel'):
+                    channel_name_cleaned = self.clean_name_suffix(video_info['channel'])
+                    # If the channel name is identical or very similar to the main artist,
+                    # and the main artist is not generic, use "YouTube Single" or a more specific album from info_dict.
+                    main_artist = artists_list[0] if artists_list else ''
+                    if main_artist.lower() == channel_name_cleaned.lower() and main_artist.lower() not in ["unknown artist", "various artists"]:
+                        album = "YouTube Single"
+                    elif 'release_date' in video_info and video_info['release_date']:
+                         # If it has a release date, perhaps it's a true single
+                        album = f"{main_artist} - Single ({video_info['release_date'][:4]})" if main_artist else f"Single ({video_info['release_date'][:4]})"
+                    else:
+                        album = channel_name_cleaned # Use channel name if it's sufficiently distinct
+                else:
+                    album = "YouTube Single" # Final fallback for single tracks
+
+            tags.set_album(album)
+            self.log_message(f"  Tagged Album: {album}")
+
+            # Year
+            upload_date = video_info.get('upload_date') # Format:YYYYMMDD
+            if upload_date and len(upload_date) >= 4:
+                year = upload_date[:4]
+                tags.set_year(year)
+                self.log_message(f"  Tagged Year: {year}")
+            else:
+                self.log_message("  Warning: Could not determine year for tagging.", level="warning")
+
+            # Track Number
+            if is_playlist_item and track_number is not None:
+                track_string = f"{track_number}/{total_tracks}" if total_tracks else str(track_number)
+                tags.set_track(track_number, total_tracks)
+                self.log_message(f"  Tagged Track Number: {track_string}")
+            else:
+                self.log_message("  Skipping track number tagging for single video or missing playlist info.")
+
+
+            prefetched = self._wait_for_prefetch(prefetched_metadata)
+
+            # --- Album Art (Cover Art) ---
+            if not self.settings.get('skip_album_art', False):
+                thumbnail_url = self._select_album_art_thumbnail(video_info)
+                album_art = self._wait_for_prefetch(prefetched_album_art) # Fetched while the track was transcoded
+                if album_art is None and prefetched and (prefetched['album_art'] or prefetched['thumbnail_url'] == thumbnail_url):
+                    album_art = prefetched['album_art'] # Fetched while the track downloaded
+                    thumbnail_url = prefetched['thumbnail_url']
+                with self._span('album_art'):
+                    self.process_album_art(tags, thumbnail_url, album_art=album_art)
+            else:
+                self.log_message("  Skipping album art embedding as per settings.")
+
+            # --- Lyrics ---
+            if not self.settings.get('skip_lyrics_scrape', False):
+                main_artist = artists_list[0] if artists_list else ''
+                with self._span('lyrics'):
+                    lyrics = self._extract_lyrics_from_description(video_info.get('description') or '')
+                    if not lyrics and prefetched and (prefetched['lyrics'] or (prefetched['title'], prefetched['artist']) == (title, main_artist)):
+                        lyrics = prefetched['lyrics'] # Looked up while the track downloaded
+                    elif not lyrics:
+                        lyrics = self._scrape_lyrics_online(title, main_artist)
+                if lyrics:
+                    tags.set_lyrics(lyrics)
+                    self.log_message("  Embedded Lyrics successfully.")
+                else:
+                    self.log_message("  No substantial lyrics found or scraped.", level="warning")
+            else:
+                self.log_message("  Skipping lyrics scraping as per settings.")
+
+            # Save the changes (MP3s in place if the tags fit into the padding reserved when transcoding)
+            with self._span('tag_save') as span:
+                padding_keeper = tags.save()
+                span['bytes'] = os.path.getsize(audio_file_path)
+            if padding_keeper is not None:
+                self._record_tag_write(audio_file_path, padding_keeper)
+            self.log_message(f"Metadata tagging complete for: {os.path.basename(audio_file_path)}")
+            return True
+
+        except MutagenError as e:
+            self.show_error("Tagging Error", f"File '{os.path.basename(audio_file_path)}' could not be read or tagged: {e}")
+        except Exception as e:
+            self.show_error("Tagging Error", f"An error occurred during metadata processing for {os.path.basename(audio_file_path)}: {e}")
+            import traceback
+            self.log_message(f"Traceback: {traceback.format_exc()}", level="error")
+        return False
+
+    def _record_tag_write(self, audio_file_path, padding_keeper):
+        """Logs whether saving a track's tags rewrote the file, and counts it for the end-of-run summary."""
+        if padding_keeper.in_place:
+            self.log_message(f"  Tags written in place: {format_bytes(padding_keeper.audio_bytes)} of audio not rewritten.")
+        else:
+            self.log_message(f"  Tags did not fit into the reserved ID3 padding: '{os.path.basename(audio_file_path)}' was rewritten "
+                             f"({format_bytes(padding_keeper.audio_bytes)}).", level="warning")
+        stats = self._tag_write_stats
+        if stats is not None:
+            with self._track_totals_lock:
+                stats['in_place' if padding_keeper.in_place else 'rewritten'] += 1
+                if padding_keeper.in_place:
+                    stats['bytes_saved'] += padding_keeper.audio_bytes
+
+    def process_album_art(self, tags, thumbnail_url, album_art=None):
+        """
+        Sets album art as the cover in tags (a ytp_tags.TagWriter). Unless album_art (prefetched JPEG bytes)
+        is given, the thumbnail is fetched and processed first.
+        """
+        if album_art is None:
+            album_art = self._fetch_album_art(thumbnail_url)
+        if album_art is None:
+            return
+
+        tags.set_cover(album_art)
+        self.log_message("  Embedded Album Art successfully.")
+
+    def _fetch_album_art(self, thumbnail_url):
+        """Returns the album art made from a thumbnail (JPEG bytes, or None), from the album art cache when possible."""
+        if not thumbnail_url:
+            self.log_message("  Warning: No thumbnail URL provided for album art.", level="warning")
+            return None
+        cache = self._album_art_cache
+        if cache is None:
+            return self._make_album_art(thumbnail_url)
+
+        key = f"{album_art_source(thumbnail_url)}@{ALBUM_ART_SIZE}q{ALBUM_ART_JPEG_QUALITY}"
+        with cache.lock(key): # Tracks of a playlist sharing a cover wait for its one fetch
+            try:
+                album_art = cache.get(key)
+            except (sqlite3.Error, OSError) as e:
+                self.log_message(f"  Warning: Could not read the album art cache: {e}", level="warning")
+                album_art = None
+            if album_art is not None:
+                self.log_message("  Album art found in the album art cache.")
+                return album_art
+            album_art = self._make_album_art(thumbnail_url)
+            if album_art is not None:
+                try:
+                    cache.put(key, album_art)
+                except (sqlite3.Error, OSError) as e:
+                    self.log_message(f"  Warning: Could not update the album art cache: {e}", level="warning")
+        return album_art
+
+    def _make_album_art(self, thumbnail_url):
+        """
+        Downloads a thumbnail and turns it into album art (see make_album_art). The image work runs on the
+        album art worker pool while a queue runs. Returns the JPEG bytes, or None.
+        """
+        import requests
+
+        try:
+            self.log_message(f"  Fetching thumbnail from: {thumbnail_url} (in-memory)")
+            with self._span('thumbnail_download') as span:
+                response = http_get(thumbnail_url, timeout=HTTP_TIMEOUT)
+                response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
+                img_data = response.content
+                span['bytes'] = len(img_data)
+
+            with self._span('album_art_processing') as span: # Includes waiting for a free album art worker
+                processor = self._album_art_processor
+                album_art = processor.submit(make_album_art, img_data).result() if processor is not None else make_album_art(img_data)
+                span['bytes'] = len(img_data)
+            return album_art
+        except requests.exceptions.RequestException as req_e:
+            self.log_message(f"  Warning: Failed to download album art from '{thumbnail_url}': {req_e}", level="warning")
+        except Exception as e:
+            self.log_message(f"  Warning: Could not process album art: {e}", level="warning")
+            import traceback
+            self.log_message(f"  Album Art Traceback: {traceback.format_exc()}", level="debug") # Use debug for less critical errors
+        return None
+
+    def extract_and_scrape_lyrics(self, description, title, artist):
+        """
+        Attempts to extract lyrics from video description, then scrapes online if necessary.
+        """
+        # 1. Prioritize extracting from description
+        # 2. Scrape from an external source (e.g., Genius.com, AZLyrics.com)
+        with self._span('lyrics'):
+            return self._extract_lyrics_from_description(description) or self._scrape_lyrics_online(title, artist)
+
+    def _extract_lyrics_from_description(self, description):
+        """Returns the lyrics block of a video description, or None if it has no substantial one."""
+        self.log_message("  Attempting to extract lyrics from video description...")
+        lyrics_block_match = re.search(
+            r'(lyrics:?[\s\r\n]+.*?)' # Capture 'lyrics:' followed by content
+            r'(?:(?:\n{2,}|\r\n{2,})(?:links|socials|subscribe|copyright|produced by|video by|mixed by|mastered by|music by|album by|uploaded by))?', # Non-capturing group for common trailing text
+            description, re.DOTALL | re.IGNORECASE
+        )
+
+        if lyrics_block_match:
+            potential_lyrics = lyrics_block_match.group(1).strip()
+            # Clean "lyrics:" prefix
+            clean_lyrics = re.sub(r'^lyrics:?\s*', '', potential_lyrics, flags=re.IGNORECASE).strip()
+            
+            # Check for substantial content (more than 5 lines and 100 characters)
+            if len(clean_lyrics.split('\n')) > 5 and len(clean_lyrics) > 100:
+                self.log_message("  Lyrics found and extracted from video description.")
+                return clean_lyrics
+        else:
+            self.log_message("  No substantial lyrics found in video description. Attempting to scrape online.")
+        return None
+
+    def _scrape_lyrics_online(self, title, artist):
+        """Looks the track's lyrics up online, answered from the lyrics cache when possible. Returns the lyrics, or None."""
+        cache = self._lyrics_cache
+        if cache is not None:
+            try:
+                cached, lyrics = cache.get(artist, title)
+            except sqlite3.Error as e:
+                self.log_message(f"  Warning: Could not read the lyrics cache: {e}", level="warning")
+                cached = False
+            if cached:
+                self.log_message("  Lyrics found in the lyrics cache." if lyrics else "  No lyrics (cached result of an earlier search).")
+                return lyrics
+
+        with self._span('lyrics_lookup'):
+            lyrics, searched = self._scrape_lyrics_from_web(title, artist)
+        if cache is not None and searched: # Errors are not cached, only real results and misses
+            try:
+                cache.put(artist, title, lyrics)
+            except sqlite3.Error as e:
+                self.log_message(f"  Warning: Could not update the lyrics cache: {e}", level="warning")
+        return lyrics
+
+    def _scrape_lyrics_from_web(self, title, artist):
+        """
+        Searches for the track's lyrics page (Genius, then AZLyrics) and scrapes it.
+        Returns (lyrics or None, searched); searched is False if the lookup failed with an error.
+        """
+        import requests
+        from bs4 import BeautifulSoup # Only needed when scraping
+        try:
+            search_query = f"{title} {artist} lyrics" if artist else f"{title} lyrics"
+            google_search_url = f"https://www.google.com/search?q={requests.utils.quote(search_query)}"
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+                'Accept-Language': 'en-US,en;q=0.9',
+                'Accept-Encoding': 'gzip, deflate, br',
+                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+                'Connection': 'keep-alive',
+            }
+            
+            self.log_message(f"  Searching Google for lyrics: '{search_query}'")
+            with self._span('google_search') as span:
+                google_response = http_get(google_search_url, headers=headers, timeout=HTTP_TIMEOUT)
+                google_response.raise_for_status()
+                span['bytes'] = len(google_response.content)
+            google_soup = BeautifulSoup(google_response.text, 'html.parser')
+
+            lyrics_site_url = None
+            # Prioritize Genius, then AZLyrics
+            for a_tag in google_soup.find_all('a', href=True):
+                href = a_tag['href']
+                if "genius.com" in href and "lyrics" in href:
+                    lyrics_site_url = href
+                    self.log_message(f"  Found Genius.com link: {lyrics_site_url}")
+                    break
+                elif "azlyrics.com" in href and "lyrics" in href:
+                    lyrics_site_url = href
+                    self.log_message(f"  Found AZLyrics.com link: {lyrics_site_url}")
+                    break
+
+            if lyrics_site_url:
+                # Clean up Google redirect URL if necessary
+                if "/url?q=" in lyrics_site_url:
+                    lyrics_site_url = lyrics_site_url.split("/url?q=")[1].split("&sa=")[0]
+                
+                self.log_message(f"  Attempting to scrape lyrics from: {lyrics_site_url}")
+                with self._span('lyrics_page') as span:
+                    lyrics_response = http_get(lyrics_site_url, headers=headers, timeout=HTTP_TIMEOUT)
+                    lyrics_response.raise_for_status()
+                    span['bytes'] = len(lyrics_response.content)
+                lyrics_soup = BeautifulSoup(lyrics_response.text, 'html.parser')
+                
+                full_lyrics = None
+
+                # Logic to extract lyrics (highly site-specific and might break with website changes)
+                if "genius.com" in lyrics_site_url:
+                    # Genius lyrics are typically in a div with data-lyrics-container attribute or specific class
+                    lyrics_divs = lyrics_soup.find_all('div', {'data-lyrics-container': 'true'})
+                    if not lyrics_divs: # Fallback for older/different structures
+                         lyrics_divs = lyrics_soup.find_all('div', class_=lambda x: x and 'Lyrics__Container' in x) # More flexible class matching
+
+                    if lyrics_divs:
+                        lyrics_text_parts = []
+                        for lyrics_div in lyrics_divs:
+                            # Use .stripped_strings to get text content and handle newlines, then re-join
+                            lyrics_text_parts.extend(lyrics_div.stripped_strings)
+                        
+                        full_lyrics = '\n'.join(lyrics_text_parts).strip()
+                        # Clean up annotations like "[Verse 1]" from Genius - keep if it's structural (like 'verse', 'chorus')
+                        full_lyrics = re.sub(r'\[(.*?)\]', lambda m: m.group(0) if re.search(r'(verse|chorus|bridge|outro|intro|hook|pre-chorus|interlude|solo)', m.group(1).lower()) else '', full_lyrics)
+                        full_lyrics = re.sub(r'\n{3,}', '\n\n', full_lyrics) # Reduce excessive newlines
+                        
+                elif "azlyrics.com" in lyrics_site_url:
+                    # AZLyrics lyrics are often in a specific div after a comment or certain structure
+                    # This is tricky due to ads and comments. The lyrics are typically in a <div> without a class
+                    # that is a direct sibling to an ad block or a specific comment.
+                    lyrics_div_container = lyrics_soup.find('div', class_='col-xs-12 col-lg-8 text-center')
+                    if lyrics_div_container:
+                        for sibling in lyrics_div_container.children:
+                            # Look for the target div. AZLyrics often places lyrics after a specific comment.
+                            if isinstance(sibling, str) and "<!-- Usage of azlyrics.com content by any third-party lyrics provider is prohibited by our licensing agreement. -->" in sibling:
+                                # The very next <div> sibling usually contains the lyrics
+                                actual_lyrics_div = sibling.find_next_sibling('div')
+                                if actual_lyrics_div and not actual_lyrics_div.get('class'): # Check if it has no class
+                                    full_lyrics = actual_lyrics_div.get_text(separator="\n").strip()
+                                    break
+                            elif sibling.name == 'div' and not sibling.get('class') and len(sibling.find_all('br')) > 5:
+                                # Fallback: if it's a div with no class and many <br> (likely lyrics)
+                                full_lyrics = sibling.get_text(separator="\n").strip()
+                                break
+                
+                if full_lyrics and len(full_lyrics) > 100: # Simple check for substantial content
+                    self.log_message(f"  Scraped lyrics successfully from {lyrics_site_url}.")
+                    return full_lyrics, True
+                else:
+                    self.log_message(f"  Failed to extract substantial lyrics from {lyrics_site_url}. Content too short or structure unexpected.", level="warning")
+            else:
+                self.log_message("  No suitable lyrics website found in Google search results.", level="warning")
+
+        except requests.exceptions.RequestException as req_e:
+            self.log_message(f"  Error accessing lyrics website: {req_e}", level="warning")
+            return None, False
+        except Exception as e:
+            self.log_message(f"  Error during lyrics scraping: {e}", level="warning")
+            import traceback
+            self.log_message(f"  Lyrics Scraping Traceback: {traceback.format_exc()}", level="debug")
+            return None, False
+
+        return None, True # Searched, but no lyrics were found
@@ -0,0 +1,248 @@
+"""
+Profiling of queue runs for the YouTube Content Downloader (opt-in, see QueueEngine.run_download_queue).
+
+QueueProfiler collects, for one queue run:
+  - CPU profiles (cProfile) of every thread the run starts, besides the queue thread itself. Up to Python
+    3.11 each thread gets its own profiler, so the wait times below are known per thread. From 3.12 on,
+    cProfile profiles all threads at once, so they are only known for the run as a whole.
+  - Allocation snapshots (tracemalloc): the top allocation sites, from a snapshot taken near the traced peak.
+  - Thread wait times: time spent blocked in locks and queues, sleeping, on the network and on subprocesses
+    (FFmpeg), from the profiles' own time in the blocking calls.
+stop() writes <name>.prof (load it with pstats or snakeviz) and a <name>.txt report, and returns a
+ProfileReport whose summary_lines go to the activity log. cProfile, pstats and tracemalloc are imported
+when profiling starts.
+"""
+import io
+import os
+import re
+import sys
+import threading
+import time
+
+
+PROFILE_TOP_N = 25 # Functions and allocation sites listed in the report
+PROFILE_KEEP_RUNS = 10 # Older profiles in the profile directory are deleted
+MEMORY_SAMPLE_INTERVAL = 1.0 # Seconds between checks whether traced memory reached a new peak
+MEMORY_SNAPSHOT_GROWTH = 1.2 # A new snapshot is taken when traced memory exceeds the last one's by this factor
+
+# Wait category -> pattern of the blocking functions (pstats names of built-in functions) counted in it
+WAIT_CATEGORIES = {
+    'locks/queues': re.compile(r"<method 'acquire' of '_thread\.(?:lock|RLock)' objects>|<method 'get' of '_queue\.SimpleQueue' objects>"),
+    'sleep': re.compile(r"<built-in method time\.sleep>"),
+    'network': re.compile(r"of '_socket\.socket' objects>|of '_ssl\._SSLSocket' objects>|_socket\.getaddrinfo"),
+    'subprocess': re.compile(r"posix\.waitpid|of 'select\.(?:poll|epoll)' objects>|select\.select"),
+}
+
+
+def thread_group(name):
+    """Name of a thread without its number: 'album-art_3' -> 'album-art', 'Thread-7 (worker)' -> 'Thread (worker)'."""
+    return re.sub(r'(?:[-_ ]\d+)+(?=$| \()', '', name) or name
+
+
+def function_label(function):
+    """Readable name of a pstats function key (file name, line, function name)."""
+    file_name, line, name = function
+    if file_name == '~': # Built-in
+        return name
+    return f"{os.path.basename(file_name)}:{line}({name})"
+
+
+def wait_category(function):
+    """The wait category of a pstats function key if it is a blocking function, else None."""
+    if function[0] != '~':
+        return None
+    for category, pattern in WAIT_CATEGORIES.items():
+        if pattern.search(function[2]):
+            return category
+    return None
+
+
+def wait_times(stats):
+    """Returns {wait category: seconds} from a pstats.Stats' own time in blocking functions."""
+    waits = dict.fromkeys(WAIT_CATEGORIES, 0.0)
+    for function, (_, _, own_time, _, _) in stats.stats.items():
+        category = wait_category(function)
+        if category is not None:
+            waits[category] += own_time
+    return waits
+
+
+class ProfileReport(object):
+    """What a QueueProfiler found: the saved files and the figures for the activity log summary."""
+    def __init__(self, prof_path, report_path, wall_seconds, cpu_seconds, thread_count, top_own_time,
+                 peak_traced_bytes, top_allocations, waits_by_group):
+        self.prof_path = prof_path
+        self.report_path = report_path
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds # Profiled time of all threads (includes their waits)
+        self.thread_count = thread_count
+        self.top_own_time = top_own_time # [(function label, seconds)], blocking functions left out
+        self.peak_traced_bytes = peak_traced_bytes
+        self.top_allocations = top_allocations # [(allocation site, bytes)] near the peak
+        self.waits_by_group = waits_by_group # thread group (or 'all threads') -> {wait category: seconds}
+
+    def summary_lines(self):
+        """A few lines for the activity log."""
+        mib = 1024 * 1024
+        lines = [f"Profile of the queue run ({self.wall_seconds:.1f} s, {self.thread_count} thread(s)) saved to '{self.report_path}'."]
+        if self.top_own_time:
+            lines.append("  Most own time: " + ", ".join(f"{label} {seconds:.2f} s" for label, seconds in self.top_own_time[:3]))
+        if self.top_allocations:
+            site, size = self.top_allocations[0]
+            lines.append(f"  Memory: {self.peak_traced_bytes / mib:.1f} MiB traced at the peak; largest allocation site {site} ({size / mib:.1f} MiB)")
+        totals = dict.fromkeys(WAIT_CATEGORIES, 0.0)
+        for waits in self.waits_by_group.values():
+            for category, seconds in waits.items():
+                totals[category] += seconds
+        lines.append("  Thread waits: " + ", ".join(f"{category} {seconds:.1f} s" for category, seconds in totals.items()))
+        return lines
+
+
+class QueueProfiler(object):
+    """
+    Profiles the calling thread and every thread started while it runs (start() ... stop()), and traces
+    memory allocations. start() and stop() must be called from the same thread. Files go to profile_dir.
+    """
+    def __init__(self, profile_dir):
+        self.profile_dir = profile_dir
+        self._profiles = [] # [(thread, cProfile.Profile)]
+        self._per_thread = True # False once cProfile turned out to profile all threads at once (Python 3.12+)
+        self._lock = threading.Lock()
+        self._stop_sampling = threading.Event()
+        self._sampler = None
+        self._snapshot = None
+        self._snapshot_traced = 0
+        self._started_tracemalloc = False
+        self._start = None
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+        self._start = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        # Started before the profile hook is installed, so its own waits are not reported
+        self._sampler = threading.Thread(target=self._sample_memory, name="profiler-memory", daemon=True)
+        self._sampler.start()
+
+        profile = cProfile.Profile()
+        profile.enable()
+        self._profiles.append((threading.current_thread(), profile))
+        threading.setprofile(self._profile_new_thread)
+
+    def _profile_new_thread(self, frame, event, arg):
+        # Runs once in every thread started since start(), on its first profiling event
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable() # Replaces this hook for the thread
+        except ValueError: # Python 3.12+: the profiler started in start() already profiles this thread
+            self._per_thread = False
+            sys.setprofile(None)
+            return
+        with self._lock:
+            self._profiles.append((threading.current_thread(), profile))
+
+    def _sample_memory(self):
+        while not self._stop_sampling.wait(MEMORY_SAMPLE_INTERVAL):
+            self._take_snapshot_if_grown()
+
+    def _take_snapshot_if_grown(self):
+        import tracemalloc
+        traced, _ = tracemalloc.get_traced_memory()
+        if traced > self._snapshot_traced * MEMORY_SNAPSHOT_GROWTH:
+            self._snapshot = tracemalloc.take_snapshot()
+            self._snapshot_traced = traced
+
+    def stop(self):
+        """Stops profiling, writes the profile files and returns the ProfileReport."""
+        import pstats
+        import tracemalloc
+        threading.setprofile(None)
+        self._profiles[0][1].disable()
+        wall_seconds = time.perf_counter() - self._start
+        self._stop_sampling.set()
+        self._sampler.join()
+        self._take_snapshot_if_grown()
+        _, peak_traced = tracemalloc.get_traced_memory()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+
+        with self._lock:
+            # A thread still running keeps writing into its profile; it is left out
+            profiles = [(thread, profile) for thread, profile in self._profiles if thread is threading.current_thread() or not thread.is_alive()]
+        stats_by_group = {}
+        for thread, profile in profiles:
+            group = thread_group(thread.name) if self._per_thread else 'all threads'
+            thread_stats = pstats.Stats(profile)
+            if group in stats_by_group:
+                stats_by_group[group].add(thread_stats)
+            else:
+                stats_by_group[group] = thread_stats
+        waits_by_group = {group: wait_times(group_stats) for group, group_stats in stats_by_group.items()}
+
+        output = io.StringIO()
+        stats = pstats.Stats(profiles[0][1], stream=output)
+        for _, profile in profiles[1:]:
+            stats.add(profile)
+        cpu_seconds = stats.total_tt
+        top_own_time = sorted(((function_label(function), entry[2]) for function, entry in stats.stats.items()
+                               if wait_category(function) is None), key=lambda item: -item[1])
+        top_allocations = []
+        if self._snapshot is not None:
+            snapshot = self._snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+            top_allocations = [(f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}", stat.size)
+                               for stat in snapshot.statistics('lineno')[:PROFILE_TOP_N]]
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = self._new_run_name()
+        prof_path = os.path.join(self.profile_dir, name + ".prof")
+        report_path = os.path.join(self.profile_dir, name + ".txt")
+        stats.dump_stats(prof_path)
+        report = ProfileReport(prof_path, report_path, wall_seconds, cpu_seconds, len(profiles), top_own_time[:PROFILE_TOP_N],
+                               peak_traced, top_allocations, waits_by_group)
+        self._write_report(report, stats, output)
+        self._prune()
+        return report
+
+    def _new_run_name(self):
+        """Name of this run's files: its start time, with a number added if a run in the same second took it."""
+        name = "queue_run_" + time.strftime("%Y%m%d-%H%M%S")
+        candidate, number = name, 1
+        while any(os.path.exists(os.path.join(self.profile_dir, candidate + extension)) for extension in (".prof", ".txt")):
+            number += 1
+            candidate = f"{name}-{number}"
+        return candidate
+
+    def _write_report(self, report, stats, output):
+        mib = 1024 * 1024
+        output.write(f"Queue run profile, {time.strftime('%Y-%m-%d %H:%M:%S')}: {report.wall_seconds:.1f} s, "
+                     f"{report.thread_count} thread(s) profiled{'' if self._per_thread else ' together'}, "
+                     f"{report.cpu_seconds:.1f} s profiled time (waits included)\n")
+        output.write(f"\n== CPU: top {PROFILE_TOP_N} functions by cumulative time ==\n")
+        stats.sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+        output.write(f"\n== CPU: top {PROFILE_TOP_N} functions by own time ==\n")
+        stats.sort_stats('tottime').print_stats(PROFILE_TOP_N)
+
+        output.write(f"\n== Memory: {report.peak_traced_bytes / mib:.1f} MiB traced at the peak; "
+                     f"top allocation sites of the snapshot taken at {self._snapshot_traced / mib:.1f} MiB ==\n")
+        for site, size in report.top_allocations:
+            output.write(f"  {size / mib:9.2f} MiB  {site}\n")
+
+        output.write("\n== Thread waits (seconds) ==\n")
+        output.write(f"  {'threads':<32}" + "".join(f"{category:>14}" for category in WAIT_CATEGORIES) + "\n")
+        for group, waits in sorted(report.waits_by_group.items()):
+            output.write(f"  {group:<32}" + "".join(f"{waits[category]:>14.2f}" for category in WAIT_CATEGORIES) + "\n")
+        with open(report.report_path, 'w', encoding='utf-8') as f:
+            f.write(output.getvalue())
+
+    def _prune(self):
+        """Deletes all but the last PROFILE_KEEP_RUNS runs' profiles."""
+        names = sorted({os.path.splitext(file_name)[0] for file_name in os.listdir(self.profile_dir) if file_name.startswith("queue_run_")})
+        for name in names[:-PROFILE_KEEP_RUNS]:
+            for extension in (".prof", ".txt"):
+                try:
+                    os.remove(os.path.join(self.profile_dir, name + extension))
+                except OSError:
+                    pass
@@ -0,0 +1,231 @@
+"""
+Tag writers of the YouTube Content Downloader: one per audio container, behind the same interface.
+
+  - MP3:  ID3v2.4 frames (TIT2, TPE1, TALB, TDRC, TRCK, APIC, USLT), saved in place when they fit into
+          the padding reserved when transcoding (see ID3PaddingKeeper)
+  - Opus: Vorbis comments in the Ogg Opus header (TITLE, ARTIST, ..., METADATA_BLOCK_PICTURE, LYRICS)
+  - M4A:  iTunes-style MP4 atoms (\xa9nam, \xa9ART, \xa9alb, \xa9day, trkn, covr, \xa9lyr)
+
+open_tag_writer picks the writer from the file extension. mutagen is imported when a writer is opened,
+not when this module is imported (see the ytp_engine module docstring).
+"""
+import abc
+import os
+
+
+class ID3PaddingKeeper(object):
+    """
+    padding callback for mutagen's save: if the new tag fits into the file's current tag (with its padding),
+    keeps the tag at that size, so mutagen overwrites it in place instead of moving all the audio behind it.
+    tag_size is the size of the file's current tag (ID3.size). Records whether the new tag fit (in_place)
+    and the size of the audio after the tag (audio_bytes), i.e. what a rewrite moves.
+    """
+    def __init__(self, tag_size=0):
+        self.tag_size = tag_size
+        self.in_place = None
+        self.audio_bytes = 0
+
+    def __call__(self, info):
+        self.in_place = info.padding >= 0
+        self.audio_bytes = max(0, info.size - self.tag_size) # info.size: the file from the start of the tag on
+        # mutagen's default would shrink a large leftover padding, which means rewriting the file as well
+        return info.padding if self.in_place else info.get_default_padding()
+
+
+class TagWriter(abc.ABC):
+    """
+    The tags of one audio file. Opened with clear=True, the file's existing tags are dropped and only what is
+    set is saved; otherwise the set fields replace those already in the file. Nothing is written until save().
+    """
+    def __init__(self, path, clear=True):
+        self.path = path
+
+    @abc.abstractmethod
+    def set_title(self, title):
+        """Sets the title."""
+
+    @abc.abstractmethod
+    def set_artists(self, artists):
+        """Sets the artists (a list, one entry per artist)."""
+
+    @abc.abstractmethod
+    def set_album(self, album):
+        """Sets the album."""
+
+    @abc.abstractmethod
+    def set_year(self, year):
+        """Sets the release year (a string)."""
+
+    @abc.abstractmethod
+    def set_track(self, track_number, total_tracks=None):
+        """Sets the track number, and the number of tracks if known (None or 0: unknown)."""
+
+    @abc.abstractmethod
+    def set_cover(self, jpeg_data):
+        """Sets the front cover (JPEG bytes)."""
+
+    @abc.abstractmethod
+    def set_lyrics(self, lyrics):
+        """Sets the unsynchronized lyrics."""
+
+    @abc.abstractmethod
+    def save(self):
+        """Writes the tags. Returns an ID3PaddingKeeper for MP3s (whether the file was rewritten), else None."""
+
+
+class ID3TagWriter(TagWriter):
+    """ID3v2.4 tags of an MP3."""
+    def __init__(self, path, clear=True):
+        super().__init__(path, clear)
+        from mutagen.mp3 import MP3
+        from mutagen.id3 import ID3
+        self.audio = MP3(path, ID3=ID3)
+        if self.audio.tags is None:
+            self.audio.tags = ID3()
+        self.tag_size = self.audio.tags.size # Of the tag in the file, padding included
+        if clear:
+            self.audio.clear() # Clear existing tags to prevent duplication/conflict
+
+    def _set(self, frame):
+        self.audio.tags.setall(frame.FrameID, [frame])
+
+    def set_title(self, title):
+        from mutagen.id3 import TIT2
+        self._set(TIT2(encoding=3, text=[title]))
+
+    def set_artists(self, artists):
+        from mutagen.id3 import TPE1
+        self._set(TPE1(encoding=3, text=list(artists))) # TPE1 supports multiple values as a list
+
+    def set_album(self, album):
+        from mutagen.id3 import TALB
+        self._set(TALB(encoding=3, text=[album]))
+
+    def set_year(self, year):
+        from mutagen.id3 import TDRC
+        self._set(TDRC(encoding=3, text=[year]))
+
+    def set_track(self, track_number, total_tracks=None):
+        from mutagen.id3 import TRCK
+        self._set(TRCK(encoding=3, text=[f"{track_number}/{total_tracks}" if total_tracks else str(track_number)]))
+
+    def set_cover(self, jpeg_data):
+        from mutagen.id3 import APIC
+        self.audio.tags.add(APIC(
+            encoding=3, # UTF-8
+            mime='image/jpeg', # Image format
+            type=3, # 3 is for Front Cover
+            desc='Cover',
+            data=jpeg_data
+        ))
+
+    def set_lyrics(self, lyrics):
+        from mutagen.id3 import USLT
+        # Use USLT for unsynchronized lyrics
+        self.audio.tags.add(USLT(encoding=3, lang='eng', desc='Lyrics', text=lyrics))
+
+    def save(self):
+        padding_keeper = ID3PaddingKeeper(self.tag_size)
+        self.audio.save(padding=padding_keeper)
+        return padding_keeper
+
+
+class VorbisCommentTagWriter(TagWriter):
+    """Vorbis comments of an Ogg Opus file."""
+    def __init__(self, path, clear=True):
+        super().__init__(path, clear)
+        from mutagen.oggopus import OggOpus
+        self.audio = OggOpus(path)
+        if clear:
+            self.audio.tags.clear()
+
+    def set_title(self, title):
+        self.audio.tags['TITLE'] = [title]
+
+    def set_artists(self, artists):
+        self.audio.tags['ARTIST'] = list(artists) # One comment per artist
+
+    def set_album(self, album):
+        self.audio.tags['ALBUM'] = [album]
+
+    def set_year(self, year):
+        self.audio.tags['DATE'] = [year]
+
+    def set_track(self, track_number, total_tracks=None):
+        self.audio.tags['TRACKNUMBER'] = [str(track_number)]
+        if total_tracks:
+            self.audio.tags['TRACKTOTAL'] = [str(total_tracks)]
+        elif 'TRACKTOTAL' in self.audio.tags:
+            del self.audio.tags['TRACKTOTAL']
+
+    def set_cover(self, jpeg_data):
+        import base64
+        from mutagen.flac import Picture
+        picture = Picture()
+        picture.type = 3 # Front Cover
+        picture.mime = 'image/jpeg'
+        picture.desc = 'Cover'
+        picture.data = jpeg_data
+        # Ogg files carry pictures as base64-encoded FLAC picture blocks
+        self.audio.tags['METADATA_BLOCK_PICTURE'] = [base64.b64encode(picture.write()).decode('ascii')]
+
+    def set_lyrics(self, lyrics):
+        self.audio.tags['LYRICS'] = [lyrics]
+
+    def save(self):
+        self.audio.save()
+        return None
+
+
+class MP4TagWriter(TagWriter):
+    """iTunes-style metadata atoms of an M4A file."""
+    def __init__(self, path, clear=True):
+        super().__init__(path, clear)
+        from mutagen.mp4 import MP4
+        self.audio = MP4(path)
+        if self.audio.tags is None:
+            self.audio.add_tags()
+        elif clear:
+            self.audio.tags.clear()
+
+    def set_title(self, title):
+        self.audio.tags['\xa9nam'] = [title]
+
+    def set_artists(self, artists):
+        self.audio.tags['\xa9ART'] = list(artists)
+
+    def set_album(self, album):
+        self.audio.tags['\xa9alb'] = [album]
+
+    def set_year(self, year):
+        self.audio.tags['\xa9day'] = [year]
+
+    def set_track(self, track_number, total_tracks=None):
+        self.audio.tags['trkn'] = [(track_number, total_tracks or 0)]
+
+    def set_cover(self, jpeg_data):
+        from mutagen.mp4 import MP4Cover
+        self.audio.tags['covr'] = [MP4Cover(jpeg_data, imageformat=MP4Cover.FORMAT_JPEG)]
+
+    def set_lyrics(self, lyrics):
+        self.audio.tags['\xa9lyr'] = [lyrics]
+
+    def save(self):
+        self.audio.save()
+        return None
+
+
+# Audio file extension -> its tag writer
+TAG_WRITERS = {
+    '.mp3': ID3TagWriter,
+    '.opus': VorbisCommentTagWriter,
+    '.m4a': MP4TagWriter,
+}
+
+
+def open_tag_writer(path, clear=True):
+    """Returns the TagWriter for an audio file, by its extension. Raises ValueError for other files."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in TAG_WRITERS:
+        raise ValueError(f"No tag writer for '{extension}' files.")
+    return TAG_WRITERS[extension](path, clear)
@@ -0,0 +1,80 @@
+"""
+Text normalization of the YouTube Content Downloader: file names, artist/album names and artist lists.
+
+All patterns are compiled once at import. sanitize_filename works in a few C-level passes;
+clean_name_suffix first checks with a single combined pattern whether there is anything to remove,
+and it and parse_artists answer repeated inputs (the channel of every entry of a playlist, the
+playlist title, ...) from a cache. sanitize_filenames normalizes the file names of all entries of a playlist at once.
+The results are exactly those of the original per-pattern re.sub implementations
+(benchmarks/text_benchmark.py checks this on every run).
+"""
+import functools
+import re
+
+
+FILENAME_MAX_LENGTH = 200
+_CACHE_SIZE = 8192 # Distinct strings remembered per function
+
+# Characters not allowed in file names on common OSes, deleted by sanitize_filename
+_FILENAME_INVALID_CHARACTERS = re.compile(r'[<>:"/\\|?*]+')
+_FILENAME_PERIODS = re.compile(r'\.\.+')
+
+# Auto-generated suffixes/prefix removed by clean_name_suffix, in the order they are removed
+_NAME_SUFFIX_PATTERNS = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r' - Topic$',
+    r' - Official Audio$',
+    r' - Official Video$',
+    r'\(Official Music Video\)$',
+    r'\(Official Audio\)$',
+    r'\[Official Music Video\]$',
+    r'\[Official Audio\]$',
+    r'^Album - ', # Added for the specific issue with album prefix
+))
+# Matches a name if (and only if) clean_name_suffix removes anything from it
+_NAME_HAS_SUFFIX = re.compile(
+    r'(?: - Topic| - Official Audio| - Official Video|\(Official Music Video\)|\(Official Audio\)'
+    r'|\[Official Music Video\]|\[Official Audio\])\s*$|^\s*Album - ', re.IGNORECASE)
+
+# "feat." / "ft." / "&" separate artists like commas do
+_ARTIST_SEPARATORS = re.compile(r'\s*(?:feat\.|ft\.|&)\s*', re.IGNORECASE)
+
+
+def sanitize_filename(filename):
+    """Sanitizes a string to be a valid filename for common OSes."""
+    # Delete invalid characters; collapse whitespace into single spaces and strip it at both ends
+    filename = ' '.join(_FILENAME_INVALID_CHARACTERS.sub('', filename).split())
+    if '..' in filename:
+        filename = _FILENAME_PERIODS.sub('.', filename)
+    return filename.strip('.')[:FILENAME_MAX_LENGTH]
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def clean_name_suffix(name):
+    """Removes common auto-generated suffixes from artist/album names."""
+    if _NAME_HAS_SUFFIX.search(name) is None:
+        return name.strip()
+    # Removing one suffix can expose another, so they are removed one after the other, in order
+    for pattern in _NAME_SUFFIX_PATTERNS:
+        name = pattern.sub('', name).strip()
+    return name
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _parse_artists(artist_string):
+    artists = (clean_name_suffix(artist.strip()) for artist in _ARTIST_SEPARATORS.sub(',', artist_string).split(','))
+    return tuple(artist for artist in artists if artist)
+
+
+def parse_artists(artist_string):
+    """
+    Parses a string containing potentially multiple artists into a list.
+    Handles common delimiters like ',', ' & ', ' feat. '.
+    """
+    if not artist_string:
+        return []
+    return list(_parse_artists(artist_string)) # A new list every call, callers may change it
+
+
+def sanitize_filenames(filenames):
+    """Batch version of sanitize_filename: returns the sanitized file names, in order."""
+    return [sanitize_filename(filename) for filename in filenames]
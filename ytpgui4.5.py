@@ -1,119 +1,43 @@
 import customtkinter as ctk
 import os
 import threading
+import queue # Thread-safe log message queue
 from tkinter import filedialog, messagebox
 import subprocess
-from PIL import Image
-from io import BytesIO
-import requests
-from bs4 import BeautifulSoup
-from mutagen.mp3 import MP3
-from mutagen.id3 import ID3, TIT2, TPE1, TALB, TDRC, TRCK, APIC, USLT, ID3NoHeaderError
-import yt_dlp
-import re # For cleaning filenames and text
-import time # For logging timestamps and simulating delays
-import json # For saving/loading settings
-from appdirs import user_config_dir # For cross-platform config directory
+import time # For logging timestamps
+import json # For saving settings
 import platform # To detect OS for opening folders
 import webbrowser # For opening links in a web browser
-import sys # Import sys for PyInstaller checks
-
-
-# --- Determine if running in a PyInstaller bundle ---
-# This flag will be True if the application is running as a PyInstaller-created executable.
-IS_FROZEN = getattr(sys, 'frozen', False)
-
-# Determine the correct FFmpeg executable name based on OS
-if sys.platform.startswith('win'):
-    FFMPEG_EXECUTABLE_NAME = 'ffmpeg.exe'
-else: # Linux, macOS
-    FFMPEG_EXECUTABLE_NAME = 'ffmpeg'
-
-# Determine the default FFmpeg path based on the execution environment
-if IS_FROZEN:
-    # When bundled by PyInstaller, files added with --add-binary or --add-data
-    # are often placed in the root of sys._MEIPASS (for 'onefile' mode)
-    # or in the directory of the executable (for 'onedir' mode).
-    # sys._MEIPASS is a temporary directory created for onefile executables.
-    # We prioritize sys._MEIPASS if it exists, otherwise assume 'onedir' mode
-    # where resources are relative to the executable's directory.
-    _base_path = sys._MEIPASS if hasattr(sys, '_MEIPASS') else os.path.dirname(sys.executable)
-    DEFAULT_FFMPEG_PATH_DETERMINED = os.path.join(_base_path, FFMPEG_EXECUTABLE_NAME)
-else:
-    # When running as a standard Python script (development environment),
-    # assume FFmpeg is in the same directory as the script.
-    # If you prefer to rely on system PATH during development, change this to "ffmpeg".
-    DEFAULT_FFMPEG_PATH_DETERMINED = os.path.join(os.path.dirname(os.path.abspath(__file__)), FFMPEG_EXECUTABLE_NAME)
-
-
-# --- Configuration ---
-# This variable now holds the *initial* default FFmpeg path,
-# which is dynamically set based on whether the app is bundled or not.
-# User settings will always override this initial default if they have saved a custom path.
-DEFAULT_FFMPEG_PATH = DEFAULT_FFMPEG_PATH_DETERMINED
+# The download queue engine lives in ytp_engine so the headless command line (ytp_cli.py) can use it without Tk
+from ytp_engine import (DEFAULT_FFMPEG_PATH, DEFAULT_FFMPEG_PATH_DETERMINED, QueueEngine, QueueJournal,
+                        format_bytes, format_duration, is_valid_queue_url)
 
 
-# Set CustomTkinter appearance
-ctk.set_appearance_mode("System")  # Modes: "System" (default), "Dark", "Light"
-ctk.set_default_color_theme("blue")  # Themes: "blue" (default), "green", "dark-blue"
+# Activity log batching: queued messages are flushed into the textbox at a fixed rate,
+# and the textbox only keeps the most recent lines (the full history is kept in memory for "Save Log").
+LOG_FLUSH_INTERVAL_MS = 100
+LOG_TEXTBOX_MAX_LINES = 2000
 
-# --- youtube-dlp Custom Logger and Progress Hook ---
-class YTDL_Logger(object):
-    """Custom logger to pipe youtube-dlp messages to the GUI log."""
-    def __init__(self, app_instance):
-        self.app = app_instance
-
-    def debug(self, msg):
-        # Filter out overly verbose debug messages, keep essential ones
-        if any(keyword in msg for keyword in ["Downloading webpage", "Extracting URL", "Downloading", "Destination", "ffmpeg"]):
-            self.app.log_message(f"[YTDL] {msg}", level="debug")
-        pass # Comment out for less verbose debug logs in GUI
-
-    def warning(self, msg):
-        self.app.log_message(f"[YTDL WARNING] {msg}", level="warning")
-
-    def error(self, msg):
-        # Errors from ytdlp should ideally trigger a GUI messagebox, not just log
-        self.app.log_message(f"[YTDL ERROR] {msg}", level="error")
-        self.app.after(0, lambda: self.app.show_error("youtube-dlp Error", msg))
-
-class YTDL_Progress_Hook(object):
-    """Custom progress hook to update GUI during download."""
-    def __init__(self, app_instance):
-        self.app = app_instance
-
-    def __call__(self, d):
-        if d['status'] == 'downloading':
-            filename = d.get('filename', 'Unknown File')
-            # Clean up filename for display if it's a temp file
-            if filename.endswith(".part"):
-                filename = filename[:-5]
-            
-            total_bytes_str = d.get('_total_bytes_str', d.get('_total_bytes_estimate_str', 'N/A'))
-            percent_str = d.get('_percent_str', 'N/A')
-            speed_str = d.get('_speed_str', 'N/A')
-            eta_str = d.get('_eta_str', 'N/A')
+# The progress bar and queue status line are refreshed from the shared QueueProgress at this rate (10 Hz)
+PROGRESS_REFRESH_INTERVAL_MS = 100
 
-            log_msg = f"[DOWNLOAD] {filename}: {percent_str} of {total_bytes_str} at {speed_str} ETA: {eta_str}"
-            self.app.log_message(log_msg, level="info")
+# Settings window choices -> 'bandwidth_limit' (KiB/s) and 'host_requests_per_second' setting values (0 = unlimited)
+BANDWIDTH_LIMIT_CHOICES = {"Unlimited": 0, "256 KB/s": 256, "512 KB/s": 512, "1 MB/s": 1024, "2 MB/s": 2048,
+                           "5 MB/s": 5120, "10 MB/s": 10240, "25 MB/s": 25600}
+HOST_REQUEST_RATE_CHOICES = {"Unlimited": 0, "0.5 / s": 0.5, "1 / s": 1, "2 / s": 2, "5 / s": 5, "10 / s": 10}
 
-            # Update progress bar if enabled
-            if self.app.settings.get('show_progress_bar', False):
-                try:
-                    percent = float(d.get('downloaded_bytes', 0)) / float(d.get('total_bytes', 1))
-                    self.app.after(0, lambda: self.app.progress_bar.set(percent))
-                except Exception:
-                    pass # Ignore errors if bytes info is missing
 
-        elif d['status'] == 'finished':
-            self.app.log_message(f"[DOWNLOAD] Finished processing: {d['filename']}", level="info")
-            if self.app.settings.get('show_progress_bar', False):
-                self.app.after(0, lambda: self.app.progress_bar.set(0)) # Reset progress bar
+def _choice_label(choices, value):
+    """Returns the label of a setting value among choices (a value set by hand in the config file is shown as is)."""
+    for label, choice in choices.items():
+        if choice == value:
+            return label
+    return str(value)
+
 
-        elif d['status'] == 'error':
-            self.app.log_message(f"[DOWNLOAD ERROR] {d.get('filename', 'Unknown File')}: {d.get('error', 'An error occurred.')}", level="error")
-            if self.app.settings.get('show_progress_bar', False):
-                self.app.after(0, lambda: self.app.progress_bar.set(0)) # Reset progress bar
+# Set CustomTkinter appearance
+ctk.set_appearance_mode("System")  # Modes: "System" (default), "Dark", "Light"
+ctk.set_default_color_theme("blue")  # Themes: "blue" (default), "green", "dark-blue"
 
 
 class SettingsWindow(ctk.CTkToplevel):
@@ -121,7 +45,7 @@ class SettingsWindow(ctk.CTkToplevel):
     def __init__(self, master, current_settings, save_callback, get_config_path_func, default_ffmpeg_path_value):
         super().__init__(master)
         self.title("Settings")
-        self.geometry("500x650") # Adjusted height and width for new options
+        self.geometry("500x1000") # Adjusted height and width for new options
         self.master = master
         self.current_settings = current_settings
         self.save_callback = save_callback
@@ -170,32 +94,81 @@ class SettingsWindow(ctk.CTkToplevel):
         self.video_quality_optionemenu = ctk.CTkOptionMenu(self, values=["360p", "480p", "720p", "1080p", "1440p", "2160p", "best"])
         self.video_quality_optionemenu.grid(row=9, column=0, columnspan=2, padx=20, pady=(0, 10), sticky="ew")
         self.video_quality_optionemenu.set(self.current_settings.get('video_quality', '1080p'))
+
+        # Concurrent Downloads (size of the download worker pool)
+        self.concurrent_downloads_label = ctk.CTkLabel(self, text="Concurrent Downloads:")
+        self.concurrent_downloads_label.grid(row=10, column=0, padx=20, pady=(10, 0), sticky="w")
+        self.concurrent_downloads_optionemenu = ctk.CTkOptionMenu(self, values=["1", "2", "3", "4", "6", "8"])
+        self.concurrent_downloads_optionemenu.grid(row=11, column=0, columnspan=2, padx=20, pady=(0, 10), sticky="ew")
+        self.concurrent_downloads_optionemenu.set(str(self.current_settings.get('max_concurrent_downloads', 3)))
+
+        # Transcode / Tagging Workers (sizes of the pipeline's CPU and metadata stages)
+        self.transcode_workers_label = ctk.CTkLabel(self, text="Transcode Workers:")
+        self.transcode_workers_label.grid(row=12, column=0, padx=20, pady=(10, 0), sticky="w")
+        self.transcode_workers_optionemenu = ctk.CTkOptionMenu(self, values=["Auto", "1", "2", "3", "4", "6", "8", "12", "16"])
+        self.transcode_workers_optionemenu.grid(row=13, column=0, padx=(20, 5), pady=(0, 10), sticky="ew")
+        self.transcode_workers_optionemenu.set(str(self.current_settings.get('transcode_workers', 'auto')).capitalize())
+        self.tagging_workers_label = ctk.CTkLabel(self, text="Tagging Workers:")
+        self.tagging_workers_label.grid(row=12, column=1, padx=20, pady=(10, 0), sticky="w")
+        self.tagging_workers_optionemenu = ctk.CTkOptionMenu(self, values=["1", "2", "3", "4"])
+        self.tagging_workers_optionemenu.grid(row=13, column=1, padx=(5, 20), pady=(0, 10), sticky="ew")
+        self.tagging_workers_optionemenu.set(str(self.current_settings.get('tagging_workers', 2)))
+
+        # Bandwidth Limit / Requests per Host (rate limiting of the whole queue run)
+        self.bandwidth_limit_label = ctk.CTkLabel(self, text="Bandwidth Limit:")
+        self.bandwidth_limit_label.grid(row=14, column=0, padx=20, pady=(10, 0), sticky="w")
+        self.bandwidth_limit_optionemenu = ctk.CTkOptionMenu(self, values=list(BANDWIDTH_LIMIT_CHOICES))
+        self.bandwidth_limit_optionemenu.grid(row=15, column=0, padx=(20, 5), pady=(0, 10), sticky="ew")
+        self.bandwidth_limit_optionemenu.set(_choice_label(BANDWIDTH_LIMIT_CHOICES, self.current_settings.get('bandwidth_limit', 0)))
+        self.host_requests_label = ctk.CTkLabel(self, text="Requests per Host:")
+        self.host_requests_label.grid(row=14, column=1, padx=20, pady=(10, 0), sticky="w")
+        self.host_requests_optionemenu = ctk.CTkOptionMenu(self, values=list(HOST_REQUEST_RATE_CHOICES))
+        self.host_requests_optionemenu.grid(row=15, column=1, padx=(5, 20), pady=(0, 10), sticky="ew")
+        self.host_requests_optionemenu.set(_choice_label(HOST_REQUEST_RATE_CHOICES, self.current_settings.get('host_requests_per_second', 2)))
         
         # Skip Lyrics Scrape Checkbox
         self.skip_lyrics_var = ctk.BooleanVar(value=self.current_settings.get('skip_lyrics_scrape', False))
         self.skip_lyrics_checkbox = ctk.CTkCheckBox(self, text="Skip Lyrics Scrape", variable=self.skip_lyrics_var)
-        self.skip_lyrics_checkbox.grid(row=10, column=0, columnspan=2, padx=20, pady=(10, 0), sticky="w")
+        self.skip_lyrics_checkbox.grid(row=16, column=0, columnspan=2, padx=20, pady=(10, 0), sticky="w")
 
         # Skip Album Art Checkbox
         self.skip_album_art_var = ctk.BooleanVar(value=self.current_settings.get('skip_album_art', False))
         self.skip_album_art_checkbox = ctk.CTkCheckBox(self, text="Skip Album Art Embedding", variable=self.skip_album_art_var)
-        self.skip_album_art_checkbox.grid(row=11, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="w")
+        self.skip_album_art_checkbox.grid(row=17, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="w")
 
         # Show Progress Bar Checkbox
         self.show_progress_bar_var = ctk.BooleanVar(value=self.current_settings.get('show_progress_bar', True)) # Default to True
         self.show_progress_bar_checkbox = ctk.CTkCheckBox(self, text="Show Download Progress Bar", variable=self.show_progress_bar_var)
-        self.show_progress_bar_checkbox.grid(row=12, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="w")
+        self.show_progress_bar_checkbox.grid(row=18, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="w")
+
+        # Download Archive Checkboxes
+        self.use_download_archive_var = ctk.BooleanVar(value=self.current_settings.get('use_download_archive', True))
+        self.use_download_archive_checkbox = ctk.CTkCheckBox(self, text="Skip Videos Already in Download Archive", variable=self.use_download_archive_var)
+        self.use_download_archive_checkbox.grid(row=19, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="w")
+        self.archive_verify_files_var = ctk.BooleanVar(value=self.current_settings.get('archive_verify_files', True))
+        self.archive_verify_files_checkbox = ctk.CTkCheckBox(self, text="Re-download if Archived File is Missing", variable=self.archive_verify_files_var)
+        self.archive_verify_files_checkbox.grid(row=20, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="w")
+
+        # Playlist Sync Checkbox
+        self.sync_playlists_var = ctk.BooleanVar(value=self.current_settings.get('sync_playlists', False))
+        self.sync_playlists_checkbox = ctk.CTkCheckBox(self, text="Sync Playlists (only download new tracks)", variable=self.sync_playlists_var)
+        self.sync_playlists_checkbox.grid(row=21, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="w")
+
+        # Profiling Checkbox
+        self.profile_queue_runs_var = ctk.BooleanVar(value=self.current_settings.get('profile_queue_runs', False))
+        self.profile_queue_runs_checkbox = ctk.CTkCheckBox(self, text="Profile Queue Runs (saved to the settings folder)", variable=self.profile_queue_runs_var)
+        self.profile_queue_runs_checkbox.grid(row=22, column=0, columnspan=2, padx=20, pady=(5, 10), sticky="w")
 
 
         # Open Settings Folder Button
         self.open_config_folder_button = ctk.CTkButton(self, text="Open Settings Folder", command=self._open_config_folder)
-        self.open_config_folder_button.grid(row=13, column=0, padx=20, pady=(10, 20), sticky="w")
+        self.open_config_folder_button.grid(row=23, column=0, padx=20, pady=(10, 20), sticky="w")
 
         # Buttons
         self.save_button = ctk.CTkButton(self, text="Save", command=self._save_settings)
-        self.save_button.grid(row=14, column=0, padx=20, pady=10, sticky="w")
+        self.save_button.grid(row=24, column=0, padx=20, pady=10, sticky="w")
         self.cancel_button = ctk.CTkButton(self, text="Cancel", command=self.destroy)
-        self.cancel_button.grid(row=14, column=1, padx=20, pady=10, sticky="e")
+        self.cancel_button.grid(row=24, column=1, padx=20, pady=10, sticky="e")
 
         self.grab_set() # Make this window modal
 
@@ -233,9 +206,21 @@ class SettingsWindow(ctk.CTkToplevel):
         new_output_dir = self.output_dir_entry.get().strip()
         new_mp3_quality = self.mp3_quality_optionemenu.get()
         new_video_quality = self.video_quality_optionemenu.get()
+        new_max_concurrent_downloads = int(self.concurrent_downloads_optionemenu.get())
+        new_transcode_workers = self.transcode_workers_optionemenu.get()
+        new_transcode_workers = 'auto' if new_transcode_workers == "Auto" else int(new_transcode_workers)
+        new_tagging_workers = int(self.tagging_workers_optionemenu.get())
+        # A value set by hand in the config file (not one of the choices) is kept unless another is picked
+        new_bandwidth_limit = BANDWIDTH_LIMIT_CHOICES.get(self.bandwidth_limit_optionemenu.get(), self.current_settings.get('bandwidth_limit', 0))
+        new_host_requests_per_second = HOST_REQUEST_RATE_CHOICES.get(self.host_requests_optionemenu.get(),
+                                                                     self.current_settings.get('host_requests_per_second', 2))
         new_skip_lyrics = self.skip_lyrics_var.get()
         new_skip_album_art = self.skip_album_art_var.get()
         new_show_progress_bar = self.show_progress_bar_var.get()
+        new_use_download_archive = self.use_download_archive_var.get()
+        new_archive_verify_files = self.archive_verify_files_var.get()
+        new_sync_playlists = self.sync_playlists_var.get()
+        new_profile_queue_runs = self.profile_queue_runs_var.get()
 
         # Basic validation for paths
         # If the path is empty, it means we're relying on the default (bundled/system PATH)
@@ -251,15 +236,24 @@ class SettingsWindow(ctk.CTkToplevel):
             'output_dir': new_output_dir,
             'mp3_quality': new_mp3_quality,
             'video_quality': new_video_quality,
+            'max_concurrent_downloads': new_max_concurrent_downloads,
+            'transcode_workers': new_transcode_workers,
+            'tagging_workers': new_tagging_workers,
             'skip_lyrics_scrape': new_skip_lyrics,
             'skip_album_art': new_skip_album_art,
-            'show_progress_bar': new_show_progress_bar # Save new setting
+            'show_progress_bar': new_show_progress_bar, # Save new setting
+            'use_download_archive': new_use_download_archive,
+            'archive_verify_files': new_archive_verify_files,
+            'sync_playlists': new_sync_playlists,
+            'bandwidth_limit': new_bandwidth_limit,
+            'host_requests_per_second': new_host_requests_per_second,
+            'profile_queue_runs': new_profile_queue_runs
         }
         self.save_callback(updated_settings)
         self.destroy()
 
 
-class YouTubeDownloaderApp(ctk.CTk):
+class YouTubeDownloaderApp(QueueEngine, ctk.CTk):
     def __init__(self):
         super().__init__()
 
@@ -302,7 +296,7 @@ class YouTubeDownloaderApp(ctk.CTk):
         self.main_frame.grid_columnconfigure(0, weight=1) # URL entry and log expand horizontally
         self.main_frame.grid_columnconfigure(1, weight=0) # For browse/open buttons
         self.main_frame.grid_columnconfigure(2, weight=0) # For open folder button
-        self.main_frame.grid_rowconfigure(9, weight=1) # Log text area will expand vertically
+        self.main_frame.grid_rowconfigure(11, weight=1) # Log text area will expand vertically
 
         # URL Queue Input
         self.url_queue_label = ctk.CTkLabel(self.main_frame, text="YouTube URLs (one per line):")
@@ -342,7 +336,7 @@ class YouTubeDownloaderApp(ctk.CTk):
         # Format Selection
         self.format_label = ctk.CTkLabel(self.main_frame, text="Output Format:")
         self.format_label.grid(row=5, column=0, sticky="w", padx=10, pady=(10, 0))
-        self.format_optionemenu = ctk.CTkOptionMenu(self.main_frame, values=["Video (MP4)", "Audio (MP3)"])
+        self.format_optionemenu = ctk.CTkOptionMenu(self.main_frame, values=["Video (MP4)", "Audio (MP3)", "Audio (Opus)", "Audio (M4A)"])
         self.format_optionemenu.grid(row=6, column=0, sticky="ew", padx=10, pady=(0, 10))
         self.format_optionemenu.set("Audio (MP3)") # Default to MP3
 
@@ -365,44 +359,36 @@ class YouTubeDownloaderApp(ctk.CTk):
             self.progress_bar.grid_forget()
 
 
+        # Worker Status (one line per pipeline worker, populated when a queue run starts)
+        self.worker_status_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        self.worker_status_frame.grid(row=9, column=0, columnspan=3, sticky="ew", padx=10, pady=(0, 0))
+        self.worker_status_frame.grid_columnconfigure(0, weight=1)
+        self.worker_status_labels = []
+        self.worker_status_names = []
+
+
         # Activity Log
         self.log_label = ctk.CTkLabel(self.main_frame, text="Activity Log:")
-        self.log_label.grid(row=9, column=0, sticky="w", padx=10, pady=(10, 0))
+        self.log_label.grid(row=10, column=0, sticky="w", padx=10, pady=(10, 0))
         self.log_textbox = ctk.CTkTextbox(self.main_frame, wrap="word")
-        self.log_textbox.grid(row=10, column=0, columnspan=3, sticky="nsew", padx=10, pady=(0, 10))
+        self.log_textbox.grid(row=11, column=0, columnspan=3, sticky="nsew", padx=10, pady=(0, 10))
         self.log_textbox.configure(state="disabled") # Make it read-only
         
         # Save Log Button
         self.save_log_button = ctk.CTkButton(self.main_frame, text="Save Log", command=self.save_log_to_file)
-        self.save_log_button.grid(row=11, column=0, sticky="w", padx=10, pady=(10, 0))
+        self.save_log_button.grid(row=12, column=0, sticky="w", padx=10, pady=(10, 0))
 
+        # Log pipeline: any thread enqueues, the GUI timer drains in batches
+        self._log_queue = queue.Queue()
+        self._log_history = [] # Every message of the current run, including lines trimmed from the textbox
+        self.after(LOG_FLUSH_INTERVAL_MS, self._flush_log_queue)
 
-    def _get_config_path(self):
-        """Returns the path to the configuration file."""
-        config_dir = user_config_dir("YouTubeDownloader", "MyCompany") # Vendor name optional
-        os.makedirs(config_dir, exist_ok=True)
-        return os.path.join(config_dir, "config.json")
+        # Progress of the running queue (None while idle), refreshed into the GUI at a capped rate
+        self.queue_progress = None
+        self.after(PROGRESS_REFRESH_INTERVAL_MS, self._refresh_progress)
 
-    def _load_settings(self):
-        """Loads settings from the config file or returns defaults."""
-        config_path = self._get_config_path()
-        default_settings = {
-            'ffmpeg_path': DEFAULT_FFMPEG_PATH, # Now dynamically determined
-            'output_dir': os.path.join(os.path.expanduser("~"), "Downloads"),
-            'mp3_quality': '320k',
-            'video_quality': '1080p',
-            'skip_lyrics_scrape': False,
-            'skip_album_art': False,
-            'show_progress_bar': True # New default
-        }
-        try:
-            with open(config_path, 'r') as f:
-                settings = json.load(f)
-                # Merge with defaults to ensure all keys exist and handle new settings
-                loaded_settings = {**default_settings, **settings}
-                return loaded_settings
-        except (FileNotFoundError, json.JSONDecodeError) as e:
-            return default_settings
+        # Offer to resume a queue run that was aborted or crashed, once the window is up
+        self.after(500, self._offer_resume_from_journal)
 
     def _save_settings(self, new_settings):
         """Saves settings to the config file and updates the UI."""
@@ -513,20 +499,60 @@ class YouTubeDownloaderApp(ctk.CTk):
     def log_message(self, message, level="info"):
         """
         Logs a message to the activity textbox.
-        This method is thread-safe as it uses self.after() for GUI updates.
+        This method is thread-safe: messages are queued and inserted by the GUI timer in _flush_log_queue.
         """
         current_time = time.strftime("%H:%M:%S")
         formatted_message = f"[{current_time}] {level.upper()}: {message}"
-        # Use after to ensure GUI updates happen on the main thread
-        self.after(0, lambda: self._update_log_textbox(formatted_message))
+        self._log_queue.put(formatted_message)
+
+    def _flush_log_queue(self):
+        """Drains queued log messages into the textbox in one batch. Runs on the main thread every LOG_FLUSH_INTERVAL_MS."""
+        try:
+            self._drain_log_queue()
+        finally:
+            self.after(LOG_FLUSH_INTERVAL_MS, self._flush_log_queue)
+
+    def _drain_log_queue(self):
+        """Moves all queued messages into the history and the (capped) log textbox."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._log_queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
 
-    def _update_log_textbox(self, message):
-        """Internal method to update the log textbox safely."""
+        self._log_history.extend(batch)
+        self._update_log_textbox(batch[-LOG_TEXTBOX_MAX_LINES:])
+
+    def _update_log_textbox(self, messages):
+        """Internal method to append a batch of messages to the log textbox, trimming it to LOG_TEXTBOX_MAX_LINES."""
         self.log_textbox.configure(state="normal")
-        self.log_textbox.insert(ctk.END, message + "\n")
+        self.log_textbox.insert(ctk.END, "\n".join(messages) + "\n")
+        line_count = int(self.log_textbox.index("end-1c").split(".")[0]) - 1
+        if line_count > LOG_TEXTBOX_MAX_LINES:
+            # Drop the oldest lines; they remain available in self._log_history
+            self.log_textbox.delete("1.0", f"{line_count - LOG_TEXTBOX_MAX_LINES + 1}.0")
         self.log_textbox.see(ctk.END) # Auto-scroll
         self.log_textbox.configure(state="disabled")
-        self.update_idletasks() # Update GUI immediately
+
+    def _refresh_progress(self):
+        """Copies the shared QueueProgress into the progress bar and queue status line. Runs every PROGRESS_REFRESH_INTERVAL_MS."""
+        try:
+            progress = self.queue_progress
+            if progress is not None:
+                state = progress.snapshot()
+                status_text = f"Queue: {state['items_done']}/{state['items_total']} downloads finished"
+                if state['speed']:
+                    status_text += f" | {format_bytes(state['speed'])}/s"
+                if state['eta'] is not None:
+                    status_text += f" | ETA {format_duration(state['eta'])}"
+                self.queue_status_label.configure(text=status_text)
+                if self.settings.get('show_progress_bar', True):
+                    self.progress_bar.set(state['fraction'])
+        finally:
+            self.after(PROGRESS_REFRESH_INTERVAL_MS, self._refresh_progress)
 
     def show_error(self, title, message):
         """Displays an error message box and logs it."""
@@ -539,8 +565,9 @@ class YouTubeDownloaderApp(ctk.CTk):
         self.after(0, lambda: messagebox.showinfo(title, message))
 
     def save_log_to_file(self):
-        """Saves the content of the activity log to a text file."""
-        log_content = self.log_textbox.get("1.0", ctk.END)
+        """Saves the full activity log history (not just the lines still shown) to a text file."""
+        self._drain_log_queue() # Include messages that have not been displayed yet
+        log_content = "\n".join(self._log_history) + "\n"
         file_path = filedialog.asksaveasfilename(
             defaultextension=".txt",
             filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
@@ -599,7 +626,7 @@ class YouTubeDownloaderApp(ctk.CTk):
         
         # Validate all URLs in the queue (after de-duplication)
         for url in urls_to_process:
-            if not (url.startswith("http://") or url.startswith("https://") and ("youtube.com/" in url or "youtu.be/" in url or "/shorts/" in url)):
+            if not is_valid_queue_url(url):
                 self.show_error("Input Error", f"Invalid YouTube URL found in queue: {url}. Please correct or remove it.")
                 return
 
@@ -626,13 +653,17 @@ class YouTubeDownloaderApp(ctk.CTk):
                 self.show_error("FFmpeg Path Check Error", "Could not check FFmpeg path. 'which' or 'where' command not found. Ensure FFmpeg is correctly installed or set the full path in settings.")
                 return
 
+        self._launch_queue_run(urls_to_process, output_dir, output_format)
 
+    def _launch_queue_run(self, urls, output_dir, output_format, resume_state=None):
+        """Prepares the GUI and starts process_download_queue in a background thread."""
         # Prepare GUI for download
         self.download_button.configure(state="disabled", text="Downloading...")
         self.abort_button.configure(state="normal") # Enable abort button
         self.log_textbox.configure(state="normal")
         self.log_textbox.delete("1.0", ctk.END) # Clear previous logs
         self.log_textbox.configure(state="disabled")
+        self._log_history = []
         
         # Show progress bar if enabled in settings
         if self.settings.get('show_progress_bar', True):
@@ -641,8 +672,11 @@ class YouTubeDownloaderApp(ctk.CTk):
         else:
             self.progress_bar.grid_forget()
 
-        self.log_message("Starting download queue...")
-        self.log_message(f"Total unique items in queue: {len(urls_to_process)}")
+        if resume_state is not None:
+            self.log_message(f"Resuming interrupted download queue ({resume_state['pending']} download(s) left)...")
+        else:
+            self.log_message("Starting download queue...")
+        self.log_message(f"Total unique items in queue: {len(urls)}")
         self.log_message(f"Output Directory: {output_dir}")
         self.log_message(f"Output Format: {output_format}")
 
@@ -650,538 +684,81 @@ class YouTubeDownloaderApp(ctk.CTk):
         self.abort_download_flag.clear() # Clear any previous abort signal
 
         # Store the queue for the background thread
-        self.download_queue = urls_to_process
+        self.download_queue = urls
+
+        # One status line per pipeline worker
+        self._init_worker_status(self._pipeline_worker_names(output_format))
 
         # Run download in a separate thread to keep GUI responsive
-        download_thread = threading.Thread(target=self.process_download_queue, args=(output_dir, output_format))
+        download_thread = threading.Thread(target=self.run_download_queue, args=(output_dir, output_format, resume_state))
         download_thread.daemon = True # Allow the app to exit even if thread is running
         download_thread.start()
 
-    def process_download_queue(self, base_output_dir, output_format):
-        """
-        Processes items in the download queue sequentially.
-        """
-        is_aborted = False
-        completed_items = 0
-        total_items = len(self.download_queue)
-
-        try:
-            for i, url in enumerate(self.download_queue):
-                if self.abort_download_flag.is_set():
-                    self.log_message(f"Download queue aborted by user at item {i+1}/{total_items}.", level="warning")
-                    is_aborted = True
-                    break
-
-                self.log_message(f"\n--- Processing Item {i+1}/{total_items}: {url} ---")
-                self.queue_status_label.configure(text=f"Queue: Item {i+1}/{total_items}")
-
-                try:
-                    # Determine target video format based on settings
-                    if "Audio" in output_format:
-                        # Best audio, then convert to MP3 with specified quality
-                        format_string = 'bestaudio/best'
-                        postprocessors = [{
-                            'key': 'FFmpegExtractAudio',
-                            'preferredcodec': 'mp3',
-                            'preferredquality': self.settings.get('mp3_quality', '320k') # Use quality from settings
-                        },
-                        # Add a postprocessor to remove original file after conversion if different extension
-                        # This is tricky with yt-dlp's 'outtmpl' and conversion,
-                        # A direct python deletion after conversion is safer but requires tracking original filename
-                        # For now, let yt-dlp manage internal temp files.
-                        ]
-                    else: # Video (MP4)
-                        # Specific resolution if available, otherwise best MP4
-                        resolution = self.settings.get('video_quality', '1080p')
-                        if resolution == 'best':
-                            format_string = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
-                        else:
-                            # Use the resolution filter, fallback to general best mp4 if specific res not found
-                            # Note: youtube-dlp format selection is complex; this is a basic filter
-                            format_string = f'bestvideo[ext=mp4][height<={resolution.replace("p", "")}]+bestaudio[ext=m4a]/best[ext=mp4]/best'
-                        postprocessors = []
-
-
-                    # Common youtube-dlp options
-                    ydl_opts_base = {
-                        'format': format_string,
-                        'quiet': False,
-                        'noprogress': True,
-                        'logger': YTDL_Logger(self),
-                        'progress_hooks': [YTDL_Progress_Hook(self)],
-                        'ffmpeg_location': self.settings['ffmpeg_path'],
-                        'writethumbnail': False, # IMPORTANT: Disable ytdlp writing thumbnail to disk
-                        'outtmpl': os.path.join(base_output_dir, '%(title)s.%(ext)s'), # Default template
-                        'no_warnings': True,
-                        'postprocessors': postprocessors # Apply postprocessors
-                    }
-
-                    is_playlist = ("playlist?list=" in url or "/playlist/" in url) and not "/shorts/" in url # Simple heuristic
-                    
-                    if is_playlist:
-                        self.log_message("Detected a playlist URL. Fetching playlist info...")
-                        info_ydl_opts = ydl_opts_base.copy()
-                        info_ydl_opts['extract_flat'] = True
-                        info_ydl_opts['quiet'] = True
-                        info_ydl_opts['logger'] = YTDL_Logger(self)
-                        info_ydl_opts.pop('postprocessors', None) # Remove postprocessors for info extraction pass
-                        info_ydl_opts.pop('format', None) # Remove format for info extraction pass
-
-                        with yt_dlp.YoutubeDL(info_ydl_opts) as ydl:
-                            playlist_info_dict = ydl.extract_info(url, download=False)
-
-                            if 'entries' in playlist_info_dict and playlist_info_dict['entries']:
-                                sub_total_items = len(playlist_info_dict['entries'])
-                                playlist_title_raw = playlist_info_dict.get('title', 'Unknown Playlist')
-                                playlist_title_cleaned = self.clean_name_suffix(playlist_title_raw)
-                                
-                                # Create a dedicated folder for the playlist within the base_output_dir
-                                current_output_dir = os.path.join(base_output_dir, self.sanitize_filename(playlist_title_cleaned))
-                                os.makedirs(current_output_dir, exist_ok=True)
-                                self.log_message(f"Created playlist folder: '{current_output_dir}'")
-                                self.log_message(f"Playlist '{playlist_title_cleaned}' has {sub_total_items} videos.")
-
-                                for j, entry in enumerate(playlist_info_dict['entries']):
-                                    if self.abort_download_flag.is_set():
-                                        self.log_message(f"Download aborted by user within playlist at video {j+1}/{sub_total_items}.", level="warning")
-                                        is_aborted = True
-                                        break # Exit inner playlist loop
-
-                                    video_url = entry.get('url')
-                                    if not video_url:
-                                        self.log_message(f"  Skipping video {j+1}/{sub_total_items}: No URL found.", level="warning")
-                                        continue
-
-                                    video_title_raw = entry.get('title', f"Untitled Video {j+1}")
-                                    artist_raw = entry.get('artist', entry.get('channel', ''))
-                                    clean_video_title = self.sanitize_filename(video_title_raw)
-                                    # clean_artist is done in process_audio_metadata now
-                                    track_num_str = f"{j+1:02d}"
-                                    filename_base = f"{track_num_str} - {self.sanitize_filename(artist_raw) if artist_raw else 'Unknown Artist'} - {clean_video_title}"
-                                    
-                                    # Create specific ydl_opts for this video from the base, applying postprocessors and output path
-                                    single_video_ydl_opts = ydl_opts_base.copy()
-                                    single_video_ydl_opts['outtmpl'] = os.path.join(current_output_dir, f"{filename_base}.%(ext)s")
-                                    
-                                    self.log_message(f"  Downloading video {j+1}/{sub_total_items}: '{video_title_raw}'")
-
-                                    with yt_dlp.YoutubeDL(single_video_ydl_opts) as single_ydl:
-                                        single_info_dict = single_ydl.extract_info(video_url, download=True)
-                                        downloaded_filepath_base = single_ydl.prepare_filename(single_info_dict)
-
-                                        if "Audio" in output_format:
-                                            mp3_final_path = os.path.splitext(downloaded_filepath_base)[0] + ".mp3"
-                                            time.sleep(0.5) 
-                                            if not os.path.exists(mp3_final_path):
-                                                potential_mp3s = [f for f in os.listdir(current_output_dir) if f.startswith(filename_base) and f.endswith(".mp3")]
-                                                if potential_mp3s:
-                                                    mp3_final_path = os.path.join(current_output_dir, potential_mp3s[0])
-                                                    self.log_message(f"  Found MP3 at alternative path: {mp3_final_path}")
-                                                else:
-                                                    self.log_message(f"  Error: Could not locate MP3 for '{video_title_raw}'. Skipping tagging.", level="error")
-                                                    continue 
-
-                                            self.process_audio_metadata(mp3_final_path, single_info_dict, True, j + 1, playlist_title_cleaned, sub_total_items)
-                                        else:
-                                            self.log_message(f"  Video '{video_title_raw}' downloaded to {downloaded_filepath_base}")
-                                if is_aborted: # If inner loop broke due to abort, break outer loop too
-                                    break
-                            else:
-                                self.show_error("youtube-dlp Error", "Could not extract playlist entries or playlist is empty. Is the URL valid?")
-                                continue # Move to next item in queue
-
-                    else: # Single video download
-                        # Set outtmpl for single video directly in the base_output_dir
-                        ydl_opts_base['outtmpl'] = os.path.join(base_output_dir, '%(title)s.%(ext)s')
-                        
-                        self.log_message(f"  Downloading single video: '{url}'")
-                        with yt_dlp.YoutubeDL(ydl_opts_base) as ydl:
-                            info_dict = ydl.extract_info(url, download=True)
-                            downloaded_filepath_base = ydl.prepare_filename(info_dict)
-
-                            if "Audio" in output_format:
-                                mp3_final_path = os.path.splitext(downloaded_filepath_base)[0] + ".mp3"
-                                time.sleep(0.5)
-                                if not os.path.exists(mp3_final_path):
-                                    base_name = self.sanitize_filename(info_dict.get('title', ''))
-                                    potential_mp3s = [f for f in os.listdir(base_output_dir) if f.startswith(base_name) and f.endswith(".mp3")]
-                                    if potential_mp3s:
-                                        mp3_final_path = os.path.join(base_output_dir, potential_mp3s[0])
-                                        self.log_message(f"  Found MP3 at alternative path: {mp3_final_path}")
-                                    else:
-                                        self.log_message(f"  Error: Could not locate MP3 for '{info_dict.get('title')}'. Skipping tagging.", level="error")
-                                        continue
-
-                                self.process_audio_metadata(mp3_final_path, info_dict, False, None, None, 1)
-                            else:
-                                self.log_message(f"Video downloaded successfully to {downloaded_filepath_base}")
-                    
-                    completed_items += 1 # Only increment if item successfully processed (not aborted or error)
-
-                except yt_dlp.utils.DownloadError as de:
-                    self.log_message(f"Error processing {url}: {de}", level="error")
-                    self.show_error("Download Error", f"Error for {url}: {de}")
-                except FileNotFoundError:
-                    self.log_message(f"Error: FFmpeg not found at '{self.settings['ffmpeg_path']}'. Please check settings.", level="error")
-                    self.show_error("FFmpeg Not Found", f"FFmpeg executable not found at '{self.settings['ffmpeg_path']}'. Please ensure it's installed and the path is correct in Settings.")
-                    break # Critical error, stop queue
-                except Exception as e:
-                    self.log_message(f"An unexpected error occurred for {url}: {e}", level="error")
-                    self.show_error("Unexpected Error", f"An unexpected error occurred for {url}: {e}")
-                    import traceback
-                    self.log_message(f"Traceback: {traceback.format_exc()}", level="error")
-                    # Check abort flag again before continuing in queue
-                    if self.abort_download_flag.is_set():
-                        is_aborted = True
-                        break # Exit queue loop
-                    continue # Try next item in queue if not critical
-
-            if not is_aborted: # Only show completion message if not aborted
-                self.show_info("Queue Complete", f"Download queue finished! Processed {completed_items} of {total_items} items.")
-            else:
-                self.show_info("Queue Aborted", f"Download queue aborted. Processed {completed_items} of {total_items} items before stopping.")
-
-        except Exception as e:
-            self.show_error("Queue Processing Error", f"An error occurred while managing the download queue: {e}")
-            import traceback
-            self.log_message(f"Queue Traceback: {traceback.format_exc()}", level="error")
-        finally:
-            self.after(0, lambda: self.download_button.configure(state="normal", text="Initiate Download"))
-            self.after(0, lambda: self.abort_button.configure(state="disabled"))
-            self.after(0, lambda: self.queue_status_label.configure(text="Queue: Ready")) # Reset queue status
-            if self.settings.get('show_progress_bar', True):
-                 self.after(0, lambda: self.progress_bar.set(0)) # Reset progress bar on completion/abort
-
-
-    def sanitize_filename(self, filename):
-        """Sanitizes a string to be a valid filename for common OSes."""
-        # Replace characters not allowed in filenames
-        filename = re.sub(r'[<>:"/\\|?*]', '', filename)
-        # Replace multiple spaces/periods with single ones, strip leading/trailing spaces/periods
-        filename = re.sub(r'\s+', ' ', filename).strip()
-        filename = re.sub(r'\.+', '.', filename).strip('.')
-        # Limit length (optional, but good practice)
-        if len(filename) > 200:
-            filename = filename[:200]
-        return filename
-
-    def clean_name_suffix(self, name):
-        """Removes common auto-generated suffixes from artist/album names."""
-        suffixes_to_remove = [
-            r' - Topic$',
-            r' - Official Audio$',
-            r' - Official Video$',
-            r'\(Official Music Video\)$',
-            r'\(Official Audio\)$',
-            r'\[Official Music Video\]$',
-            r'\[Official Audio\]$',
-            r'^Album - ', # Added for the specific issue with album prefix
-        ]
-        for suffix_pattern in suffixes_to_remove:
-            name = re.sub(suffix_pattern, '', name, flags=re.IGNORECASE).strip()
-        return name
-
-    def parse_artists(self, artist_string):
-        """
-        Parses a string containing potentially multiple artists into a list.
-        Handles common delimiters like ',', ' & ', ' feat. '.
-        """
-        if not artist_string:
-            return []
-
-        # Replace common "featuring" patterns with comma for easier splitting
-        artist_string = re.sub(r'\s*feat\.\s*', ',', artist_string, flags=re.IGNORECASE)
-        artist_string = re.sub(r'\s*ft\.\s*', ',', artist_string, flags=re.IGNORECASE)
-        artist_string = re.sub(r'\s*&\s*', ',', artist_string, flags=re.IGNORECASE)
-
-
-        # Split by comma, then clean each part
-        artists = [self.clean_name_suffix(a.strip()) for a in artist_string.split(',') if a.strip()]
-        return [a for a in artists if a] # Remove any empty strings after cleaning
-
-
-    def process_audio_metadata(self, mp3_file_path, video_info, is_playlist_item, track_number, playlist_title, total_tracks):
-        """
-        Processes and embeds metadata into the MP3 file.
-        """
-        self.log_message(f"Processing metadata for: {os.path.basename(mp3_file_path)}")
+    def _offer_resume_from_journal(self):
+        """Asks whether to resume the queue run left in the journal by an abort or crash."""
+        journal_path = self._get_journal_path()
         try:
-            audio = MP3(mp3_file_path, ID3=ID3)
-            # Clear existing tags to prevent duplication/conflict
-            audio.clear()
-            # Ensure audio.tags is an ID3 object after clearing
-            if audio.tags is None:
-                audio.tags = ID3()
-
-
-            # --- Tagging individual fields ---
-            # Title
-            title = video_info.get('title', 'Unknown Title')
-            audio.tags.add(TIT2(encoding=3, text=[title]))
-            self.log_message(f"  Tagged Title: {title}")
-
-            # Artist
-            # Prioritize ytdlp 'artist' field, then 'channel', then try parsing
-            artists_list = []
-            if video_info.get('artist'):
-                artists_list = self.parse_artists(video_info['artist'])
-            elif video_info.get('channel'):
-                artists_list = self.parse_artists(video_info['channel'])
-
-            if not artists_list:
-                artists_list = ['Unknown Artist'] # Fallback if no artist found
-            
-            # TPE1 (Artist) supports multiple values as a list
-            audio.tags.add(TPE1(encoding=3, text=artists_list))
-            self.log_message(f"  Tagged Artist(s): {', '.join(artists_list)}")
-
-
-            # Album
-            album = "Unknown Album" # Default fallback
-            if is_playlist_item and playlist_title:
-                album = self.clean_name_suffix(playlist_title)
-            else:
-                # For single videos:
-                # 1. Try to get album directly from video_info
-                if video_info.get('album'):
-                    album = self.clean_name_suffix(video_info['album'])
-                # 2. Fallback to channel name, but with a check to avoid redundancy or generic names
-                elif video_info.get('channel'):
-                    channel_name_cleaned = self.clean_name_suffix(video_info['channel'])
-                    # If the channel name is identical or very similar to the main artist,
-                    # and the main artist is not generic, use "YouTube Single" or a more specific album from info_dict.
-                    main_artist = artists_list[0] if artists_list else ''
-                    if main_artist.lower() == channel_name_cleaned.lower() and main_artist.lower() not in ["unknown artist", "various artists"]:
-                        album = "YouTube Single"
-                    elif 'release_date' in video_info and video_info['release_date']:
-                         # If it has a release date, perhaps it's a true single
-                        album = f"{main_artist} - Single ({video_info['release_date'][:4]})" if main_artist else f"Single ({video_info['release_date'][:4]})"
-                    else:
-                        album = channel_name_cleaned # Use channel name if it's sufficiently distinct
-                else:
-                    album = "YouTube Single" # Final fallback for single tracks
-
-            audio.tags.add(TALB(encoding=3, text=[album]))
-            self.log_message(f"  Tagged Album: {album}")
-
-            # Year
-            upload_date = video_info.get('upload_date') # Format:YYYYMMDD
-            if upload_date and len(upload_date) >= 4:
-                year = upload_date[:4]
-                audio.tags.add(TDRC(encoding=3, text=[year]))
-                self.log_message(f"  Tagged Year: {year}")
-            else:
-                self.log_message("  Warning: Could not determine year for tagging.", level="warning")
-
-            # Track Number
-            if is_playlist_item and track_number is not None:
-                track_string = f"{track_number}/{total_tracks}" if total_tracks else str(track_number)
-                audio.tags.add(TRCK(encoding=3, text=[track_string]))
-                self.log_message(f"  Tagged Track Number: {track_string}")
-            else:
-                self.log_message("  Skipping track number tagging for single video or missing playlist info.")
-
-
-            # --- Album Art (Cover Art) ---
-            if not self.settings.get('skip_album_art', False):
-                self.process_album_art(audio, video_info.get('thumbnail'))
-            else:
-                self.log_message("  Skipping album art embedding as per settings.")
-
-            # --- Lyrics ---
-            if not self.settings.get('skip_lyrics_scrape', False):
-                lyrics = self.extract_and_scrape_lyrics(video_info.get('description', ''), title, artists_list[0] if artists_list else '')
-                if lyrics:
-                    # Use USLT for unsynchronized lyrics
-                    audio.tags.add(USLT(encoding=3, lang='eng', desc='Lyrics', text=lyrics))
-                    self.log_message("  Embedded Lyrics successfully.")
-                else:
-                    self.log_message("  No substantial lyrics found or scraped.", level="warning")
-            else:
-                self.log_message("  Skipping lyrics scraping as per settings.")
-
-            # Save the changes
-            audio.save()
-            self.log_message(f"Metadata tagging complete for: {os.path.basename(mp3_file_path)}")
-
-        except ID3NoHeaderError:
-            self.show_error("Tagging Error", f"File '{os.path.basename(mp3_file_path)}' is not a valid MP3 or has no ID3 header.")
-        except Exception as e:
-            self.show_error("Tagging Error", f"An error occurred during metadata processing for {os.path.basename(mp3_file_path)}: {e}")
-            import traceback
-            self.log_message(f"Traceback: {traceback.format_exc()}", level="error")
-
-    def process_album_art(self, audio, thumbnail_url):
-        """Fetches, processes, and embeds album art into the MP3."""
-        if not thumbnail_url:
-            self.log_message("  Warning: No thumbnail URL provided for album art.", level="warning")
+            resume_state = QueueJournal.load(journal_path)
+        except (OSError, KeyError, TypeError) as e:
+            self.log_message(f"Could not read the queue journal, discarding it: {e}", level="warning")
+            resume_state = None
+        if resume_state is None:
+            if os.path.exists(journal_path):
+                os.remove(journal_path) # Nothing left to resume
             return
 
-        try:
-            self.log_message(f"  Fetching thumbnail from: {thumbnail_url} (in-memory)")
-            response = requests.get(thumbnail_url, timeout=10)
-            response.raise_for_status() # Raise an HTTPError for bad responses (4xx or 5xx)
-            img_data = response.content
-
-            img = Image.open(BytesIO(img_data))
-            original_width, original_height = img.size
-
-            # Crop to square from center
-            min_dim = min(original_width, original_height)
-            left = (original_width - min_dim) / 2
-            top = (original_height - min_dim) / 2
-            right = (original_width + min_dim) / 2
-            bottom = (original_height + min_dim) / 2
-            img_cropped = img.crop((left, top, right, bottom))
-
-            # Resize to standard high-quality resolution (e.g., 1000x1000)
-            target_size = (1000, 1000)
-            # Use LANCZOS for high quality downsampling
-            img_resized = img_cropped.resize(target_size, Image.Resampling.LANCZOS)
-
-            # Save to BytesIO for embedding
-            img_byte_arr = BytesIO()
-            # Mutagen's APIC tag prefers PNG for better compatibility and quality, though JPEG is common.
-            # Convert if original is not PNG or if we want to ensure PNG.
-            if img_resized.mode != 'RGB':
-                img_resized = img_resized.convert('RGB')
-            img_resized.save(img_byte_arr, format='JPEG', quality=90) # Use JPEG, set quality
-            img_byte_arr = img_byte_arr.getvalue()
-
-            audio.tags.add(APIC(
-                encoding=3, # UTF-8
-                mime='image/jpeg', # Image format
-                type=3, # 3 is for Front Cover
-                desc='Cover',
-                data=img_byte_arr
-            ))
-            self.log_message("  Embedded Album Art successfully.")
-        except requests.exceptions.RequestException as req_e:
-            self.log_message(f"  Warning: Failed to download album art from '{thumbnail_url}': {req_e}", level="warning")
-        except Exception as e:
-            self.log_message(f"  Warning: Could not process or embed album art: {e}", level="warning")
-            import traceback
-            self.log_message(f"  Album Art Traceback: {traceback.format_exc()}", level="debug") # Use debug for less critical errors
-
-    def extract_and_scrape_lyrics(self, description, title, artist):
-        """
-        Attempts to extract lyrics from video description, then scrapes online if necessary.
-        """
-        # 1. Prioritize extracting from description
-        self.log_message("  Attempting to extract lyrics from video description...")
-        lyrics_block_match = re.search(
-            r'(lyrics:?[\s\r\n]+.*?)' # Capture 'lyrics:' followed by content
-            r'(?:(?:\n{2,}|\r\n{2,})(?:links|socials|subscribe|copyright|produced by|video by|mixed by|mastered by|music by|album by|uploaded by))?', # Non-capturing group for common trailing text
-            description, re.DOTALL | re.IGNORECASE
-        )
-
-        if lyrics_block_match:
-            potential_lyrics = lyrics_block_match.group(1).strip()
-            # Clean "lyrics:" prefix
-            clean_lyrics = re.sub(r'^lyrics:?\s*', '', potential_lyrics, flags=re.IGNORECASE).strip()
-            
-            # Check for substantial content (more than 5 lines and 100 characters)
-            if len(clean_lyrics.split('\n')) > 5 and len(clean_lyrics) > 100:
-                self.log_message("  Lyrics found and extracted from video description.")
-                return clean_lyrics
-        else:
-            self.log_message("  No substantial lyrics found in video description. Attempting to scrape online.")
-
-        # 2. Scrape from an external source (e.g., Genius.com, AZLyrics.com)
-        try:
-            search_query = f"{title} {artist} lyrics" if artist else f"{title} lyrics"
-            google_search_url = f"https://www.google.com/search?q={requests.utils.quote(search_query)}"
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Connection': 'keep-alive',
-            }
-            
-            self.log_message(f"  Searching Google for lyrics: '{search_query}'")
-            google_response = requests.get(google_search_url, headers=headers, timeout=10)
-            google_response.raise_for_status()
-            google_soup = BeautifulSoup(google_response.text, 'html.parser')
-
-            lyrics_site_url = None
-            # Prioritize Genius, then AZLyrics
-            for a_tag in google_soup.find_all('a', href=True):
-                href = a_tag['href']
-                if "genius.com" in href and "lyrics" in href:
-                    lyrics_site_url = href
-                    self.log_message(f"  Found Genius.com link: {lyrics_site_url}")
-                    break
-                elif "azlyrics.com" in href and "lyrics" in href:
-                    lyrics_site_url = href
-                    self.log_message(f"  Found AZLyrics.com link: {lyrics_site_url}")
-                    break
-
-            if lyrics_site_url:
-                # Clean up Google redirect URL if necessary
-                if "/url?q=" in lyrics_site_url:
-                    lyrics_site_url = lyrics_site_url.split("/url?q=")[1].split("&sa=")[0]
-                
-                self.log_message(f"  Attempting to scrape lyrics from: {lyrics_site_url}")
-                lyrics_response = requests.get(lyrics_site_url, headers=headers, timeout=15)
-                lyrics_response.raise_for_status()
-                lyrics_soup = BeautifulSoup(lyrics_response.text, 'html.parser')
-                
-                full_lyrics = None
-
-                # Logic to extract lyrics (highly site-specific and might break with website changes)
-                if "genius.com" in lyrics_site_url:
-                    # Genius lyrics are typically in a div with data-lyrics-container attribute or specific class
-                    lyrics_divs = lyrics_soup.find_all('div', {'data-lyrics-container': 'true'})
-                    if not lyrics_divs: # Fallback for older/different structures
-                         lyrics_divs = lyrics_soup.find_all('div', class_=lambda x: x and 'Lyrics__Container' in x) # More flexible class matching
-
-                    if lyrics_divs:
-                        lyrics_text_parts = []
-                        for lyrics_div in lyrics_divs:
-                            # Use .stripped_strings to get text content and handle newlines, then re-join
-                            lyrics_text_parts.extend(lyrics_div.stripped_strings)
-                        
-                        full_lyrics = '\n'.join(lyrics_text_parts).strip()
-                        # Clean up annotations like "[Verse 1]" from Genius - keep if it's structural (like 'verse', 'chorus')
-                        full_lyrics = re.sub(r'\[(.*?)\]', lambda m: m.group(0) if re.search(r'(verse|chorus|bridge|outro|intro|hook|pre-chorus|interlude|solo)', m.group(1).lower()) else '', full_lyrics)
-                        full_lyrics = re.sub(r'\n{3,}', '\n\n', full_lyrics) # Reduce excessive newlines
-                        
-                elif "azlyrics.com" in lyrics_site_url:
-                    # AZLyrics lyrics are often in a specific div after a comment or certain structure
-                    # This is tricky due to ads and comments. The lyrics are typically in a <div> without a class
-                    # that is a direct sibling to an ad block or a specific comment.
-                    lyrics_div_container = lyrics_soup.find('div', class_='col-xs-12 col-lg-8 text-center')
-                    if lyrics_div_container:
-                        for sibling in lyrics_div_container.children:
-                            # Look for the target div. AZLyrics often places lyrics after a specific comment.
-                            if isinstance(sibling, str) and "<!-- Usage of azlyrics.com content by any third-party lyrics provider is prohibited by our licensing agreement. -->" in sibling:
-                                # The very next <div> sibling usually contains the lyrics
-                                actual_lyrics_div = sibling.find_next_sibling('div')
-                                if actual_lyrics_div and not actual_lyrics_div.get('class'): # Check if it has no class
-                                    full_lyrics = actual_lyrics_div.get_text(separator="\n").strip()
-                                    break
-                            elif sibling.name == 'div' and not sibling.get('class') and len(sibling.find_all('br')) > 5:
-                                # Fallback: if it's a div with no class and many <br> (likely lyrics)
-                                full_lyrics = sibling.get_text(separator="\n").strip()
-                                break
-                
-                if full_lyrics and len(full_lyrics) > 100: # Simple check for substantial content
-                    self.log_message(f"  Scraped lyrics successfully from {lyrics_site_url}.")
-                    return full_lyrics
-                else:
-                    self.log_message(f"  Failed to extract substantial lyrics from {lyrics_site_url}. Content too short or structure unexpected.", level="warning")
-            else:
-                self.log_message("  No suitable lyrics website found in Google search results.", level="warning")
-
-        except requests.exceptions.RequestException as req_e:
-            self.log_message(f"  Error accessing lyrics website: {req_e}", level="warning")
-        except Exception as e:
-            self.log_message(f"  Error during lyrics scraping: {e}", level="warning")
-            import traceback
-            self.log_message(f"  Lyrics Scraping Traceback: {traceback.format_exc()}", level="debug")
+        if not messagebox.askyesno(
+                "Resume Downloads",
+                f"The previous download queue did not finish ({resume_state['pending']} download(s) left).\n"
+                f"Output Directory: {resume_state['output_dir']}\n\nResume it now?"):
+            os.remove(journal_path)
+            return
+        if not os.path.isdir(resume_state['output_dir']):
+            self.show_error("Resume Error", f"Output directory of the interrupted queue no longer exists: {resume_state['output_dir']}")
+            return
 
-        return None # Return None if no lyrics were found or successfully scraped
+        self.url_queue_textbox.delete("1.0", ctk.END)
+        self.url_queue_textbox.insert("1.0", "\n".join(resume_state['urls']))
+        self.output_dir_entry.configure(state="normal")
+        self.output_dir_entry.delete(0, ctk.END)
+        self.output_dir_entry.insert(0, resume_state['output_dir'])
+        self.output_dir_entry.configure(state="readonly")
+        self.format_optionemenu.set(resume_state['output_format'])
+        self._launch_queue_run(resume_state['urls'], resume_state['output_dir'], resume_state['output_format'], resume_state)
+
+    def _pipeline_worker_names(self, output_format):
+        """Returns the display names of all pipeline workers, in status-line order."""
+        download_workers, transcode_workers, tagging_workers = self._stage_sizes(output_format)
+        return ([f"Download {k + 1}" for k in range(download_workers)] +
+                [f"Transcode {k + 1}" for k in range(transcode_workers)] +
+                [f"Tagging {k + 1}" for k in range(tagging_workers)])
+
+    def _init_worker_status(self, worker_names):
+        """Creates one status label per pipeline worker. Must be called on the main thread."""
+        for label in self.worker_status_labels:
+            label.destroy()
+        self.worker_status_labels = []
+        self.worker_status_names = list(worker_names)
+        for slot, worker_name in enumerate(worker_names):
+            label = ctk.CTkLabel(self.worker_status_frame, text=f"{worker_name}: Idle", anchor="w")
+            label.grid(row=slot, column=0, sticky="ew")
+            self.worker_status_labels.append(label)
+
+    def _set_worker_status(self, slot, status):
+        """Updates the status label of a pipeline worker. Thread-safe."""
+        def update():
+            if slot < len(self.worker_status_labels):
+                self.worker_status_labels[slot].configure(text=f"{self.worker_status_names[slot]}: {status}")
+        self.after(0, update)
+
+    def _on_queue_run_finished(self):
+        """Resets the GUI once a queue run is over. Called from the queue thread."""
+        self.after(0, lambda: self.download_button.configure(state="normal", text="Initiate Download"))
+        self.after(0, lambda: self.abort_button.configure(state="disabled"))
+        self.after(0, lambda: self.queue_status_label.configure(text="Queue: Ready")) # Reset queue status
+        self.after(0, lambda: self._init_worker_status([])) # Remove worker status lines
+        if self.settings.get('show_progress_bar', True):
+             self.after(0, lambda: self.progress_bar.set(0)) # Reset progress bar on completion/abort
 
 
 if __name__ == "__main__":